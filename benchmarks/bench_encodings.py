@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Compare z3 parse and solve time of the chain_encoding encodings.
+
+Inputs are the corpus files with the longest INPUT paths and synthetic dumps
+(bench_parsers.write_synthetic_dump, which puts every sixth rule in INPUT).
+Each (input, encoding) case runs in a fresh interpreter, so a parser that
+runs out of stack on a deeply nested script fails only its own case.
+Results are printed (or written with --output) as JSON:
+
+  {"python": ..., "z3": ..., "results": [
+     {"input": "synthetic-30000", "encoding": "tree", "rules": 5000,
+      "chars": 812000, "depth": 16, "generate_seconds": 0.05,
+      "parse_seconds": 0.31, "solve_seconds": 0.12, "result": "sat"},
+     ...]}
+
+depth is the deepest parenthesis nesting of the script. solve_seconds is the
+time z3 takes to check the script's (assert accepted).
+
+Usage: python benchmarks/bench_encodings.py [--corpus DIR] [--top N] [--sizes 6000,30000]
+           [--encodings nested,flat,tree] [--merge] [--output FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from bench_parsers import corpus_files, write_synthetic_dump
+
+DEFAULT_SIZES = (6000, 30000)
+
+
+def nesting_depth(text):
+    depth = deepest = 0
+    for char in text:
+        if char == "(":
+            depth += 1
+            if depth > deepest:
+                deepest = depth
+        elif char == ")":
+            depth -= 1
+    return deepest
+
+
+def chain_length(tables):
+    """Rules of the chains a packet entering INPUT can traverse."""
+    from rule_ir import chain_rules
+    return sum(len(chain.rules) for chain in chain_rules(tables['filter'])) if 'filter' in tables else 0
+
+
+def input_length(filename):
+    """chain_length of a file (0 if it does not parse)."""
+    from iptables_parser import parse_iptables_save_file
+    try:
+        tables = parse_iptables_save_file(filename)
+    except RuntimeError:
+        return 0
+    return chain_length(tables)
+
+
+def run_case(filename, encoding, merge):
+    import z3
+    from iptables_parser import parse_iptables_save_file
+    from chain_encoding import iter_encoded_chunks
+
+    tables = parse_iptables_save_file(filename)
+    start = time.perf_counter()
+    text = "".join(iter_encoded_chunks(tables, encoding, merge))
+    generated = time.perf_counter()
+    assertions = z3.parse_smt2_string(text)
+    parsed = time.perf_counter()
+    solver = z3.Solver()
+    solver.add(list(assertions))
+    result = solver.check()
+    solved = time.perf_counter()
+    return {
+        "encoding": encoding,
+        "rules": chain_length(tables),
+        "chars": len(text),
+        "depth": nesting_depth(text),
+        "generate_seconds": round(generated - start, 4),
+        "parse_seconds": round(parsed - generated, 4),
+        "solve_seconds": round(solved - parsed, 4),
+        "result": str(result),
+    }
+
+
+def run_isolated(input_name, filename, encoding, merge):
+    command = [sys.executable, __file__, "--worker", encoding, filename] + (["--merge"] if merge else [])
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        result = {"encoding": encoding, "error": lines[-1] if lines else f"exit status {completed.returncode}"}
+    else:
+        result = json.loads(completed.stdout)
+    result["input"] = input_name
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SMT-LIB chain encoding benchmark")
+    parser.add_argument("--corpus", default=str(PROJECT_ROOT / "exampleIptables"))
+    parser.add_argument("--top", type=int, default=3, help="Corpus files with the longest INPUT paths to use")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated synthetic dump sizes in rules ('' for none)")
+    parser.add_argument("--encodings", default="nested,flat,tree")
+    parser.add_argument("--merge", action="store_true", help="Run the rule_merge pass first")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("files", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_case(args.files[0], args.worker, args.merge)))
+        return 0
+
+    import z3
+    from chain_encoding import ENCODINGS
+    encodings = [name for name in args.encodings.split(",") if name]
+    unknown = [name for name in encodings if name not in ENCODINGS]
+    if unknown:
+        parser.error(f"unknown encoding(s): {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    ranked = sorted(((input_length(filename), filename) for filename in corpus_files(args.corpus)), reverse=True)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = [(os.path.basename(filename), filename) for _, filename in ranked[:args.top]]
+        for size in sizes:
+            filename = os.path.join(directory, f"synthetic-{size}.rules")
+            write_synthetic_dump(filename, size)
+            inputs.append((f"synthetic-{size}", filename))
+        for input_name, filename in inputs:
+            for encoding in encodings:
+                result = run_isolated(input_name, filename, encoding, args.merge)
+                print(f"{input_name:36s} {encoding:7s} "
+                      + (f"{result['rules']:>6} rules  depth {result['depth']:>6}  "
+                         f"parse {result['parse_seconds']:>8.3f}s  solve {result['solve_seconds']:>8.3f}s"
+                         if "error" not in result else f"error: {result['error']}"),
+                      file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "python": platform.python_version(),
+        "z3": z3.get_version_string(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
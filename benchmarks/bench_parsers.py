@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Parser throughput and memory benchmark over the example corpus and synthetic dumps.
+
+Each (parser, input) case runs in a fresh interpreter so its peak RSS is its
+own. Results are printed (or written with --output) as JSON:
+
+  {"python": ..., "platform": ..., "results": [
+     {"parser": "iptables_parser", "input": "corpus", "files": 140,
+      "rules": 102390, "seconds": 0.71, "rules_per_sec": 144000,
+      "peak_rss_kb": 180000, "allocated_blocks": 2100000,
+      "tracemalloc_peak_bytes": null, "failures": ["iptables-save_6: ..."]},
+     ...]}
+
+allocated_blocks is the growth of sys.getallocatedblocks() while the parse
+result is still alive, i.e. the objects a parser keeps per rule.
+tracemalloc_peak_bytes is only measured with --tracemalloc, in a separate
+run, since tracing slows parsing down several times.
+
+Usage: python benchmarks/bench_parsers.py [--corpus DIR] [--sizes 1000,10000,...]
+           [--parsers a,b] [--repeat N] [--tracemalloc] [--output FILE]
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+
+# Parser name -> (module, callable taking a filename)
+PARSERS = {
+    "iptables_parser": ("iptables_parser", "parse_iptables_save_file"),
+    "iptables_parser_parallel": ("iptables_parser", "parse_iptables_save_parallel"),  # One worker per CPU
+    "iptables_parser_original": ("iptables_parser_original", "parse_iptables_save_file"),  # Needs python-iptables
+    "ruleset": ("ruleset", "RuleSet.from_file"),
+}
+
+
+def load_parser(name):
+    """Import a parser, so import time is not counted as parse time."""
+    module_name, attribute = PARSERS[name]
+    parse = importlib.import_module(module_name)
+    for part in attribute.split("."):
+        parse = getattr(parse, part)
+    return parse
+
+
+def count_rules(result):
+    """Rules in a parse result: a {name: table} dict or a RuleSet."""
+    if isinstance(result, dict):
+        return sum(len(chain.rules) for table in result.values() for chain in table.chains.values())
+    return len(result)
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+
+def corpus_files(corpus_dir):
+    return [str(path) for path in sorted(Path(corpus_dir).iterdir()) if path.is_file()]
+
+
+def write_synthetic_dump(filename, rules, seed=0):
+    """Write an iptables-save file with ``rules`` rules in the shapes common in the corpus."""
+    rng = random.Random(seed)
+    chains = ["INPUT", "FORWARD", "OUTPUT", "fail2ban-ssh", "ufw-user-input", "DOCKER"]
+    with open(filename, "w") as f:
+        f.write("# Generated by bench_parsers.py\n*filter\n")
+        for chain in chains:
+            f.write(f":{chain} {'DROP' if chain == 'INPUT' else 'ACCEPT' if chain.isupper() else '-'} [0:0]\n")
+        for i in range(rules):
+            chain = chains[i % len(chains)]
+            shape = rng.randrange(6)
+            address = f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.0/{rng.choice((8, 16, 24, 32))}"
+            port = rng.randrange(1, 65536)
+            if shape == 0:
+                f.write(f"-A {chain} -s {address} -p tcp -m tcp --dport {port} -j ACCEPT\n")
+            elif shape == 1:
+                f.write(f"-A {chain} -p tcp -m multiport --dports {port},{port // 2 + 1}:{port // 2 + 9} -j DROP\n")
+            elif shape == 2:
+                f.write(f"-A {chain} -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT\n")
+            elif shape == 3:
+                f.write(f"-A {chain} -s {address} -j REJECT --reject-with icmp-port-unreachable\n")
+            elif shape == 4:
+                f.write(f"-A {chain} -i eth{i % 4} -p udp -m udp --sport {port} -m comment --comment \"rule {i}\" -j ACCEPT\n")
+            else:
+                f.write(f"-A {chain} ! -d {address} -p tcp -m tcp --tcp-flags FIN,SYN,RST,ACK SYN -m limit --limit 5/min -j LOG\n")
+        f.write("COMMIT\n")
+
+
+def run_case(parser_name, files, repeat, trace):
+    """Parse ``files`` with one parser in this process and return the measurements."""
+    try:
+        parse = load_parser(parser_name)
+        gc.collect()
+        blocks_before = sys.getallocatedblocks()
+        if trace:
+            tracemalloc.start()
+        best = float("inf")
+        rules = 0
+        failures = []
+        for attempt in range(repeat):
+            results = []
+            rules = 0
+            failures = []
+            start = time.perf_counter()
+            for filename in files:
+                try:
+                    results.append(parse(filename))
+                except Exception as e:
+                    failures.append(f"{os.path.basename(filename)}: {e}")
+            elapsed = time.perf_counter() - start
+            best = min(best, elapsed)
+            rules = sum(count_rules(result) for result in results)
+            if attempt < repeat - 1:
+                del results  # Keep only the last run's results alive for allocated_blocks
+        traced_peak = tracemalloc.get_traced_memory()[1] if trace else None
+        if trace:
+            tracemalloc.stop()
+        gc.collect()
+        allocated_blocks = sys.getallocatedblocks() - blocks_before
+    except ImportError as e:
+        return {"parser": parser_name, "error": str(e)}
+
+    return {
+        "parser": parser_name,
+        "files": len(files),
+        "rules": rules,
+        "seconds": round(best, 4),
+        "rules_per_sec": round(rules / best) if best else None,
+        "peak_rss_kb": peak_rss_kb(),
+        "allocated_blocks": allocated_blocks,
+        "tracemalloc_peak_bytes": traced_peak,
+        "failures": failures,
+    }
+
+
+def run_isolated(parser_name, input_name, files, repeat, trace):
+    """Run one case in a fresh interpreter so its peak RSS is not shared."""
+    command = [sys.executable, __file__, "--worker", parser_name, "--repeat", str(repeat)]
+    if trace:
+        command.append("--tracemalloc")
+    completed = subprocess.run(command + files, capture_output=True, text=True)
+    if completed.returncode != 0:
+        lines = completed.stderr.strip().splitlines()
+        result = {"parser": parser_name, "error": lines[-1] if lines else f"exit status {completed.returncode}"}
+    else:
+        result = json.loads(completed.stdout)
+    result["input"] = input_name
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="iptables parser benchmark")
+    parser.add_argument("--corpus", default=str(PROJECT_ROOT / "exampleIptables"))
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated synthetic dump sizes in rules ('' for none)")
+    parser.add_argument("--parsers", default=",".join(PARSERS))
+    parser.add_argument("--repeat", type=int, default=1, help="Best-of-N timing")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also measure traced peak memory")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("files", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_case(args.worker, args.files, args.repeat, args.tracemalloc)))
+        return 0
+
+    parser_names = [name for name in args.parsers.split(",") if name]
+    unknown = [name for name in parser_names if name not in PARSERS]
+    if unknown:
+        parser.error(f"unknown parser(s): {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    results = []
+    inputs = [("corpus", corpus_files(args.corpus))]
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            filename = os.path.join(directory, f"synthetic-{size}.rules")
+            write_synthetic_dump(filename, size)
+            inputs.append((f"synthetic-{size}", [filename]))
+        for input_name, files in inputs:
+            for parser_name in parser_names:
+                result = run_isolated(parser_name, input_name, files, args.repeat, False)
+                if args.tracemalloc and "error" not in result:
+                    traced = run_isolated(parser_name, input_name, files, 1, True)
+                    result["tracemalloc_peak_bytes"] = traced.get("tracemalloc_peak_bytes")
+                print(f"{input_name:20s} {parser_name:26s} "
+                      + (f"{result['rules_per_sec']:>10,} rules/sec  {result['peak_rss_kb']:>9,} KiB peak"
+                         if "error" not in result else f"error: {result['error']}"),
+                      file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
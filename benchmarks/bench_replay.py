@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Time command replay of scripts that append (-A) or insert at the top (-I CHAIN 1).
+
+Usage: python benchmarks/bench_replay.py [--sizes 50000,100000,200000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from ingest import replay_commands
+
+
+def script(command, count):
+    """One rule command per line, each with a distinct port so no two rules are equal."""
+    return [f"iptables {command} -p tcp --dport {port % 65535 + 1} -s 10.{port // 65535}.0.0/16 -j ACCEPT"
+            for port in range(count)]
+
+
+def replay_seconds(lines):
+    start = time.perf_counter()
+    replay = replay_commands(lines)
+    elapsed = time.perf_counter() - start
+    assert not replay.errors
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command replay scaling benchmark")
+    parser.add_argument("--sizes", default="50000,100000,200000")
+    args = parser.parse_args()
+
+    print(f"{'rules':>8s} {'-A INPUT':>10s} {'-I INPUT 1':>12s}")
+    for count in (int(size) for size in args.sizes.split(',')):
+        append = replay_seconds(script("-A INPUT", count))
+        insert = replay_seconds(script("-I INPUT 1", count))
+        print(f"{count:8d} {append:9.2f}s {insert:11.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,36 @@
 from z3 import Solver, Z3Exception, parse_smt2_string, BoolRef, Implies, And, Not, unsat
 import sys
 
-def check_consistency(smt_file1_path, smt_file2_path):
-    try:
-        with open(smt_file1_path, 'r') as f1:
-            smt_content1 = f1.read()
-        with open(smt_file2_path, 'r') as f2:
-            smt_content2 = f2.read()
-
-        s = Solver()
-        parsed_smt1 = parse_smt2_string(smt_content1)
-        parsed_smt2 = parse_smt2_string(smt_content2)
-
-        if not parsed_smt1 or not parsed_smt1.assertions():
-            return False, "Error: SMT parsing failed or no assertions found for file 1."
-        if not parsed_smt2 or not parsed_smt2.assertions():
-            return False, "Error: SMT parsing failed or no assertions found for file 2."
 
-        f1 = And(parsed_smt1.assertions())
-        f2 = And(parsed_smt2.assertions())
+def load_formula(source, label):
+    """Return (formula, error) for an SMT-LIB file path or an in-process z3 Bool.
+
+    A BoolRef (e.g. from iptablesToSMT.smt_generator.generate_z3_from_tables)
+    is used as it is, without the serialize/parse round trip.
+    """
+    if isinstance(source, BoolRef):
+        return source, None
+    with open(source, 'r') as f:
+        smt_content = f.read()
+    assertions = list(parse_smt2_string(smt_content))  # An AstVector of the assertions
+    if not assertions:
+        return None, f"Error: SMT parsing failed or no assertions found for {label}."
+    formula = And(assertions)
+    if not isinstance(formula, BoolRef):
+        return None, f"Error: Expected boolean formula in SMT {label}."
+    return formula, None
 
 
-        if not isinstance(f1, BoolRef):
-            return False, "Error: Expected boolean formula in SMT file 1."
-        if not isinstance(f2, BoolRef):
-            return False, "Error: Expected boolean formula in SMT file 2."
-
+def check_consistency(smt_file1_path, smt_file2_path):
+    """Check two firewalls for equivalence; each is an SMT-LIB file path or a z3 Bool."""
+    try:
+        s = Solver()
+        f1, error = load_formula(smt_file1_path, "file 1")
+        if error:
+            return False, error
+        f2, error = load_formula(smt_file2_path, "file 2")
+        if error:
+            return False, error
 
         s.add(Not(And(Implies(f1, f2), Implies(f2, f1)))) # Check if negation of mutual implication is unsatisfiable
 
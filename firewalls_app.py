@@ -19,6 +19,7 @@ from translateToEBPFWithLLM.main import EBPFTranslator
 from translateToEBPFWithLLM.validator import validate_iptables_rules
 from translateToEBPFWithLLM.gui import FirewallToolGUI
 from iptablesToSMT.main import process_firewall
+from parse_cache import ParseCache
 from checkConsistency.main import check_consistency
 
 # Configure logging
@@ -41,6 +42,7 @@ class FirewallManager:
         self.translator = EBPFTranslator(model=self.config.get("model"))
         self.output_dir = PROJECT_ROOT / "output"
         self.output_dir.mkdir(exist_ok=True)
+        self.parse_cache = ParseCache(str(self.output_dir / ".parse_cache"))
         
     def _load_config(self, config_path: Optional[str]) -> Dict[str, Any]:
         """Load configuration from file or use defaults."""
@@ -88,7 +90,7 @@ class FirewallManager:
             
             # Generate SMT for input iptables rules
             iptables_smt = self.output_dir / f"{Path(input_file).stem}_iptables.smt2"
-            process_firewall(input_file, str(iptables_smt))
+            process_firewall(input_file, str(iptables_smt), cache=self.parse_cache)
             
             # Generate SMT for translated eBPF code
             ebpf_smt = self.output_dir / f"{Path(ebpf_file).stem}_ebpf.smt2"
@@ -3,9 +3,14 @@ from pathlib import Path
 import sys
 import subprocess
 import json
-import shutil
 from config import load_config
 
+# iptablesToSMT modules use flat imports
+sys.path.append(str(Path(__file__).parent.absolute() / "iptablesToSMT"))
+from iptablesToSMT.main import process_firewall
+from parse_cache import ParseCache
+from normalize import normalize_save_text
+
 def setup_gemini():
     """Setup Gemini API with configuration."""
     config = load_config()
@@ -74,17 +79,8 @@ def convert_ebpf_to_smt(ebpf_code):
         print(f"Error converting eBPF to SMT: {e}")
         raise
 
-def verify_conversion(iptables_rules_file, ebpf_smt_file):
+def verify_conversion(iptables_smt_file, ebpf_smt_file):
     """Verify the conversion using SMT solver."""
-    # Convert iptables to SMT using existing tool
-    iptables_smt_file = "iptables.smt2"
-    subprocess.run([
-        "python", 
-        "iptablesToSMT/main.py",
-        "--input", iptables_rules_file,
-        "--output", iptables_smt_file
-    ], check=True)
-    
     # Use checkConsistency tool to verify
     result = subprocess.run([
         "python",
@@ -102,6 +98,15 @@ def verify_conversion(iptables_rules_file, ebpf_smt_file):
 def convert_and_verify(input_file, max_attempts=3):
     """Main function to convert iptables to eBPF and verify with automatic retry."""
     attempts = 0
+    temp_output_dir = Path("temp_output")
+    parse_cache = ParseCache(str(temp_output_dir / ".parse_cache"))
+
+    # 1. iptables firewall (Input iptables rules), read and normalized once for every attempt
+    iptables_rules = read_iptables_rules(input_file)
+    # Duplicate and inert rules only make the prompt longer
+    iptables_rules, normalize_report = normalize_save_text(iptables_rules)
+    print(f"Normalized iptables rules: {normalize_report}")
+
     while attempts < max_attempts:
         try:
             attempts += 1
@@ -110,31 +115,12 @@ def convert_and_verify(input_file, max_attempts=3):
             # Setup Gemini model
             model = setup_gemini()
 
-            # 1. iptables firewall (Input iptables rules)
-            iptables_rules = read_iptables_rules(input_file)
-
             # 2. FireMason (Convert iptables to SMT Formula)
             print("Converting iptables to SMT Formula...")
-            # Create temporary directory structure for iptablesToSMT
-            temp_input_dir = Path("temp_input")
-            temp_output_dir = Path("temp_output")
-            temp_input_dir.mkdir(exist_ok=True)
-            temp_output_dir.mkdir(exist_ok=True)
-            
-            # Copy input file to temp directory
-            temp_input_file = temp_input_dir / "rules.txt"
-            shutil.copy2(input_file, temp_input_file)
-            
-            # Run iptablesToSMT
-            subprocess.run([
-                "python",
-                "iptablesToSMT/main.py",
-                str(temp_input_dir),
-                str(temp_output_dir)
-            ], check=True)
-            
-            # Find the generated SMT file
-            iptables_smt_file = str(temp_output_dir / "rules" / "output.smt2")
+            # The parse is cached by content, so retries skip re-parsing the rules
+            iptables_smt_file = process_firewall(
+                input_file, str(temp_output_dir / "rules" / "output.smt2"), cache=parse_cache
+            )
 
             # 3. LLM Optimization (Translate iptables to eBPF with Gemini)
             print("Translating iptables to optimized eBPF using Gemini...")
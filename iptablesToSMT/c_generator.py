@@ -0,0 +1,193 @@
+# iptablesToSMT/c_generator.py
+"""C emitters over the rule IR.
+
+generate_klee_harness() writes a stand-alone check_packet() for KLEE and
+klee_runner (the interface of iptables_rules.c, with the rules compiled in as
+straight-line tests instead of a table filled by init_rules()).
+generate_ebpf_checks() writes the same checks as an inline function for a TC
+program. Both read the INPUT chains as smt_generator does (rule_ir.chain_rules):
+each chain is one static function returning CHAIN_CONTINUE, CHAIN_ACCEPT or
+CHAIN_DROP, called by the rules that jump to it, and check_packet applies the
+INPUT policy to INPUT's outcome.
+"""
+from typing import Dict, Iterator, List
+
+from code_generator import WRITE_BUFFER_SIZE
+from rule_ir import C_FIELDS, EBPF_FIELDS, VERDICTS, RETURN, ChainIR, c_condition, input_policy, chain_rules
+
+KLEE_HEADER = """#include <stdio.h>
+#include <stdint.h>
+#include <stdbool.h>
+
+#ifdef USE_KLEE
+#include "klee/klee.h"
+#endif
+
+#define ACTION_DROP   0
+#define ACTION_ACCEPT 1
+
+void init_rules(void) {
+    // The rules are compiled into the chain functions
+}
+
+#define STATE_NEW         1
+#define STATE_ESTABLISHED 2
+#define STATE_RELATED     4
+#define STATE_INVALID     8
+
+#define CHAIN_CONTINUE 0
+#define CHAIN_ACCEPT   1
+#define CHAIN_DROP     2
+"""
+
+KLEE_CHECK = """
+int check_packet(uint32_t src_ip, uint32_t dst_ip, uint16_t src_port, uint16_t dst_port, int proto) {
+    uint8_t state = STATE_NEW;  // Connection state: a concrete packet opens a new connection
+#ifdef USE_KLEE
+    klee_make_symbolic(&state, sizeof(state), "connection_state");
+    klee_assume(state == STATE_NEW || state == STATE_ESTABLISHED ||
+                state == STATE_RELATED || state == STATE_INVALID);
+#endif
+    (void)state;  // Unused when there is no INPUT chain
+"""
+
+KLEE_MAIN = """
+#ifndef CONCRETE_TEST
+int main() {
+    uint32_t src_ip, dst_ip;
+    uint16_t src_port, dst_port;
+    int proto;
+
+#ifdef USE_KLEE
+    klee_make_symbolic(&src_ip, sizeof(src_ip), "src_ip");
+    klee_make_symbolic(&dst_ip, sizeof(dst_ip), "dst_ip");
+    klee_make_symbolic(&src_port, sizeof(src_port), "src_port");
+    klee_make_symbolic(&dst_port, sizeof(dst_port), "dst_port");
+    klee_make_symbolic(&proto, sizeof(proto), "proto");
+#else
+    // Default test values when not using KLEE
+    src_ip = 3232235876;  // 192.168.1.100
+    dst_ip = 0;
+    src_port = 1024;
+    dst_port = 80;
+    proto = 6;  // TCP
+#endif
+
+    init_rules();
+    int result = check_packet(src_ip, dst_ip, src_port, dst_port, proto);
+
+#ifdef USE_KLEE
+    if (result == ACTION_ACCEPT) {
+        klee_warning("ACCEPT");
+        klee_assert(result == ACTION_ACCEPT);
+    } else {
+        klee_warning("DROP");
+        klee_assert(result == ACTION_DROP);
+    }
+#endif
+    return result;
+}
+#endif
+"""
+
+# The TC program parses the headers and reads conntrack state before calling
+# check_packet; UDP ports are read through tcph, whose first two fields match udphdr.
+EBPF_HEADER = """#include <linux/bpf.h>
+#include <linux/pkt_cls.h>
+#include <linux/ip.h>
+#include <linux/tcp.h>
+#include <linux/icmp.h>
+#include <bpf/bpf_endian.h>
+
+#define CHAIN_CONTINUE 0
+#define CHAIN_ACCEPT   1
+#define CHAIN_DROP     2
+"""
+
+EBPF_CHECK = """
+static __always_inline int check_packet(struct __sk_buff *skb, struct iphdr *iph, struct tcphdr *tcph,
+                                        struct icmphdr *icmph, __u8 ct_state) {
+"""
+
+
+# Parameters and arguments of the chain functions: check_packet's, plus the KLEE harness's local state
+KLEE_PARAMETERS = "uint32_t src_ip, uint32_t dst_ip, uint16_t src_port, uint16_t dst_port, int proto, uint8_t state"
+KLEE_ARGUMENTS = "src_ip, dst_ip, src_port, dst_port, proto, state"
+EBPF_PARAMETERS = "struct __sk_buff *skb, struct iphdr *iph, struct tcphdr *tcph, struct icmphdr *icmph, __u8 ct_state"
+EBPF_ARGUMENTS = "skb, iph, tcph, icmph, ct_state"
+
+
+def _input_chains(tables) -> List[ChainIR]:
+    return chain_rules(tables['filter']) if 'filter' in tables else []
+
+
+def _iter_chains(chains: List[ChainIR], fields: dict, declaration: str, parameters: str,
+                 arguments: str) -> Iterator[str]:
+    """Yield one function per chain, callees first."""
+    names: Dict[str, str] = {}
+    for index, chain in enumerate(chains):
+        yield f"\n// Chain {chain.name}\n{declaration} chain_{index}({parameters}) {{\n"
+        if any(ir.action not in VERDICTS and ir.action != RETURN and not ir.goto for ir in chain.rules):
+            yield "    int outcome;\n"
+        for rule_idx, ir in enumerate(chain.rules):
+            condition = c_condition(ir, fields)
+            yield f"    // Rule {rule_idx + 1}: {'goto ' if ir.goto else ''}{ir.action}\n"
+            if ir.action in VERDICTS:
+                yield f"    if ({condition})\n        return {'CHAIN_ACCEPT' if VERDICTS[ir.action] else 'CHAIN_DROP'};\n"
+            elif ir.action == RETURN:
+                yield f"    if ({condition})\n        return CHAIN_CONTINUE;\n"
+            elif ir.goto:
+                yield f"    if ({condition})\n        return {names[ir.action]}({arguments});\n"
+            else:  # A jump returns only when the jumped-to chain decides
+                yield (f"    if ({condition} && (outcome = {names[ir.action]}({arguments})) != CHAIN_CONTINUE)\n"
+                       f"        return outcome;\n")
+        yield "    return CHAIN_CONTINUE;\n}\n"
+        names[chain.name] = f"chain_{index}"
+
+
+def _iter_verdict(tables, chains: List[ChainIR], arguments: str, accept: str, drop: str) -> Iterator[str]:
+    policy = accept if input_policy(tables) else drop
+    if not chains:
+        yield f"    return {policy};  // No INPUT chain\n}}\n"
+        return
+    yield f"    switch (chain_{len(chains) - 1}({arguments})) {{  // INPUT\n"
+    yield f"    case CHAIN_ACCEPT:\n        return {accept};\n"
+    yield f"    case CHAIN_DROP:\n        return {drop};\n"
+    yield f"    default:\n        return {policy};  // Chain policy\n    }}\n}}\n"
+
+
+def iter_klee_chunks(tables) -> Iterator[str]:
+    """Yield the KLEE harness in order, a chain at a time."""
+    chains = _input_chains(tables)
+    yield KLEE_HEADER
+    yield from _iter_chains(chains, C_FIELDS, "static int", KLEE_PARAMETERS, KLEE_ARGUMENTS)
+    yield KLEE_CHECK
+    yield from _iter_verdict(tables, chains, KLEE_ARGUMENTS, "ACTION_ACCEPT", "ACTION_DROP")
+    yield KLEE_MAIN
+
+
+def iter_ebpf_chunks(tables) -> Iterator[str]:
+    """Yield the TC check functions in order, a chain at a time."""
+    chains = _input_chains(tables)
+    yield EBPF_HEADER
+    yield from _iter_chains(chains, EBPF_FIELDS, "static __always_inline int", EBPF_PARAMETERS, EBPF_ARGUMENTS)
+    yield EBPF_CHECK
+    yield from _iter_verdict(tables, chains, EBPF_ARGUMENTS, "TC_ACT_OK", "TC_ACT_SHOT")
+
+
+def _write(chunks: Iterator[str], output_file: str) -> int:
+    written = 0
+    with open(output_file, 'w', buffering=WRITE_BUFFER_SIZE) as f:
+        for chunk in chunks:
+            written += f.write(chunk)
+    return written
+
+
+def generate_klee_harness(tables, output_file: str) -> int:
+    """Write the KLEE harness (e.g. output.c for klee_runner); returns the characters written."""
+    return _write(iter_klee_chunks(tables), output_file)
+
+
+def generate_ebpf_checks(tables, output_file: str) -> int:
+    """Write the TC check function; returns the characters written."""
+    return _write(iter_ebpf_chunks(tables), output_file)
@@ -0,0 +1,180 @@
+# iptablesToSMT/chain_encoding.py
+"""Selectable SMT-LIB encodings of the first-match order of the INPUT chains.
+
+Each script declares the packet fields and, for every chain a packet
+entering INPUT can traverse (rule_ir.chain_rules, callees first), one Bool
+``chain<k>_rule_<i>`` per rule and a 2-bit ``chain_<k>`` with the chain's
+outcome: #b00 falls through (RETURN or the end of the chain), #b01 accepts
+and #b10 drops. A jump to a chain refers to that chain's ``chain_<j>``, so
+a chain several rules jump to is defined once. Each chain's first-match
+order is encoded in one of three ways:
+
+  nested  (ite rule_0 v0 (ite rule_1 v1 ... #b00)): one ite per rule,
+          nested as deep as the chain is long.
+  flat    an index ``first_match_<k>`` of the first deciding rule (the rule
+          count when none decides), pinned by two flat guard assertions per
+          rule. The outcome's bits are 'or's of index tests. Nothing nests
+          more than a few levels, but the script has extra variables, so it
+          suits satisfiability queries, not checkConsistency's equivalence
+          check.
+  tree    a balanced tree over rule ranges. Each range defines whether one of
+          its rules decides and the outcome of the first that does, from its
+          two halves. The nesting depth is log2 of the rule count.
+
+``accepted`` applies the INPUT policy to INPUT's outcome and every script
+ends with (assert accepted).
+
+Usage: python chain_encoding.py FILE [--encoding nested|flat|tree] [--merge] [--output FILE]
+"""
+import argparse
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from smt_generator import PACKET_FIELDS
+from rule_ir import (VERDICTS, RETURN, CONTINUE, ACCEPTED, DROPPED, ChainIR, input_policy, smt_condition,
+                     chain_rules)
+from rule_merge import MergeReport, merge_chains
+
+ENCODINGS = ("nested", "flat", "tree")
+
+
+def _outcome(value: int) -> str:
+    return f"#b{value:02b}"
+
+
+def _chains(tables, merge: bool) -> Tuple[List[ChainIR], Optional[MergeReport]]:
+    chains = chain_rules(tables['filter']) if 'filter' in tables else []
+    if merge:
+        return merge_chains(chains)
+    return chains, None
+
+
+def _steps(index: int, chain: ChainIR, names: Dict[str, str]) -> List[Tuple[str, str]]:
+    """(decides, outcome) of each rule of a chain, over its chain<index>_rule_<i> conditions."""
+    steps = []
+    for position, ir in enumerate(chain.rules):
+        rule = f"chain{index}_rule_{position}"
+        if ir.action in VERDICTS:
+            steps.append((rule, _outcome(ACCEPTED if VERDICTS[ir.action] else DROPPED)))
+        elif ir.action == RETURN:
+            steps.append((rule, _outcome(CONTINUE)))
+        elif ir.goto:
+            steps.append((rule, names[ir.action]))
+        else:  # A jump decides when the jumped-to chain does
+            callee = names[ir.action]
+            steps.append((f"(and {rule} (not (= {callee} {_outcome(CONTINUE)})))", callee))
+    return steps
+
+
+def _iter_nested(index: int, steps: List[Tuple[str, str]]) -> Iterator[str]:
+    yield f"(define-fun chain_{index} () (_ BitVec 2)\n"
+    for decides, outcome in steps:
+        yield f" (ite {decides} {outcome}\n"
+    yield f"  {_outcome(CONTINUE)}" + ")" * len(steps) + ")\n"
+
+
+def _iter_flat(index: int, steps: List[Tuple[str, str]]) -> Iterator[str]:
+    count = len(steps)
+    width = max(count.bit_length(), 1)
+    first_match = f"first_match_{index}"
+    yield f"(declare-fun {first_match} () (_ BitVec {width}))\n"
+    yield f"(assert (bvule {first_match} (_ bv{count} {width})))\n"
+    accepting, dropping = [], []
+    for position, (decides, outcome) in enumerate(steps):
+        chosen = f"(= {first_match} (_ bv{position} {width}))"
+        # The index rule decides, and no later index is chosen when this rule decides
+        yield f"(assert (=> {chosen} {decides}))\n"
+        yield f"(assert (=> {decides} (bvule {first_match} (_ bv{position} {width}))))\n"
+        if outcome == _outcome(ACCEPTED):
+            accepting.append(chosen)
+        elif outcome == _outcome(DROPPED):
+            dropping.append(chosen)
+        elif outcome != _outcome(CONTINUE):  # Another chain's outcome
+            accepting.append(f"(and {chosen} (= {outcome} {_outcome(ACCEPTED)}))")
+            dropping.append(f"(and {chosen} (= {outcome} {_outcome(DROPPED)}))")
+    for name, tests in (("accept", accepting), ("drop", dropping)):
+        body = "false" if not tests else tests[0] if len(tests) == 1 else f"(or {' '.join(tests)})"
+        yield f"(define-fun {name}_{index} () Bool {body})\n"
+    yield (f"(define-fun chain_{index} () (_ BitVec 2) "
+           f"(concat (ite drop_{index} #b1 #b0) (ite accept_{index} #b1 #b0)))\n")
+
+
+def _iter_tree(index: int, steps: List[Tuple[str, str]]) -> Iterator[str]:
+    if not steps:
+        yield f"(define-fun chain_{index} () (_ BitVec 2) {_outcome(CONTINUE)})\n"
+        return
+
+    def define(low: int, high: int) -> Iterator[str]:
+        # decides_<k>_<low>_<high>: a rule in [low, high) decides; outcome_<k>_<low>_<high>: that of the first one
+        if high - low == 1:
+            return
+        middle = (low + high) // 2
+        yield from define(low, middle)
+        yield from define(middle, high)
+        left, right = names(low, middle), names(middle, high)
+        yield f"(define-fun decides_{index}_{low}_{high} () Bool (or {left[0]} {right[0]}))\n"
+        yield f"(define-fun outcome_{index}_{low}_{high} () (_ BitVec 2) (ite {left[0]} {left[1]} {right[1]}))\n"
+
+    def names(low: int, high: int):
+        if high - low == 1:
+            return steps[low]
+        return f"decides_{index}_{low}_{high}", f"outcome_{index}_{low}_{high}"
+
+    yield from define(0, len(steps))
+    decides, outcome = names(0, len(steps))
+    yield f"(define-fun chain_{index} () (_ BitVec 2) (ite {decides} {outcome} {_outcome(CONTINUE)}))\n"
+
+
+def iter_encoded_chunks(tables, encoding: str = "nested", merge: bool = False) -> Iterator[str]:
+    """Yield the SMT-LIB script of the filter table's INPUT path in the chosen encoding."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"unknown encoding '{encoding}' (expected one of {', '.join(ENCODINGS)})")
+    yield "(set-logic QF_BV)\n"
+    for field, width in PACKET_FIELDS.items():
+        yield f"(declare-fun {field} () (_ BitVec {width}))\n"
+    yield "(define-fun apply_mask ((ip (_ BitVec 32)) (mask (_ BitVec 32))) (_ BitVec 32) (bvand ip mask))\n"
+
+    encoder = {"nested": _iter_nested, "flat": _iter_flat, "tree": _iter_tree}[encoding]
+    chains, report = _chains(tables, merge)
+    if report is not None:
+        yield f"; {report}\n"
+    predicate_texts = {}
+    names: Dict[str, str] = {}
+    for index, chain in enumerate(chains):
+        yield f"; chain {chain.name}\n"
+        for position, ir in enumerate(chain.rules):
+            yield f"(define-fun chain{index}_rule_{position} () Bool {smt_condition(ir, predicate_texts)})\n"
+        yield from encoder(index, _steps(index, chain, names))
+        names[chain.name] = f"chain_{index}"
+
+    if 'INPUT' not in names:
+        accepted = "true"  # No INPUT chain: nothing is dropped
+    elif input_policy(tables):
+        accepted = f"(not (= {names['INPUT']} {_outcome(DROPPED)}))"
+    else:
+        accepted = f"(= {names['INPUT']} {_outcome(ACCEPTED)})"
+    yield f"(define-fun accepted () Bool {accepted})\n"
+    yield "(assert accepted)\n"
+
+
+def main(argv=None):
+    from iptables_parser import parse_iptables_save_file
+    from code_generator import generate_c_code
+
+    parser = argparse.ArgumentParser(description="Encode an iptables-save file's INPUT path as SMT-LIB")
+    parser.add_argument("file")
+    parser.add_argument("--encoding", choices=ENCODINGS, default="nested")
+    parser.add_argument("--merge", action="store_true", help="Merge same-action rule runs first (rule_merge)")
+    parser.add_argument("--output", help="Write here instead of stdout ('.gz' compresses)")
+    args = parser.parse_args(argv)
+
+    tables = parse_iptables_save_file(args.file)
+    if args.output:
+        generate_c_code(tables, args.output, merge=args.merge, encoding=args.encoding)
+    else:
+        sys.stdout.writelines(iter_encoded_chunks(tables, args.encoding, args.merge))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
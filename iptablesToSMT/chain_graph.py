@@ -0,0 +1,156 @@
+# iptablesToSMT/chain_graph.py
+"""Jump graph of the chains of an iptables table.
+
+Every '-j <chain>' or '-g <chain>' rule is an edge from its chain to the
+target chain. Packets only enter a table through its built-in chains, so a
+user chain that no built-in chain reaches is dead and can be pruned before
+formulas or code are generated.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from iptables_rule_classes import IPTablesTable
+
+# Chains attached to a netfilter hook; every other chain is only entered by a jump
+BUILTIN_CHAINS = ("PREROUTING", "INPUT", "FORWARD", "OUTPUT", "POSTROUTING")
+RETURN = "RETURN"
+
+
+class Edge(NamedTuple):
+    index: int    # position of the jumping rule in its chain
+    target: str   # user chain jumped to
+    goto: bool    # -g: a RETURN in the target resumes in the caller's caller
+
+
+class ChainGraph:
+    """Jump/goto edges, RETURN points and reachability of one table's chains.
+
+    The graph is built in one pass over the rules and then only refers to
+    chains by name, so it works for IPTablesTable objects with rule lists and
+    for RuleSet.as_tables() views alike.
+    """
+
+    def __init__(self, table: IPTablesTable):
+        self.table = table
+        self.edges: Dict[str, List[Edge]] = {}
+        self.returns: Dict[str, List[int]] = {}   # chain -> indexes of its RETURN rules
+        self.callers: Dict[str, List[str]] = {name: [] for name in table.chains}
+        self.hooks = [name for name in table.chains if name in BUILTIN_CHAINS]
+
+        user_chains = {name for name in table.chains if name not in BUILTIN_CHAINS}
+        for name, chain in table.chains.items():
+            edges = self.edges[name] = []
+            returns = self.returns[name] = []
+            for index, rule in enumerate(chain.rules):
+                action = rule.action
+                if action in user_chains:
+                    edges.append(Edge(index, action, bool(getattr(rule, 'goto', False))))
+                    if name not in self.callers[action]:
+                        self.callers[action].append(name)
+                elif action == RETURN:
+                    returns.append(index)
+
+    def targets(self, chain: str) -> List[str]:
+        """Chains jumped to from ``chain``, in rule order, without repeats."""
+        return list(dict.fromkeys(edge.target for edge in self.edges[chain]))
+
+    def reachable(self, hooks: Optional[Iterable[str]] = None) -> Set[str]:
+        """Chains reachable from the given built-in chains (default: all of them)."""
+        stack = list(self.hooks if hooks is None else hooks)
+        seen = set(stack)
+        while stack:
+            for edge in self.edges[stack.pop()]:
+                if edge.target not in seen:
+                    seen.add(edge.target)
+                    stack.append(edge.target)
+        return seen
+
+    def unreachable(self) -> List[str]:
+        """User chains that no built-in chain reaches, in table order."""
+        reachable = self.reachable()
+        return [name for name in self.table.chains if name not in reachable]
+
+    def cycles(self) -> List[List[str]]:
+        """Chains that can jump back to themselves, one list per cycle.
+
+        iptables refuses to load looping rulesets, so this is only non-empty
+        for hand-written or corrupted dumps. Uses an iterative Tarjan
+        strongly-connected-components pass.
+        """
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        cycles = []
+        for root in self.table.chains:
+            if root in index:
+                continue
+            work = [(root, iter(self.targets(root)))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self.targets(child))))
+                        break
+                    if child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+                    if lowlink[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        if len(component) > 1 or node in self.targets(node):
+                            cycles.append(component[::-1])
+        return cycles
+
+    def topological_order(self) -> List[str]:
+        """All chains, each after every chain it jumps to.
+
+        Raises ValueError if the chains contain a cycle.
+        """
+        cycles = self.cycles()
+        if cycles:
+            raise ValueError(f"chain loop in table {self.table.name}: {' -> '.join(cycles[0])}")
+        order = []
+        done: Set[str] = set()
+        for root in self.table.chains:
+            if root in done:
+                continue
+            done.add(root)
+            work = [(root, iter(self.targets(root)))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in done:
+                        done.add(child)
+                        work.append((child, iter(self.targets(child))))
+                        break
+                else:
+                    work.pop()
+                    order.append(node)
+        return order
+
+    def prune(self) -> IPTablesTable:
+        """Copy of the table without its unreachable chains (chains are shared)."""
+        reachable = self.reachable()
+        pruned = IPTablesTable(self.table.name)
+        pruned.chains = {name: chain for name, chain in self.table.chains.items() if name in reachable}
+        return pruned
+
+
+def prune_unreachable(tables: dict) -> dict:
+    """Tables with the chains that no built-in chain reaches removed."""
+    return {name: ChainGraph(table).prune() for name, table in tables.items()}
@@ -0,0 +1,267 @@
+# iptablesToSMT/corpus_export.py
+"""Export a directory of rule files to a columnar NumPy .npz archive.
+
+Every rule of every file becomes one row across flat numeric columns, so a
+corpus can be analysed in one vectorized step, e.g.
+
+    data = numpy.load("corpus.npz")
+    numpy.bincount(data["src_length"][data["src_family"] == 4], minlength=33)
+
+Columns (one entry per rule):
+  file, table, chain, position      ids into the files/tables/chains vocabularies
+  proto                             IP protocol number, -1 for any
+  src_family, src_length            4, 6 or 0 (any) and the prefix length
+  src_network_hi, src_network_lo    network address as two uint64 halves
+  dst_*                             the same for the destination
+  sport_low, sport_high, sport_ranges   bounds and range count of the port set
+  dport_*                           the same for destination ports
+  in_interface, out_interface, action   ids into their vocabularies (0 = "")
+  negated                           bit mask of NEGATION_BITS
+  goto                              1 if the target was given with -g
+  packets, bytes                    iptables-save -c counters
+Match modules are a CSR pair: the modules of rule i are
+match_modules[match_ids[match_offsets[i]:match_offsets[i + 1]]].
+
+The .npy members are written directly (format version 1.0), so exporting
+does not need NumPy; load_export() uses numpy.load when it is installed.
+
+Usage: python corpus_export.py INPUT_DIR OUTPUT.npz [--shard-rules N] [--max-files N] [--compress]
+"""
+import argparse
+import ast
+import os
+import struct
+import sys
+import zipfile
+from array import array
+from typing import Dict, List, Optional
+
+from ingest import find_rule_files, load_ruleset
+from ruleset import RuleSet
+
+# Bits of the 'negated' column
+NEGATION_BITS = {'-s': 1, '--source': 1, '--src': 1, '-d': 2, '--destination': 2, '--dst': 2,
+                 '-p': 4, '--protocol': 4, '-i': 8, '--in-interface': 8, '-o': 16, '--out-interface': 16,
+                 '--sport': 32, '--source-port': 32, '--dport': 64, '--destination-port': 64}
+
+# Column name -> array typecode and the matching little-endian NumPy dtype
+COLUMNS = {
+    "file": 'I', "table": 'I', "chain": 'I', "position": 'I', "proto": 'h',
+    "src_family": 'B', "src_length": 'B', "src_network_hi": 'Q', "src_network_lo": 'Q',
+    "dst_family": 'B', "dst_length": 'B', "dst_network_hi": 'Q', "dst_network_lo": 'Q',
+    "sport_low": 'H', "sport_high": 'H', "sport_ranges": 'H',
+    "dport_low": 'H', "dport_high": 'H', "dport_ranges": 'H',
+    "in_interface": 'I', "out_interface": 'I', "action": 'I',
+    "negated": 'B', "goto": 'B', "packets": 'Q', "bytes": 'Q',
+    "match_offsets": 'I', "match_ids": 'I',
+}
+VOCABULARIES = ("files", "tables", "chains", "interfaces", "actions", "match_modules")
+_DTYPES = {'B': '|u1', 'H': '<u2', 'h': '<i2', 'I': '<u4', 'Q': '<u8'}
+_MAGIC = b"\x93NUMPY\x01\x00"
+_LOW_64 = (1 << 64) - 1
+
+
+class Vocabulary:
+    """Strings numbered in order of first use; id 0 is the empty string."""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {"": 0}
+        self.values: List[str] = [""]
+
+    def __call__(self, value: Optional[str]) -> int:
+        value = value or ""
+        vid = self.ids.get(value)
+        if vid is None:
+            vid = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return vid
+
+
+class CorpusColumns:
+    """Accumulates the columns and vocabularies of one archive (or shard)."""
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self.columns["match_offsets"].append(0)
+        self.vocabularies = {name: Vocabulary() for name in VOCABULARIES}
+        self.rules = 0
+
+    def add_ruleset(self, file_name: str, ruleset: RuleSet):
+        """Append every rule of a RuleSet, reading its columns directly."""
+        c = self.columns
+        vocab = self.vocabularies
+        file_id = vocab["files"](file_name)
+        strings, prefixes, port_sets = ruleset.strings, ruleset.prefixes, ruleset.port_sets
+        interfaces, actions, modules = vocab["interfaces"], vocab["actions"], vocab["match_modules"]
+        for table, chain, rows in ruleset.iter_chains():
+            table_id, chain_vid = vocab["tables"](table), vocab["chains"](chain)
+            for position, row in enumerate(rows):
+                c["file"].append(file_id)
+                c["table"].append(table_id)
+                c["chain"].append(chain_vid)
+                c["position"].append(position)
+                c["proto"].append(ruleset.protos[row])
+                for side, column in (("src", ruleset.src_prefixes), ("dst", ruleset.dst_prefixes)):
+                    family, network, length = prefixes.get(column[row])
+                    c[side + "_family"].append(family)
+                    c[side + "_length"].append(length)
+                    c[side + "_network_hi"].append(network >> 64)
+                    c[side + "_network_lo"].append(network & _LOW_64)
+                for side, column in (("sport", ruleset.sport_sets), ("dport", ruleset.dport_sets)):
+                    low, high = port_sets.bounds(column[row])
+                    c[side + "_low"].append(low)
+                    c[side + "_high"].append(high)
+                    c[side + "_ranges"].append(len(port_sets.get(column[row])))
+                c["in_interface"].append(interfaces(strings[ruleset.in_ifaces[row]]))
+                c["out_interface"].append(interfaces(strings[ruleset.out_ifaces[row]]))
+                c["action"].append(actions(strings[ruleset.actions[row]]))
+                negated = 0
+                for flag in ruleset.negations.get(row, ()):
+                    negated |= NEGATION_BITS.get(flag, 0)
+                c["negated"].append(negated)
+                c["goto"].append(row in ruleset.gotos)
+                c["packets"].append(ruleset.packet_counts[row])
+                c["bytes"].append(ruleset.byte_counts[row])
+                c["match_ids"].extend(modules(name) for name in ruleset.matches.get(row, ()))
+                c["match_offsets"].append(len(c["match_ids"]))
+                self.rules += 1
+
+    def members(self) -> Dict[str, bytes]:
+        """The .npy files of the archive, by member name."""
+        members = {name: _npy(_DTYPES[column.typecode], len(column), _little_endian(column))
+                   for name, column in self.columns.items()}
+        for name, vocabulary in self.vocabularies.items():
+            members[name] = _string_npy(vocabulary.values)
+        return members
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder == "big" and column.itemsize > 1:
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _npy(descr: str, length: int, data: bytes) -> bytes:
+    """A 1-D .npy file (format 1.0) holding ``data``."""
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': (length,)}).encode('latin1')
+    padding = 64 - (len(_MAGIC) + 2 + len(header) + 1) % 64
+    header += b' ' * (padding % 64) + b'\n'
+    return _MAGIC + struct.pack('<H', len(header)) + header + data
+
+
+def _string_npy(values: List[str]) -> bytes:
+    """A 1-D .npy array of fixed-width unicode strings ('<U' dtype, UTF-32)."""
+    width = max((len(value) for value in values), default=0) or 1
+    data = b"".join(value.ljust(width, "\0").encode('utf-32-le') for value in values)
+    return _npy(f'<U{width}', len(values), data)
+
+
+def _read_npy(data: bytes):
+    """Decode a .npy member written by this module: an array or a list of str."""
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("not a version 1.0 .npy member")
+    header_length = struct.unpack_from('<H', data, len(_MAGIC))[0]
+    start = len(_MAGIC) + 2
+    header = ast.literal_eval(data[start:start + header_length].decode('latin1'))
+    body = data[start + header_length:]
+    descr = header['descr']
+    if descr.startswith('<U'):
+        width = int(descr[2:])
+        return [body[i:i + 4 * width].decode('utf-32-le').rstrip("\0")
+                for i in range(0, len(body), 4 * width)]
+    typecode = {dtype: typecode for typecode, dtype in _DTYPES.items()}[descr]
+    column = array(typecode, body)
+    if sys.byteorder == "big" and column.itemsize > 1:
+        column.byteswap()
+    return column
+
+
+def write_archive(filename: str, corpus: CorpusColumns, compress: bool = False):
+    """Write the columns as an .npz archive (a zip of .npy members)."""
+    method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    temp_name = filename + ".tmp"
+    with zipfile.ZipFile(temp_name, "w", method) as archive:
+        for name, data in corpus.members().items():
+            archive.writestr(name + ".npy", data)
+    os.replace(temp_name, filename)
+
+
+def load_export(filename: str) -> dict:
+    """Load an exported archive: NumPy arrays if NumPy is installed, else arrays/lists."""
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        with numpy.load(filename) as data:
+            return {name: data[name] for name in data.files}
+    with zipfile.ZipFile(filename) as archive:
+        return {name[:-4]: _read_npy(archive.read(name)) for name in archive.namelist()}
+
+
+def shard_name(filename: str, index: int) -> str:
+    root, extension = os.path.splitext(filename)
+    return f"{root}-{index:05d}{extension or '.npz'}"
+
+
+def export_directory(input_dir: str, output_file: str, shard_rules: Optional[int] = None,
+                     max_files: Optional[int] = None, compress: bool = False, cache=None) -> dict:
+    """Parse every file under input_dir and export the rules.
+
+    Files are visited with the same traversal as main.process_directory and
+    read by ingest.load_ruleset, so iptables-save dumps and command scripts
+    are both accepted. With ``shard_rules``, a new shard (each one a
+    self-contained archive with its own vocabularies) is started once the
+    current one holds that many rules; a file is never split across shards.
+    ``cache`` is an optional parse_cache.ParseCache. Returns a summary dict.
+    """
+    summary = {"files": 0, "rules": 0, "archives": [], "failures": []}
+    corpus = CorpusColumns()
+
+    def flush():
+        nonlocal corpus
+        name = output_file if shard_rules is None else shard_name(output_file, len(summary["archives"]))
+        write_archive(name, corpus, compress)
+        summary["archives"].append(name)
+        corpus = CorpusColumns()
+
+    for rel_path in find_rule_files(input_dir, max_files):
+        path = os.path.join(input_dir, rel_path)
+        try:
+            ruleset = cache.load(path) if cache is not None else load_ruleset(path)
+        except RuntimeError as e:
+            summary["failures"].append(f"{rel_path}: {e}")
+            continue
+        corpus.add_ruleset(rel_path, ruleset)
+        summary["files"] += 1
+        summary["rules"] += len(ruleset)
+        if shard_rules is not None and corpus.rules >= shard_rules:
+            flush()
+    if corpus.rules or not summary["archives"]:
+        flush()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a directory of rule files to a columnar .npz archive")
+    parser.add_argument("input_dir")
+    parser.add_argument("output", help="Archive name; shards get a -NNNNN suffix")
+    parser.add_argument("--shard-rules", type=int, help="Start a new shard after this many rules")
+    parser.add_argument("--max-files", type=int)
+    parser.add_argument("--compress", action="store_true", help="Deflate the archive members")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: {args.input_dir} is not a directory", file=sys.stderr)
+        return 1
+    summary = export_directory(args.input_dir, args.output, args.shard_rules, args.max_files, args.compress)
+    print(f"Exported {summary['rules']} rules from {summary['files']} files to "
+          f"{', '.join(summary['archives'])}")
+    for failure in summary["failures"]:
+        print(f"Skipped {failure}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
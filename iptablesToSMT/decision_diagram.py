@@ -0,0 +1,372 @@
+# iptablesToSMT/decision_diagram.py
+"""Compile the INPUT path's first-match rules into a reduced decision diagram.
+
+The diagram is an ordered multi-valued decision diagram over the packet
+fields of the model, in FIELDS order. Each node tests one field and has one
+child per interval of its values, and the leaves are the verdicts (True
+accepts; None, in the diagram of a user chain, falls through). Nodes are
+hash-consed, adjacent intervals with the same child are merged and a node
+whose intervals all lead to the same child is skipped.
+As a result, the size of the diagram follows the distinct decision structure
+of the chain and not its rule count. Shadowed and redundant rules add
+nothing.
+
+    diagram = compile_tables(tables)
+    diagram.evaluate(src_ip=0x0a000001, proto=6, dst_port=22)
+    diagram.to_smtlib()      # one define-fun per node, then (assert accepted)
+
+Usage: python decision_diagram.py FILE [--output FILE]
+
+Chains are read the way smt_generator reads them (rule_ir.chain_rules, then
+the INPUT policy), so the formulas are equivalent. A match module whose
+SMT-LIB text is not a test on the packet fields this module knows (a module
+registered elsewhere) cannot be compiled: DiagramError is raised and the
+caller keeps the ite encoding.
+"""
+import argparse
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from prefix_table import PREFIXES
+from port_set import PORT_SETS
+from match_modules import IpRangeMatch, MultiportMatch, get_match_module
+from rule_ir import (ProtoTest, PrefixTest, PortTest, AddressRangeTest, StateTest, VERDICTS, RETURN, input_policy,
+                     chain_rules)
+from smt_generator import PACKET_FIELDS
+from ingest import load_tables
+
+# Field order of the diagram, with the largest value of each field
+FIELDS = ("proto", "src_ip", "dst_ip", "src_port", "dst_port", "state")
+FIELD_MAX = {field: (1 << PACKET_FIELDS[field]) - 1 for field in FIELDS}
+
+Intervals = List[Tuple[int, int]]  # sorted, disjoint, inclusive
+Box = Dict[str, Intervals]         # field -> allowed values; missing fields are unconstrained
+
+
+class DiagramError(ValueError):
+    """A rule has a test the diagram cannot represent."""
+
+
+class Node:
+    """A decision on FIELDS[level]: edges are (high, child) with increasing
+    inclusive upper bounds, the last one being the field's maximum."""
+    __slots__ = ("level", "edges")
+
+    def __init__(self, level: int, edges: Tuple[Tuple[int, object], ...]):
+        self.level = level
+        self.edges = edges
+
+
+def _complement(intervals: Intervals, field: str) -> Intervals:
+    result, low = [], 0
+    for start, end in intervals:
+        if start > low:
+            result.append((low, start - 1))
+        low = end + 1
+    if low <= FIELD_MAX[field]:
+        result.append((low, FIELD_MAX[field]))
+    return result
+
+
+def _intersect(a: Intervals, b: Intervals) -> Intervals:
+    result, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        low, high = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if low <= high:
+            result.append((low, high))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def _state_values(states: int, negated: bool) -> Intervals:
+    values = [value for value in range(FIELD_MAX["state"] + 1) if bool(value & states) != negated]
+    result = []
+    for value in values:
+        if result and result[-1][1] == value - 1:
+            result[-1] = (result[-1][0], value)
+        else:
+            result.append((value, value))
+    return result
+
+
+def _field_test(field: str, intervals: Intervals, negated: bool) -> List[Box]:
+    return [{field: _complement(intervals, field) if negated else list(intervals)}]
+
+
+def predicate_boxes(predicate) -> Optional[List[Box]]:
+    """The packets a rule_ir predicate matches as a union of boxes (None if unconstrained)."""
+    kind = type(predicate)
+    if kind is ProtoTest:
+        return _field_test("proto", [(number, number) for number in sorted(predicate.protos)], predicate.negated)
+    if kind is PrefixTest:
+        field = predicate.field + "_ip"
+        family, network, _ = PREFIXES.get(predicate.pid)
+        if family == 6:
+            intervals = []  # IPv6 prefixes never match the IPv4 packet model
+        else:
+            intervals = [(network, network | (~PREFIXES.mask(predicate.pid) & FIELD_MAX[field]))]
+        return _field_test(field, intervals, predicate.negated)
+    if kind is PortTest:
+        return _field_test(predicate.field + "_port", PORT_SETS.get(predicate.sid), predicate.negated)
+    if kind is AddressRangeTest:
+        return _field_test(predicate.field + "_ip", list(predicate.ranges), predicate.negated)
+    if kind is StateTest:
+        return [{"state": _state_values(predicate.states, predicate.negated)}]
+
+    value = predicate.value
+    if isinstance(value, MultiportMatch):
+        if not value.ports:
+            return None
+        fields = ["src_port", "dst_port"] if value.direction == "both" else [value.direction + "_port"]
+        if value.negated:  # In none of the fields: one box
+            return [{field: _complement(value.ports, field) for field in fields}]
+        return [{field: list(value.ports)} for field in fields]
+    if isinstance(value, IpRangeMatch):
+        box = {}
+        for field, bounds, negated in (("src_ip", value.src, value.src_negated),
+                                       ("dst_ip", value.dst, value.dst_negated)):
+            if bounds != (0, 0):
+                box.update(_field_test(field, [bounds], negated)[0])
+        return [box] if box else None
+    if get_match_module(predicate.name).to_smt(value) is None:
+        return None  # Not modelled, as in the other emitters
+    raise DiagramError(f"match '{predicate.name}' is not a test on the packet fields")
+
+
+def rule_boxes(ir) -> List[Box]:
+    """The packets a RuleIR matches as a union of boxes (empty if it never matches)."""
+    boxes: List[Box] = [{}]
+    for predicate in ir.predicates:
+        alternatives = predicate_boxes(predicate)
+        if alternatives is None:
+            continue
+        combined = []
+        for box in boxes:
+            for alternative in alternatives:
+                merged = dict(box)
+                for field, intervals in alternative.items():
+                    merged[field] = _intersect(merged[field], intervals) if field in merged else intervals
+                if all(merged.values()):
+                    combined.append(merged)
+        boxes = combined
+    return boxes
+
+
+class DecisionDiagram:
+    """A reduced ordered decision diagram built by prepending first-match rules."""
+
+    def __init__(self, default: bool):
+        self._unique: Dict[tuple, Node] = {}
+        self.root = default
+
+    def __len__(self):
+        return len(self.nodes())
+
+    def _node(self, level: int, edges: List[Tuple[int, object]]):
+        merged = []
+        for high, child in edges:
+            if merged and merged[-1][1] is child:
+                merged[-1] = (high, child)
+            else:
+                merged.append((high, child))
+        if len(merged) == 1:
+            return merged[0][1]
+        key = (level, tuple((high, id(child)) for high, child in merged))
+        node = self._unique.get(key)
+        if node is None:
+            node = self._unique[key] = Node(level, tuple(merged))
+        return node
+
+    def overlay(self, box: Box, callee, goto: bool = True):
+        """Send packets in ``box`` to the diagram rooted at ``callee``, before the rules already added.
+
+        With ``goto`` the callee's leaf is final. Otherwise (a jump) a packet
+        the callee lets fall through, at a None leaf, keeps the current
+        outcome.
+        """
+        memo = {}
+        # Below the last constrained field, every packet reaching here is in the box
+        last = max((FIELDS.index(field) for field in box), default=-1)
+
+        def override(rest, target, level):
+            if rest is target or (target is None and not goto):
+                return rest  # Already decided the same way, or the jump always falls through
+            if type(target) is not Node and level > last:
+                return target
+            key = (id(rest), id(target), level)
+            if key in memo:
+                return memo[key]
+            field = FIELDS[level]
+            allowed = box.get(field)
+            edges = [(high, override(rest_child, target_child, level + 1) if inside else rest_child)
+                     for high, (rest_child, target_child, inside)
+                     in _sweep(_edges(rest, level), _edges(target, level),
+                               [(FIELD_MAX[field], True)] if allowed is None else _box_edges(allowed, field))]
+            result = memo[key] = self._node(level, edges)
+            return result
+
+        self.root = override(self.root, callee, 0)
+
+    def prepend(self, box: Box, verdict: Optional[bool]):
+        """Give packets in ``box`` the verdict, before the rules already added."""
+        self.overlay(box, verdict)
+
+    def evaluate(self, **packet) -> bool:
+        """Verdict for a concrete packet; missing fields are 0."""
+        node = self.root
+        while type(node) is Node:
+            value = packet.get(FIELDS[node.level], 0)
+            node = next(child for high, child in node.edges if value <= high)
+        return node
+
+    def count(self, verdict: bool = True) -> int:
+        """Number of packets (points of the field space) given the verdict."""
+        memo = {}
+
+        def paths(node, level):
+            # Packets below ``level`` reaching the verdict from ``node``
+            if type(node) is not Node:
+                width = 1
+                for field in FIELDS[level:]:
+                    width *= FIELD_MAX[field] + 1
+                return width if node is verdict else 0
+            key = (id(node), level)
+            if key not in memo:
+                if node.level > level:
+                    memo[key] = (FIELD_MAX[FIELDS[level]] + 1) * paths(node, level + 1)
+                else:
+                    total, low = 0, 0
+                    for high, child in node.edges:
+                        total += (high - low + 1) * paths(child, level + 1)
+                        low = high + 1
+                    memo[key] = total
+            return memo[key]
+
+        return paths(self.root, 0)
+
+    def nodes(self) -> List[Node]:
+        """The reachable nodes, children before parents."""
+        order, seen = [], set()
+
+        def visit(node):
+            if type(node) is not Node or id(node) in seen:
+                return
+            seen.add(id(node))
+            for _, child in node.edges:
+                visit(child)
+            order.append(node)
+
+        visit(self.root)
+        return order
+
+    def to_smtlib(self) -> str:
+        """SMT-LIB script: the packet fields, one define-fun per node and (assert accepted)."""
+        lines = ["(set-logic QF_BV)"]
+        lines += [f"(declare-fun {field} () (_ BitVec {PACKET_FIELDS[field]}))" for field in FIELDS]
+        names = {}
+
+        def name(node):
+            return names[id(node)] if type(node) is Node else "true" if node else "false"
+
+        for index, node in enumerate(self.nodes()):
+            field = FIELDS[node.level]
+            digits = PACKET_FIELDS[field] // 4
+            *tests, (_, otherwise) = node.edges
+            term = name(otherwise)
+            for high, child in reversed(tests):
+                term = f"(ite (bvule {field} #x{high:0{digits}x}) {name(child)} {term})"
+            names[id(node)] = f"n{index}"
+            lines.append(f"(define-fun n{index} () Bool {term})")
+        lines.append(f"(define-fun accepted () Bool {name(self.root)})")
+        lines.append("(assert accepted)")
+        return "\n".join(lines) + "\n"
+
+def _edges(node, level: int) -> Tuple[Tuple[int, object], ...]:
+    """The edges of a node at ``level``; one edge for a leaf or a node further down."""
+    if type(node) is Node and node.level == level:
+        return node.edges
+    return ((FIELD_MAX[FIELDS[level]], node),)
+
+
+def _box_edges(allowed: Intervals, field: str) -> List[Tuple[int, bool]]:
+    """Edges of the field's values to whether ``allowed`` contains them."""
+    edges, low = [], 0
+    for start, end in allowed:
+        if start > low:
+            edges.append((start - 1, False))
+        edges.append((end, True))
+        low = end + 1
+    if low <= FIELD_MAX[field]:
+        edges.append((FIELD_MAX[field], False))
+    return edges
+
+
+def _sweep(*edge_lists) -> List[Tuple[int, tuple]]:
+    """Merge edge lists of one field: (high, children) at every bound of any of them."""
+    result, positions = [], [0] * len(edge_lists)
+    while True:
+        high = min(edges[position][0] for edges, position in zip(edge_lists, positions))
+        result.append((high, tuple(edges[position][1] for edges, position in zip(edge_lists, positions))))
+        if all(position == len(edges) - 1 for edges, position in zip(edge_lists, positions)):
+            return result
+        positions = [position + (edges[position][0] == high) for edges, position in zip(edge_lists, positions)]
+
+
+def compile_tables(tables) -> DecisionDiagram:
+    """Compile the filter table's INPUT chains, as generate_z3_from_tables reads them.
+
+    Each chain is compiled once, from its last rule up, into a diagram whose
+    None leaves fall through; a jump or goto overlays the jumped-to chain's
+    diagram on the rule's boxes. INPUT's diagram is then laid over the policy.
+    """
+    diagram = DecisionDiagram(input_policy(tables))
+    if 'filter' not in tables:
+        return diagram
+    policy, roots = diagram.root, {}
+    for chain in chain_rules(tables['filter']):
+        diagram.root = None
+        for ir in reversed(chain.rules):
+            if ir.action in VERDICTS:
+                callee, goto = VERDICTS[ir.action], True
+            elif ir.action == RETURN:
+                callee, goto = None, True
+            else:
+                callee, goto = roots[ir.action], ir.goto
+            for box in rule_boxes(ir):
+                diagram.overlay(box, callee, goto)
+        roots[chain.name] = diagram.root
+    diagram.root = policy
+    if 'INPUT' in roots:
+        diagram.overlay({}, roots['INPUT'], goto=False)
+    return diagram
+
+
+def generate_dd_file(tables, output_file: str) -> int:
+    """Write the compiled diagram as SMT-LIB (checkConsistency.main.load_formula reads it)."""
+    with open(output_file, 'w') as f:
+        return f.write(compile_tables(tables).to_smtlib())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the INPUT path of iptables rules into a decision diagram")
+    parser.add_argument("file", help="iptables-save file or command script ('-' for stdin)")
+    parser.add_argument("--output", help="Write the SMT-LIB formula to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        tables = load_tables(args.file)
+        if args.output:
+            generate_dd_file(tables, args.output)
+        else:
+            sys.stdout.write(compile_tables(tables).to_smtlib())
+    except (OSError, RuntimeError, DiagramError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
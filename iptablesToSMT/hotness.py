@@ -0,0 +1,138 @@
+# iptablesToSMT/hotness.py
+"""Traffic-weighted queries over the rule counters of an iptables-save -c dump.
+
+Usage: python hotness.py FILE [--top N] [--share FRACTION] [--by packets|bytes] [--json]
+"""
+import argparse
+import heapq
+import json
+import sys
+from typing import List, NamedTuple, Tuple
+
+from ruleset import RuleSet
+
+COUNTERS = ('packets', 'bytes')
+
+
+class RuleHits(NamedTuple):
+    table: str
+    chain: str
+    index: int      # 0-based position in the chain
+    packets: int
+    bytes: int
+    rule: object    # RuleView of the rule
+
+
+def _column(ruleset: RuleSet, by: str):
+    if by not in COUNTERS:
+        raise ValueError(f"unknown counter {by!r}, expected one of {', '.join(COUNTERS)}")
+    return ruleset.packet_counts if by == 'packets' else ruleset.byte_counts
+
+
+def _live_rows(ruleset: RuleSet):
+    """(row, table, chain, position) of every rule in a live chain."""
+    for table, chain, rows in ruleset.iter_chains():
+        for position, row in enumerate(rows):
+            yield row, table, chain, position
+
+
+def _hits(ruleset: RuleSet, row: int, table: str, chain: str, position: int) -> RuleHits:
+    return RuleHits(table, chain, position, ruleset.packet_counts[row],
+                    ruleset.byte_counts[row], ruleset.row_view(row))
+
+
+def top_rules(ruleset: RuleSet, n: int = 10, by: str = 'packets') -> List[RuleHits]:
+    """The ``n`` rules with the highest counter, hottest first."""
+    column = _column(ruleset, by)
+    best = heapq.nlargest(n, _live_rows(ruleset), key=lambda entry: column[entry[0]])
+    return [_hits(ruleset, *entry) for entry in best]
+
+
+def never_hit(ruleset: RuleSet) -> List[RuleHits]:
+    """Rules that no packet has matched since the counters were last zeroed, in chain order."""
+    counts = ruleset.packet_counts
+    return [_hits(ruleset, *entry) for entry in _live_rows(ruleset) if counts[entry[0]] == 0]
+
+
+def cumulative_share(ruleset: RuleSet, by: str = 'packets') -> List[Tuple[RuleHits, float]]:
+    """Rules that were hit, hottest first, each with the share of all hits up to and including it."""
+    column = _column(ruleset, by)
+    entries = sorted((entry for entry in _live_rows(ruleset) if column[entry[0]]),
+                     key=lambda entry: column[entry[0]], reverse=True)
+    total = sum(column[entry[0]] for entry in entries)
+    result = []
+    running = 0
+    for entry in entries:
+        running += column[entry[0]]
+        result.append((_hits(ruleset, *entry), running / total))
+    return result
+
+
+def rules_for_share(ruleset: RuleSet, share: float = 0.9, by: str = 'packets') -> int:
+    """How many of the hottest rules account for ``share`` of all hits."""
+    for count, (_, cumulative) in enumerate(cumulative_share(ruleset, by), 1):
+        if cumulative >= share:
+            return count
+    return 0
+
+
+def policy_hits(ruleset: RuleSet) -> List[Tuple[str, str, str, int, int]]:
+    """(table, chain, policy, packets, bytes) of the policy counters of each live chain."""
+    result = []
+    for table, chain, _ in ruleset.iter_chains():
+        chain_id = ruleset.chain_id(table, chain)
+        result.append((table, chain, ruleset.strings[ruleset.chain_policies[chain_id]],
+                       ruleset.chain_packets[chain_id], ruleset.chain_bytes[chain_id]))
+    return result
+
+
+def hotness_report(ruleset: RuleSet, n: int = 10, share: float = 0.9, by: str = 'packets') -> dict:
+    """JSON-friendly summary of the counters of a ruleset."""
+    column = _column(ruleset, by)
+    total = sum(column[entry[0]] for entry in _live_rows(ruleset))
+    return {
+        "has_counters": ruleset.has_counters,
+        "rules": len(ruleset),
+        "total_" + by: total,
+        "top": [
+            {"table": hits.table, "chain": hits.chain, "index": hits.index,
+             "packets": hits.packets, "bytes": hits.bytes,
+             "share": getattr(hits, by) / total if total else 0.0, "rule": str(hits.rule)}
+            for hits in top_rules(ruleset, n, by)
+        ],
+        "rules_for_share": {"share": share, "rules": rules_for_share(ruleset, share, by)},
+        "never_hit": len(never_hit(ruleset)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the hottest and unused rules of an iptables-save -c dump")
+    parser.add_argument("file", help="iptables-save -c output ('-' for stdin)")
+    parser.add_argument("--top", type=int, default=10, help="Number of hottest rules to list")
+    parser.add_argument("--share", type=float, default=0.9, help="Hit share to count rules for")
+    parser.add_argument("--by", choices=COUNTERS, default='packets')
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        ruleset = RuleSet.from_file(args.file)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if not ruleset.has_counters:
+        print("Warning: no counters found; was the dump written with iptables-save -c?", file=sys.stderr)
+
+    report = hotness_report(ruleset, args.top, args.share, args.by)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{report['rules']} rules, {report['total_' + args.by]} {args.by} matched")
+    for entry in report["top"]:
+        print(f"{entry[args.by]:>14} {entry['share']:7.2%}  {entry['table']}/{entry['chain']}[{entry['index']}]")
+    print(f"{report['rules_for_share']['rules']} rules account for {args.share:.0%} of {args.by}")
+    print(f"{report['never_hit']} rules never hit")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,15 @@
 from iptables_rule_classes import IPTablesTable, IPTablesChain, IPTablesRule  # Import classes from iptables_rule_classes.py
 
-def runner(input_file, output_file): # Define runner function
+def runner(input_file, output_file, cache=None): # Define runner function; cache is an optional parse_cache.ParseCache
     print("Script execution started (simplified)")
-    import iptables_parser # Modified import - try simple import
+    from ingest import load_ruleset # iptables-save files and command scripts alike
     print("iptables_parser imported")
 
-    print("Calling parse_iptables_save_file()...") # Added print statement
+    print("Calling load_ruleset()...") # Added print statement
     try:
-        tables = iptables_parser.parse_iptables_save_file(input_file) # Use input_file argument
-        print("parse_iptables_save_file() called successfully")
+        ruleset = cache.load(input_file) if cache is not None else load_ruleset(input_file)
+        tables = ruleset.as_tables() # Use input_file argument
+        print("load_ruleset() called successfully")
         print("Parsed tables object:", tables)  # Print the tables object itself
     except Exception as e:
         print("Error during iptables parsing:")
@@ -0,0 +1,432 @@
+# iptablesToSMT/ingest.py
+"""Single front-end for files of iptables rules.
+
+Two formats are accepted and told apart from the first decisive line:
+  iptables-save output  ('*table', ':CHAIN policy', '-A ...', 'COMMIT')
+  iptables commands     (shell scripts and histories: 'iptables -A ...',
+                         'sudo /sbin/iptables -t nat -I ...', '$IPT -P ...')
+
+Command streams are replayed as the kernel would apply them (-A, -I, -D,
+-R, -P, -N, -F, -X) into the same IPTablesTable model the save parser
+builds, in one pass over the file.
+"""
+import itertools
+import os
+import re
+import shlex
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from iptables_rule_classes import IPTablesTable, IPTablesChain
+from iptables_parser import iter_iptables_save, build_tables, parse_rule_words
+from snapshot_diff import rule_key
+from ruleset import RuleSet
+
+SAVE_FORMAT = "iptables-save"
+COMMAND_FORMAT = "commands"
+
+# Built-in chains each table starts with, in iptables-save order
+TABLE_CHAINS = {
+    "filter": ("INPUT", "FORWARD", "OUTPUT"),
+    "nat": ("PREROUTING", "INPUT", "OUTPUT", "POSTROUTING"),
+    "mangle": ("PREROUTING", "INPUT", "FORWARD", "OUTPUT", "POSTROUTING"),
+    "raw": ("PREROUTING", "OUTPUT"),
+    "security": ("INPUT", "FORWARD", "OUTPUT"),
+}
+
+# Long spellings of commands and rule options, mapped to the short form
+_COMMAND_ALIASES = {
+    "--append": "-A", "--insert": "-I", "--delete": "-D", "--replace": "-R",
+    "--policy": "-P", "--new-chain": "-N", "--new": "-N", "--flush": "-F",
+    "--delete-chain": "-X", "--table": "-t",
+}
+_OPTION_ALIASES = {
+    "--protocol": "-p", "--source": "-s", "--src": "-s", "--destination": "-d",
+    "--dst": "-d", "--in-interface": "-i", "--out-interface": "-o",
+    "--jump": "-j", "--goto": "-g", "--match": "-m",
+}
+_COMMANDS = frozenset(("-A", "-I", "-D", "-R", "-P", "-N", "-F", "-X"))
+_PROGRAMS = frozenset(("iptables", "iptables-legacy", "iptables-nft"))
+
+_PROMPT_RE = re.compile(r'^\S*[#$]\s+')   # 'root@host:~# ' or '$ '
+_ASSIGN_RE = re.compile(r'^\s*(?:export\s+)?(\w+)=["\']?(?:\S*/)?(iptables(?:-legacy|-nft)?)["\']?\s*$')
+_SEPARATORS = frozenset((";", "&&", "||", "|", "&"))
+_SHELL_SPECIAL_RE = re.compile(r'[\'"\\;&|<>#]')  # lines without these split on whitespace
+# Lines only a save file has: '*table', ':CHAIN', '-A ...' and '[p:b] -A ...' (not the shell's '[ ... ]' or ': ...')
+_SAVE_LINE_RE = re.compile(r'^(?:\*\S|:\S|\[\d+:\d+\]|-A\s)')
+
+
+class RuleSequence:
+    """List-like sequence of rules with cheap insertion and deletion anywhere.
+
+    Rules are kept in blocks of at most 2 * BLOCK_SIZE, and a Fenwick tree
+    over the block lengths finds the block holding a position in O(log b)
+    for b blocks. '-I CHAIN n' and '-D CHAIN n' then shift one block
+    instead of the whole chain, so scripts that build long chains with
+    repeated inserts at the top replay in linear rather than quadratic time.
+    """
+
+    BLOCK_SIZE = 512
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
+
+    def _rebuild(self):
+        """Recompute the tree after blocks were split or removed."""
+        count = len(self._blocks)
+        tree = [0] * (count + 1)
+        for number, block in enumerate(self._blocks, 1):
+            tree[number] += len(block)
+            parent = number + (number & -number)
+            if parent <= count:
+                tree[parent] += tree[number]
+        self._tree = tree
+        self._step = 1 << (count.bit_length() - 1)
+
+    def _add(self, number: int, delta: int):
+        tree = self._tree
+        number += 1
+        while number < len(tree):
+            tree[number] += delta
+            number += number & -number
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        """(block number, offset) of a position; index == len() is the end."""
+        if index == self._length:
+            return len(self._blocks) - 1, len(self._blocks[-1])
+        tree, count = self._tree, len(self._blocks)
+        number, step = 0, self._step
+        while step:
+            following = number + step
+            if following <= count and tree[following] <= index:
+                number = following
+                index -= tree[following]
+            step >>= 1
+        return number, index
+
+    def _check(self, index: int):
+        if not 0 <= index < self._length:
+            raise IndexError("rule index out of range")
+
+    def __getitem__(self, index: int):
+        self._check(index)
+        number, offset = self._locate(index)
+        return self._blocks[number][offset]
+
+    def __setitem__(self, index: int, rule):
+        self._check(index)
+        number, offset = self._locate(index)
+        self._blocks[number][offset] = rule
+
+    def insert(self, index: int, rule):
+        number, offset = self._locate(min(max(index, 0), self._length))
+        block = self._blocks[number]
+        block.insert(offset, rule)
+        self._length += 1
+        if len(block) > 2 * self.BLOCK_SIZE:
+            self._blocks[number:number + 1] = [block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]]
+            self._rebuild()
+        else:
+            self._add(number, 1)
+
+    def append(self, rule):
+        self.insert(self._length, rule)
+
+    def pop(self, index: int):
+        self._check(index)
+        number, offset = self._locate(index)
+        block = self._blocks[number]
+        rule = block.pop(offset)
+        self._length -= 1
+        if not block and len(self._blocks) > 1:
+            del self._blocks[number]
+            self._rebuild()
+        else:
+            self._add(number, -1)
+        return rule
+
+    def clear(self):
+        self._blocks: List[list] = [[]]
+        self._length = 0
+        self._rebuild()
+
+
+class CommandReplay:
+    """Applies iptables commands, one line at a time, to an in-memory ruleset.
+
+    Commands that fail in iptables (unknown chain, no matching rule, bad
+    index) are skipped and described in ``errors``; read-only commands such
+    as -L, -S and -C are ignored.
+    """
+
+    def __init__(self):
+        self._chains: Dict[str, Dict[str, Tuple[IPTablesChain, RuleSequence]]] = {}
+        self.variables = set()   # shell variables holding the iptables path, e.g. IPT
+        self.errors: List[str] = []
+        self.commands = 0
+        self._keys: Dict[int, tuple] = {}  # id(rule) -> (rule, rule_key(rule)), for '-D CHAIN spec'
+
+    def _table(self, name: str) -> Dict[str, Tuple[IPTablesChain, RuleSequence]]:
+        chains = self._chains.get(name)
+        if chains is None:
+            chains = self._chains[name] = {}
+            for chain_name in TABLE_CHAINS.get(name, ()):
+                chains[chain_name] = (IPTablesChain(chain_name, "ACCEPT"), RuleSequence())
+        return chains
+
+    def _key(self, rule) -> tuple:
+        """rule_key of a rule in a chain, computed once per rule (the entry keeps its id unique)."""
+        entry = self._keys.get(id(rule))
+        if entry is None:
+            entry = self._keys[id(rule)] = (rule, rule_key(rule))
+        return entry[1]
+
+    def _forget(self, rules: Iterable):
+        """Drop the cached keys of rules leaving the ruleset."""
+        for rule in rules:
+            self._keys.pop(id(rule), None)
+
+    def invocations(self, line: str) -> List[List[str]]:
+        """Argument lists of the iptables invocations on one shell line."""
+        line = line.strip()
+        if not line:
+            return []
+        assignment = _ASSIGN_RE.match(line)
+        if assignment:
+            self.variables.add(assignment.group(1))
+            return []
+        line = _PROMPT_RE.sub('', line, count=1)
+        if 'iptables' not in line and not any(name in line for name in self.variables):
+            return []
+        if not _SHELL_SPECIAL_RE.search(line):
+            words = line.split()
+        else:
+            try:
+                lexer = shlex.shlex(line, posix=True, punctuation_chars=';&|<>')
+                lexer.whitespace_split = True
+                words = list(lexer)
+            except ValueError:
+                words = line.split()  # Unbalanced quotes: fall back to plain words
+
+        result = []
+        for separator, group in itertools.groupby(words, lambda word: word in _SEPARATORS):
+            if separator:
+                continue
+            group = list(group)
+            while group and (group[0] == 'sudo' or '=' in group[0]):
+                group.pop(0)
+            if not group:
+                continue
+            program = group[0].rsplit('/', 1)[-1]
+            if program in _PROGRAMS or program.lstrip('$').strip('{}') in self.variables:
+                args = []
+                for word in group[1:]:
+                    if word[0] in '<>':
+                        break  # Redirection ends the arguments
+                    args.append(word)
+                result.append(args)
+        return result
+
+    def feed(self, line: str, line_number: int = 0) -> bool:
+        """Apply the iptables commands on a line; True if there were any."""
+        found = False
+        for args in self.invocations(line):
+            found = self.apply(args, line_number) or found
+        return found
+
+    def apply(self, args: List[str], line_number: int = 0) -> bool:
+        """Apply one iptables invocation given its arguments; True if it was a command."""
+        args = [_COMMAND_ALIASES.get(word, word) for word in args]
+        table = "filter"
+        if "-t" in args:
+            position = args.index("-t")
+            table = args[position + 1] if position + 1 < len(args) else table
+            del args[position:position + 2]
+        command = next((word for word in args if word in _COMMANDS), None)
+        if command is None:
+            return False
+        self.commands += 1
+        position = args.index(command)
+        rest = args[position + 1:]
+        chains = self._table(table)
+        subject = f"{command} {rest[0]}" if rest else command
+        if line_number:
+            subject = f"line {line_number}: {subject}"
+
+        def fail(message):
+            self.errors.append(f"{subject}: {message}")
+            return True
+
+        if command in ("-F", "-X"):
+            names = rest[:1] if rest and rest[0][0] != '-' else list(chains)
+            for name in names:
+                if name not in chains:
+                    return fail("no such chain")
+                if command == "-F":
+                    self._forget(chains[name][1])
+                    chains[name][1].clear()
+                elif name not in TABLE_CHAINS.get(table, ()):
+                    self._forget(chains[name][1])
+                    del chains[name]
+            return True
+
+        if not rest:
+            return fail("missing chain")
+        chain_name, rest = rest[0], rest[1:]
+        if command == "-N":
+            if chain_name in chains:
+                return fail("chain already exists")
+            chains[chain_name] = (IPTablesChain(chain_name, "-"), RuleSequence())
+            return True
+        if chain_name not in chains:
+            return fail("no such chain")
+        chain, rules = chains[chain_name]
+        if command == "-P":
+            if not rest:
+                return fail("missing policy")
+            chain.policy = rest[0]
+            return True
+
+        # -I and -R take an optional/required 1-based rule number before the spec
+        number = None
+        if rest and rest[0].isdigit():
+            number, rest = int(rest[0]), rest[1:]
+        if command == "-D" and number is not None and not rest:
+            if not 1 <= number <= len(rules):
+                return fail("index of deletion too big")
+            self._forget((rules.pop(number - 1),))
+            return True
+
+        try:
+            rule = parse_rule_words(chain_name, iter([_OPTION_ALIASES.get(word, word) for word in rest]), table)
+        except ValueError as e:
+            return fail(str(e))  # e.g. a host name where iptables would resolve an address
+        if command == "-A":
+            rules.append(rule)
+        elif command == "-I":
+            number = 1 if number is None else number
+            if not 1 <= number <= len(rules) + 1:
+                return fail("index of insertion too big")
+            rules.insert(number - 1, rule)
+        elif command == "-R":
+            if number is None or not 1 <= number <= len(rules):
+                return fail("index of replacement too big")
+            self._forget((rules[number - 1],))
+            rules[number - 1] = rule
+        else:  # -D with a rule specification
+            key = rule_key(rule)
+            for index, existing in enumerate(rules):
+                if self._key(existing) == key:
+                    self._forget((rules.pop(index),))
+                    break
+            else:
+                return fail("no matching rule")
+        return True
+
+    def tables(self) -> Dict[str, IPTablesTable]:
+        """The replayed ruleset as a {name: IPTablesTable} dict with plain rule lists."""
+        tables = {}
+        for table_name, chains in self._chains.items():
+            table = tables[table_name] = IPTablesTable(table_name)
+            for chain_name, (chain, rules) in chains.items():
+                chain.rules = list(rules)
+                table.chains[chain_name] = chain
+        return tables
+
+
+def _significant(line: str) -> str:
+    line = line.strip()
+    return "" if line.startswith('#') else line
+
+
+def detect_format(lines: Iterable[str]) -> Tuple[str, Iterator[str]]:
+    """Return the format of a stream of lines and an iterator over all of them.
+
+    Lines are read only until the first that decides the format: a save
+    header ('*table', ':CHAIN', '-A', '[p:b] -A') or an iptables command.
+    The lines read so far are buffered and replayed by the returned iterator,
+    so the stream is still consumed only once.
+    """
+    lines = iter(lines)
+    buffered = []
+    probe = CommandReplay()
+    result = SAVE_FORMAT
+    for line in lines:
+        buffered.append(line)
+        text = _significant(line)
+        if not text:
+            continue
+        if _SAVE_LINE_RE.match(text):
+            break
+        if any(any(word in _COMMANDS or word in _COMMAND_ALIASES for word in args)
+               for args in probe.invocations(text)):
+            result = COMMAND_FORMAT
+            break
+    return result, itertools.chain(buffered, lines)
+
+
+def replay_commands(lines: Iterable[str]) -> CommandReplay:
+    """Replay every iptables command in a stream of shell lines."""
+    replay = CommandReplay()
+    for line_number, line in enumerate(lines, 1):
+        replay.feed(line, line_number)
+    return replay
+
+
+def _read(filename: str, reader):
+    """Call reader() on the opened file ('-' for stdin), with the parser's errors."""
+    try:
+        if filename == '-':
+            return reader(sys.stdin)
+        with open(filename, 'r') as f:
+            return reader(f)
+    except FileNotFoundError:
+        raise RuntimeError(f"Could not find iptables rules file: {filename}")
+    except Exception as e:
+        raise RuntimeError(f"Error parsing iptables rules file: {str(e)}")
+
+
+def _tables_from_stream(stream, lazy: bool = False) -> Dict[str, IPTablesTable]:
+    file_format, lines = detect_format(stream)
+    if file_format == COMMAND_FORMAT:
+        return replay_commands(lines).tables()
+    return build_tables(iter_iptables_save(lines, lazy=lazy))
+
+
+def _ruleset_from_stream(stream) -> RuleSet:
+    file_format, lines = detect_format(stream)
+    if file_format == COMMAND_FORMAT:
+        # Later commands can edit earlier rules, so replay before converting
+        return RuleSet.from_tables(replay_commands(lines).tables())
+    return RuleSet.from_events(iter_iptables_save(lines))
+
+
+def load_tables(filename: str, lazy: bool = False) -> Dict[str, IPTablesTable]:
+    """Parse an iptables-save file or command script ('-' reads stdin) into tables.
+
+    ``lazy`` defers decoding the rules of save files (see iptables_parser.LazyRule).
+    """
+    return _read(filename, lambda stream: _tables_from_stream(stream, lazy))
+
+
+def load_ruleset(filename: str) -> RuleSet:
+    """Parse an iptables-save file or command script ('-' reads stdin) into a RuleSet."""
+    return _read(filename, _ruleset_from_stream)
+
+
+def find_rule_files(input_dir: str, max_files: Optional[int] = None) -> List[str]:
+    """Paths of the files under input_dir, relative to it, in os.walk order."""
+    rule_files = []
+    for root, _, files in os.walk(input_dir):
+        for f in files:
+            rule_files.append(os.path.relpath(os.path.join(root, f), input_dir))
+    if max_files:
+        rule_files = rule_files[:max_files]
+    return rule_files
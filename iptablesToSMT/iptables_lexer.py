@@ -0,0 +1,69 @@
+# iptablesToSMT/iptables_lexer.py
+import re
+from typing import List, Tuple
+
+# Token kinds
+FLAG = "flag"            # -A, -p, --dport, ...
+VALUE = "value"          # a bare argument
+QUOTED = "quoted"        # a "double quoted" argument, quotes and escapes removed
+NEGATION = "negation"    # a standalone '!'
+
+Token = Tuple[str, str]
+
+
+class Quoted(str):
+    """A double-quoted argument with its quotes and escapes removed.
+
+    Being a str subclass it can be used as a plain value, while its type still
+    tells it apart from a flag or '!' that happens to be quoted.
+    """
+    __slots__ = ()
+
+
+# Group 1 is a whole quoted argument; group 2 any other word. A quote inside a
+# word (pre"fix a") keeps the whole word, spaces included, as one value.
+_WORD_RE = re.compile(r'''
+      "((?:[^"\\]|\\.)*)"(?!\S)
+    | ((?:[^\s"]|"(?:[^"\\]|\\.)*")+|\S+)
+''', re.VERBOSE)
+_ESCAPE_RE = re.compile(r'\\(.)')
+
+
+def split_words(line: str) -> List[str]:
+    """Split an iptables rule line into words in a single sweep.
+
+    Lines without quotes, which are nearly all of them, are split by
+    str.split(). Lines with a quote go through the compiled scanner, so a
+    quoted argument comes back as one Quoted word instead of being rebuilt
+    from its pieces.
+    """
+    if '"' not in line:
+        return line.split()
+
+    words = []
+    for match in _WORD_RE.finditer(line):
+        quoted = match.group(1)
+        if quoted is None:
+            words.append(match.group(2))
+        else:
+            words.append(Quoted(_ESCAPE_RE.sub(r'\1', quoted) if '\\' in quoted else quoted))
+    return words
+
+
+def token_kind(word: str) -> str:
+    """Classify a word returned by split_words()."""
+    if type(word) is Quoted:
+        return QUOTED
+    if word == '!':
+        return NEGATION
+    return FLAG if word[0] == '-' else VALUE
+
+
+def tokenize(line: str) -> List[Token]:
+    """Split an iptables rule line into typed (kind, text) tokens."""
+    return [(token_kind(word), word) for word in split_words(line)]
+
+
+def is_argument(token: Token) -> bool:
+    """True for tokens that can be an option's argument (VALUE or QUOTED)."""
+    return token[0] == VALUE or token[0] == QUOTED
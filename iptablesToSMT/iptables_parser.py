@@ -1,172 +1,426 @@
 # iptables_parser.py
-from typing import List, Tuple, Optional
+import bisect
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple, Optional
 from iptables_rule_classes import IPTablesTable, IPTablesChain, IPTablesRule  # Import classes from iptables_rule_classes.py
+from prefix_table import PREFIXES
+from port_set import PORT_SETS
+from iptables_lexer import split_words, Quoted
+from match_modules import get_match_module
 
+# Bump whenever the parsed output changes, so cached parses are not reused
+PARSER_VERSION = "11"
 
-class IPTablesRule: # Redundant class definition, will be removed
-    def __init__(self):
-        self.table: str = ""
-        self.chain: str = ""
-        self.proto: str = ""
-        self.src_ip: int = 0
-        self.src_mask: int = 0
-        self.dst_ip: int = 0
-        self.dst_mask: int = 0
-        self.in_interface: str = ""
-        self.out_interface: str = ""
-        self.matches: dict = {} # Changed Dict to dict
-        self.action: str = ""
-        self.target_options: List[str] = []
 
-    def __str__(self):
-        return f"Rule(table={self.table}, chain={self.chain}, proto={self.proto}, src_ip={self.src_ip}, src_mask={self.src_mask}, dst_ip={self.dst_ip}, dst_mask={self.dst_mask}, in_interface={self.in_interface}, out_interface={self.out_interface}, matches={self.matches}, action={self.action}, target_options={self.target_options})"
-
-class IPTablesChain: # Redundant class definition, will be removed
-    def __init__(self, name: str, policy: str = "ACCEPT"):
-        self.name: str = name
-        self.policy: str = policy
-        self.rules: List[IPTablesRule] = []
+def parse_ip_and_mask(ip_mask_str: str) -> Tuple[int, int]:
+    """Parse IP address and mask from CIDR notation or IP address."""
+    pid = PREFIXES.intern(ip_mask_str)
+    return PREFIXES.networks[pid], PREFIXES.lengths[pid]
 
-    def __str__(self):
-        rules_str = "\n  ".join(str(rule) for rule in self.rules)
-        return f"Chain(name={self.name}, policy={self.policy}, rules=[\n  {rules_str}\n  ])"
 
+# Options of the rule line that take one argument, mapped to the rule field they set
+_VALUE_OPTIONS = {
+    '-p': 'proto',
+    '-i': 'in_interface',
+    '-o': 'out_interface',
+    '-s': 'src_prefix',
+    '-d': 'dst_prefix',
+    '--sport': 'src_port',
+    '--source-port': 'src_port',
+    '--dport': 'dst_port',
+    '--destination-port': 'dst_port',
+    '-m': 'matches',
+    '-j': 'action',
+    '-g': 'action',
+    '--goto': 'action',
+    '-c': 'packets',  # '-c packets bytes' as accepted by iptables-restore
+    '--set-counters': 'packets',
+}
 
-def parse_ip_and_mask(ip_mask_str: str) -> Tuple[int, int]:
-    """Parse IP address and mask from CIDR notation or IP address."""
-    if '/' in ip_mask_str:
-        ip_str, mask_str = ip_mask_str.split('/')
-        mask = int(mask_str)
-    else:
-        ip_str = ip_mask_str
-        mask = 32  # Default mask for single IP address
-
-    parts = ip_str.split('.')
-    ip_int = 0
-    for part in parts:
-        ip_int = (ip_int << 8) | int(part)
-    
-    return ip_int, mask
-
-
-def parse_match_options(match_name: str, parts: List[str], start_index: int) -> Tuple[List[str], int]:
-    """Parse options for a specific match type."""
-    options = []
-    i = start_index
-    while i < len(parts):
-        if parts[i].startswith('-'):
-            break  # Next option or action
-        options.append(parts[i])
-        i += 1
-    return options, i
-
-
-def parse_target_options(parts: List[str], start_index: int) -> Tuple[List[str], int]:
-    """Parse target options (e.g., for DNAT, SNAT)."""
-    options = []
-    i = start_index
-    while i < len(parts):
-        if parts[i].startswith('-'):
-            break  # Next option or action
-        options.append(parts[i])
-        i += 1
-    return options, i
-
-
-def parse_iptables_save_file(filename: str) -> dict: # Updated return type to dict
-    """Parse iptables rules from an iptables-save format file."""
+def parse_counters(text: str) -> Tuple[int, int]:
+    """(packets, bytes) of a '[packets:bytes]' counter field; (0, 0) if malformed."""
+    packets, _, byte_count = text.strip('[]').partition(':')
     try:
-        with open(filename, 'r') as f:
-            content = f.read()
-            
-        tables: Dict[str, 'IPTablesTable'] = {} # index.py will be updated next
-        current_table = None
-        
-        for line in content.splitlines():
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-                
-            if line.startswith('*'):
-                table_name = line[1:].strip()
-                current_table = IPTablesTable(table_name) # index.py will be updated next
-                tables[table_name] = current_table
+        return int(packets), int(byte_count)
+    except ValueError:
+        return 0, 0
+
+
+# Event kinds yielded by iter_iptables_save()
+TABLE = "table"
+CHAIN = "chain"
+RULE = "rule"
+COMMIT = "commit"
+
+
+def parse_rule_line(line: str, table_name: str) -> IPTablesRule:
+    """Parse a single '-A CHAIN ...' line into an IPTablesRule."""
+    words = iter(split_words(line))
+    next(words)  # -A
+    return parse_rule_words(next(words), words, table_name)
+
+
+def parse_rule_words(chain: str, words: Iterable[str], table_name: str) -> IPTablesRule:
+    """Parse the words of a rule specification (after '-A CHAIN') into an IPTablesRule.
+
+    The words are consumed in one forward pass: an option flag from
+    _VALUE_OPTIONS marks its field as pending and the next argument fills it.
+    Other '--option' flags after '-m <module>' are looked up in that match
+    module's handler, which knows how many arguments each takes; once the
+    line is consumed every module turns its options into a typed value.
+    The words after the target ('--to-destination 10.0.0.1:8080',
+    '--reject-with tcp-reset') are kept as they are in target_options, up to
+    the next rule option.
+    """
+    rule = IPTablesRule()
+    rule.table = table_name
+    rule.chain = chain
+    negated = []
+    negate = False
+    pending = None      # (flag, field) waiting for its argument
+    collect = None      # target_options while the target's own words are read
+    module = None       # MatchModule of the last -m match
+    options = None      # its options: name -> (negated, arguments)
+    raw_matches = {}    # match name -> (module, options)
+    args = None         # argument list of the module option being read
+    wanted = 0          # arguments still expected by that option (-1: all that follow)
+
+    for word in words:
+        if pending is not None:
+            if word == '!' and type(word) is str:
+                negate = True  # Older '-s ! addr' form
                 continue
-                
-            if line.startswith(':'):
-                # Chain definition
-                parts = line[1:].split()
-                chain_name = parts[0]
-                policy = parts[1] if len(parts) > 1 else "ACCEPT"
-                if current_table:
-                    current_table.chains[chain_name] = IPTablesChain(chain_name, policy)
+            flag, field = pending
+            pending = None
+            if negate:
+                negated.append(flag)
+                negate = False
+
+            if field == 'matches':
+                if word in raw_matches:
+                    module, options = raw_matches[word]
+                else:
+                    module, options = raw_matches[word] = (get_match_module(word), {})
+            elif field == 'src_prefix':
+                rule.src_prefix = pid = PREFIXES.intern(word)
+                rule.src_ip, rule.src_mask = PREFIXES.networks[pid], PREFIXES.lengths[pid]
+            elif field == 'dst_prefix':
+                rule.dst_prefix = pid = PREFIXES.intern(word)
+                rule.dst_ip, rule.dst_mask = PREFIXES.networks[pid], PREFIXES.lengths[pid]
+            elif field == 'src_port':
+                rule.src_ports = sid = PORT_SETS.intern(word)
+                rule.src_port = PORT_SETS.texts[sid]
+            elif field == 'dst_port':
+                rule.dst_ports = sid = PORT_SETS.intern(word)
+                rule.dst_port = PORT_SETS.texts[sid]
+            elif field == 'packets':
+                rule.packets = int(word)
+                pending = (flag, 'bytes')
+            elif field == 'bytes':
+                rule.bytes = int(word)
+            else:
+                setattr(rule, field, word)
+                if field == 'action':
+                    module = None
+                    if flag != '-j':
+                        rule.goto = True
+                    collect = rule.target_options = []
+
+        elif args is not None and (type(word) is Quoted or word[0] != '-'):
+            if word == '!' and type(word) is str:
+                if not args:
+                    options[option] = (True, args)  # Older '--state ! NEW' form
+                    continue
+                args = None
+                negate = True
                 continue
-                
-            if line.startswith('COMMIT'):
-                current_table = None
+            args.append(word)
+            wanted -= 1
+            if wanted == 0:
+                args = None
+
+        elif type(word) is Quoted:
+            if collect is not None:
+                collect.append(word)
+
+        elif word[0] == '-':
+            field = _VALUE_OPTIONS.get(word)
+            if collect is not None and field is None:
+                collect.append(word)  # An option of the target
                 continue
-                
-            if line.startswith('-A') and current_table:
-                rule = IPTablesRule()
-                rule.table = current_table.name
-                parts = line.split()
-                i = 1  # Skip -A
-                
-                # Get chain name
-                rule.chain = parts[i]
-                i += 1
-                
-                while i < len(parts):
-                    part = parts[i]
-                    
-                    if part == '-p':
-                        rule.proto = parts[i + 1]
-                        i += 2
-                    elif part == '-s':
-                        rule.src_ip, rule.src_mask = parse_ip_and_mask(parts[i + 1])
-                        i += 2
-                    elif part == '-d':
-                        rule.dst_ip, rule.dst_mask = parse_ip_and_mask(parts[i + 1])
-                        i += 2
-                    elif part == '-i':
-                        rule.in_interface = parts[i + 1]
-                        i += 2
-                    elif part == '-o':
-                        rule.out_interface = parts[i + 1]
-                        i += 2
-                    elif part in ['--sport', '--source-port']: # Handle source port options
-                        port_str = parts[i + 1]
-                        if ':' in port_str: # Check if it's a range
-                            rule.src_port = port_str.split(':')[0] # Extract only the first port of the range
-                        else:
-                            rule.src_port = port_str
-                        i += 2
-                    elif part in ['--dport', '--destination-port']: # Handle destination port options
-                        port_str = parts[i + 1]
-                        if ':' in port_str: # Check if it's a range
-                            rule.dst_port = port_str.split(':')[0] # Extract only the first port of the range
-                        else:
-                            rule.dst_port = port_str
-                        i += 2
-                    elif part == '-m':
-                        match_name = parts[i + 1]
-                        i += 2
-                        match_options, i = parse_match_options(match_name, parts, i)
-                        rule.matches[match_name] = match_options
-                    elif part == '-j':
-                        rule.action = parts[i + 1]
-                        i += 2
-                        if rule.action in ['DNAT', 'SNAT', 'MASQUERADE']:
-                            options, i = parse_target_options(parts, i)
-                            rule.target_options = options
-                    else:
-                        i += 1
-                
-                if rule.chain in current_table.chains:
-                    current_table.chains[rule.chain].rules.append(rule)
-        
-        return tables
-        
+            collect = None
+            args = None
+            if field is not None:
+                pending = (word, field)
+            elif module is not None and word.startswith('--'):
+                option = word[2:]
+                args = []
+                options[option] = (negate, args)
+                wanted = module.arity(option)
+                if wanted == 0:
+                    args = None
+                negate = False
+            else:
+                negate = False
+
+        elif word == '!':
+            collect = None
+            negate = True  # '! -s addr' form
+
+        elif collect is not None:
+            collect.append(word)
+
+    for name, (module, options) in raw_matches.items():
+        rule.matches[name] = module.build(options)
+    if negated:
+        rule.negated = tuple(negated)
+    return rule
+
+
+_TARGET_FLAGS = {'-j': False, '-g': True, '--goto': True}  # flag -> goto
+
+
+class LazyRule(IPTablesRule):
+    """A rule that keeps its '-A' line and is decoded on first use.
+
+    table, chain and (from an iptables-save -c prefix) the counters are set
+    up front; action and goto are read from the words of the line without
+    decoding the rest of it. Any other attribute decodes
+    the whole line with parse_rule_line once and keeps the result, so a
+    malformed rule only raises when it is first used.
+    """
+
+    def __init__(self, line: str, table: str, chain: str):
+        # IPTablesRule.__init__ is not called: missing fields go to __getattr__
+        self.line = line
+        self.table = table
+        self.chain = chain
+
+    @property
+    def decoded(self) -> bool:
+        return 'proto' in self.__dict__
+
+    def __getattr__(self, name: str):
+        if name.startswith('__') or 'line' not in self.__dict__:
+            raise AttributeError(name)  # Copying and unpickling probe for hooks
+        if name in ('action', 'goto'):
+            words = split_words(self.line)
+            action, goto = "", False
+            for index in range(len(words) - 2, -1, -1):  # The last target flag wins
+                word = words[index]
+                if word in _TARGET_FLAGS and type(word) is str:  # Not a quoted argument
+                    action, goto = words[index + 1], _TARGET_FLAGS[word]
+                    break
+            self.action, self.goto = action, goto
+            return self.__dict__[name]
+        values = parse_rule_line(self.line, self.table).__dict__
+        values.update(self.__dict__)  # Counters from the '[p:b]' prefix win
+        self.__dict__.update(values)
+        return values[name]
+
+
+def iter_iptables_save(stream: Iterable[str], table: Optional[str] = None,
+                       lazy: bool = False) -> Iterator[Tuple[str, object]]:
+    """Incrementally parse iptables-save output, yielding (kind, payload) events.
+
+    ``stream`` is any iterable of text lines: an open file, ``sys.stdin`` or a
+    pipe. Lines are consumed one at a time and nothing is retained between
+    events, so memory use does not grow with the size of the dump.
+
+    Events, in input order:
+      (TABLE, IPTablesTable)   -- a '*table' header; the table has no chains yet
+      (CHAIN, IPTablesChain)   -- a ':chain policy' line; the chain has no rules
+      (RULE, IPTablesRule)     -- an '-A' line of the current table
+      (COMMIT, str)            -- the end of the named table
+
+    ``table`` names a table already open when the stream starts, for parsing
+    a part of a dump that begins inside a section. With ``lazy``, rules are
+    LazyRule objects that are only decoded when their fields are used.
+    """
+    current_table: Optional[str] = table
+
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        counters = None
+        if line.startswith('['):
+            # '[packets:bytes] -A ...' as written by iptables-save -c
+            end = line.find(']')
+            counters = parse_counters(line[:end + 1])
+            line = line[end + 1:].lstrip()
+
+        if line.startswith('*'):
+            current_table = line[1:].strip()
+            yield TABLE, IPTablesTable(current_table)
+            continue
+
+        if line.startswith(':'):
+            # Chain definition
+            parts = line[1:].split()
+            chain_name = parts[0]
+            policy = parts[1] if len(parts) > 1 else "ACCEPT"
+            if current_table:
+                chain = IPTablesChain(chain_name, policy)
+                if len(parts) > 2:
+                    chain.packets, chain.bytes = parse_counters(parts[2])
+                yield CHAIN, chain
+            continue
+
+        if line.startswith('COMMIT'):
+            if current_table:
+                yield COMMIT, current_table
+            current_table = None
+            continue
+
+        if line.startswith('-A') and current_table:
+            if lazy:
+                rule = LazyRule(line, current_table, line.split(None, 2)[1])
+            else:
+                try:
+                    rule = parse_rule_line(line, current_table)
+                except ValueError as e:
+                    raise ValueError(f"{e} in rule: {line}") from e
+            if counters is not None:
+                rule.packets, rule.bytes = counters
+            yield RULE, rule
+
+
+def build_tables(events: Iterable[Tuple[str, object]]) -> dict:
+    """Assemble the events of iter_iptables_save() into a {name: IPTablesTable} dict."""
+    tables: Dict[str, IPTablesTable] = {}
+    current_table = None
+
+    for kind, payload in events:
+        if kind == RULE:
+            chain = current_table.chains.get(payload.chain)
+            if chain is not None:
+                chain.rules.append(payload)
+        elif kind == CHAIN:
+            current_table.chains[payload.name] = payload
+        elif kind == TABLE:
+            current_table = payload
+            tables[payload.name] = payload
+        elif kind == COMMIT:
+            current_table = None
+
+    return tables
+
+
+# Parallel parsing: files are cut into blocks of about this many bytes
+PARALLEL_BLOCK_BYTES = 4 << 20
+_SECTION_RE = re.compile(rb'^[ \t]*(\*[^\s]+|COMMIT)', re.MULTILINE)
+
+
+def split_blocks(filename: str, block_bytes: int = PARALLEL_BLOCK_BYTES) -> List[Tuple[int, int, Optional[str]]]:
+    """Cut a save file into (start, end, table) byte ranges at line boundaries.
+
+    ``table`` is the table open at ``start`` (None between sections), so each
+    block can be parsed on its own. Section boundaries always start a block.
+    """
+    size = os.path.getsize(filename)
+    if size == 0:
+        return []
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # (offset, table opened there or None for COMMIT) of every section marker
+        markers = [(m.start(), m.group(1)[1:].decode() if m.group(1) != b'COMMIT' else None)
+                   for m in _SECTION_RE.finditer(data)]
+        cuts = {0, size}
+        cuts.update(offset for offset, _ in markers)
+        for target in range(block_bytes, size, block_bytes):
+            newline = data.find(b'\n', target)
+            if newline != -1:
+                cuts.add(newline + 1)
+    cuts = sorted(cut for cut in cuts if cut <= size)
+    offsets = [offset for offset, _ in markers]
+    blocks = []
+    for start, end in zip(cuts, cuts[1:]):
+        # A marker at ``start`` is parsed by the block itself
+        index = bisect.bisect_left(offsets, start) - 1
+        blocks.append((start, end, markers[index][1] if index >= 0 else None))
+    return blocks
+
+
+def _parse_block(filename: str, start: int, end: int, table: Optional[str]) -> tuple:
+    """Parse one block of a save file in a worker.
+
+    Returns the events and, since prefix and port-set ids are only valid in
+    the process that interned them, the values behind the ids the rules use.
+    """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode().splitlines()
+    events = list(iter_iptables_save(lines, table))
+    prefixes, port_sets = {}, {}
+    for kind, rule in events:
+        if kind == RULE:
+            for pid in (rule.src_prefix, rule.dst_prefix):
+                if pid:
+                    prefixes[pid] = PREFIXES.get(pid)
+            for sid in (rule.src_ports, rule.dst_ports):
+                if sid:
+                    port_sets[sid] = PORT_SETS.get(sid)
+    return events, prefixes, port_sets
+
+
+def _merge_blocks(results: Iterable[tuple]) -> Iterator[Tuple[str, object]]:
+    """Events of the parsed blocks in file order, with ids re-interned in this process."""
+    for events, prefixes, port_sets in results:
+        prefix_ids = {pid: PREFIXES.intern_network(*value) for pid, value in prefixes.items()}
+        port_set_ids = {sid: PORT_SETS.intern_ranges(ranges) for sid, ranges in port_sets.items()}
+        prefix_ids[0] = port_set_ids[0] = 0
+        for kind, payload in events:
+            if kind == RULE:
+                payload.src_prefix = prefix_ids[payload.src_prefix]
+                payload.dst_prefix = prefix_ids[payload.dst_prefix]
+                payload.src_ports = port_set_ids[payload.src_ports]
+                payload.dst_ports = port_set_ids[payload.dst_ports]
+            yield kind, payload
+
+
+def parse_iptables_save_parallel(filename: str, workers: Optional[int] = None,
+                                 block_bytes: int = PARALLEL_BLOCK_BYTES) -> dict:
+    """Parse a save file in blocks on a process pool; same result as the serial parse.
+
+    Blocks are cut at table sections and about every ``block_bytes``; chains
+    and rules are assembled in the original order once all blocks are back.
+    Sending the parsed rules back costs about as much as parsing them, so
+    this only pays off with several CPUs; with one, the file is parsed serially.
+    """
+    workers = workers or os.cpu_count() or 1
+    blocks = split_blocks(filename, block_bytes)
+    if len(blocks) < 2 or workers < 2:
+        with open(filename, 'r') as f:
+            return build_tables(iter_iptables_save(f))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        starts, ends, tables = zip(*blocks)
+        results = pool.map(_parse_block, [filename] * len(blocks), starts, ends, tables)
+        return build_tables(_merge_blocks(results))
+
+
+def parse_iptables_save_file(filename: str, workers: Optional[int] = 1, lazy: bool = False) -> dict: # Updated return type to dict
+    """Parse iptables rules from an iptables-save format file ('-' reads stdin).
+
+    With ``workers`` other than 1, large files are parsed in parallel by
+    parse_iptables_save_parallel (None uses every CPU). With ``lazy``, the
+    tables and chains are built but rules are LazyRule objects, decoded on
+    first use; this is for scans that only count, list or filter by target.
+    """
+    try:
+        if filename == '-':
+            return build_tables(iter_iptables_save(sys.stdin, lazy=lazy))
+
+        if workers != 1 and not lazy:
+            return parse_iptables_save_parallel(filename, workers)
+
+        with open(filename, 'r') as f:
+            return build_tables(iter_iptables_save(f, lazy=lazy))
+
     except FileNotFoundError:
         raise RuntimeError(f"Could not find iptables rules file: {filename}")
     except Exception as e:
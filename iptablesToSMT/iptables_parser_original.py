@@ -3,6 +3,10 @@ import tempfile
 import os
 import iptc
 from typing import Dict, List, Optional, Union
+from iptables_lexer import tokenize, is_argument, Token, FLAG
+from match_modules import get_match_module
+
+PORT_OPTIONS = ("sport", "dport", "source-port", "destination-port")
 
 class IPTablesRule:
     def __init__(self):
@@ -98,16 +102,17 @@ class IPTablesTable:
         result.append("COMMIT")
         return "\n".join(result)
 
-def parse_target_options(parts: List[str], start_idx: int) -> tuple[Dict[str, Union[str, bool]], int]:
+def parse_target_options(tokens: List[Token], start_idx: int) -> tuple[Dict[str, Union[str, bool]], int]:
     """Parse target-specific options"""
     options = {}
     i = start_idx
     
-    while i < len(parts):
-        if not parts[i].startswith('--'):
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind != FLAG or not text.startswith('--'):
             break
             
-        option_name = parts[i][2:]
+        option_name = text[2:]
         
         # Handle options that don't take values
         if option_name in ["random", "persistent", "rsource", "rttl"]:
@@ -115,107 +120,44 @@ def parse_target_options(parts: List[str], start_idx: int) -> tuple[Dict[str, Un
             i += 1
             continue
         
-        # Handle options that require values
-        if i + 1 < len(parts):
-            value = parts[i + 1]
-            if value.startswith('"'):
-                # Handle quoted values
-                while not value.endswith('"') and i + 2 < len(parts):
-                    i += 1
-                    value += " " + parts[i + 1]
-                value = value.strip('"')
-                options[option_name] = value
-                i += 2
-            elif not value.startswith('-'):
-                options[option_name] = value
-                i += 2
-            else:
-                options[option_name] = True
-                i += 1
+        # Handle options that require values (quoted values arrive as one token)
+        if i + 1 < len(tokens) and is_argument(tokens[i + 1]):
+            options[option_name] = tokens[i + 1][1]
+            i += 2
         else:
             options[option_name] = True
             i += 1
     
     return options, i
 
-def parse_match_options(match_name: str, parts: List[str], start_idx: int) -> tuple[Dict[str, Union[str, List[str], bool]], int]:
-    """Parse match-specific options like state matches"""
+def parse_match_options(match_name: str, tokens: List[Token], start_idx: int) -> tuple[Dict[str, Union[str, List[str], bool]], int]:
+    """Parse match-specific options, taking each option's argument count from the match module registry"""
+    module = get_match_module(match_name)
     options = {}
     i = start_idx
     
-    while i < len(parts):
-        if not parts[i].startswith('--'):
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind != FLAG or not text.startswith('--'):
             break
             
-        option_name = parts[i][2:]  # Remove '--' prefix
-        
-        # Handle different match types
-        if match_name == "state" or match_name == "conntrack":
-            if option_name in ["state", "ctstate"]:
-                options[option_name] = parts[i + 1].split(',')
-                i += 2
-        
-        elif match_name in ["tcp", "udp"]:
-            if option_name in ["sport", "dport", "source-port", "destination-port"]:
-                # Handle port ranges
-                port_value = parts[i + 1]
-                if ":" in port_value:
-                    start_port, end_port = port_value.split(":")
-                    options[option_name] = [start_port, end_port]
-                else:
-                    options[option_name] = port_value
-                i += 2
-            else:
-                options[option_name] = True
-                i += 1
-        
-        elif match_name == "multiport":
-            if option_name in ["sports", "dports", "ports"]:
-                options[option_name] = parts[i + 1].split(',')
-                i += 2
-        
-        elif match_name == "limit":
-            if option_name in ["limit", "limit-burst"]:
-                options[option_name] = parts[i + 1]
-                i += 2
-        
-        elif match_name == "comment":
-            if option_name == "comment":
-                comment = parts[i + 1]
-                if comment.startswith('"'):
-                    while not comment.endswith('"') and i + 2 < len(parts):
-                        i += 1
-                        comment += " " + parts[i + 1]
-                    comment = comment.strip('"')
-                options[option_name] = comment
-                i += 2
-        
-        elif match_name == "icmp" or match_name == "icmpv6":
-            if option_name in ["icmp-type", "icmpv6-type"]:
-                options[option_name] = parts[i + 1]
-                i += 2
-        
-        elif match_name == "addrtype":
-            if option_name in ["src-type", "dst-type"]:
-                options[option_name] = parts[i + 1]
-                i += 2
-        
-        elif match_name == "recent":
-            if option_name in ["seconds", "hitcount"]:
-                options[option_name] = parts[i + 1]
-                i += 2
-            else:
-                options[option_name] = True
-                i += 1
+        option_name = text[2:]  # Remove '--' prefix
+        arity = module.arity(option_name)
+        i += 1
+        args = []
+        while i < len(tokens) and is_argument(tokens[i]) and len(args) != arity:
+            args.append(tokens[i][1])
+            i += 1
         
+        if not args:
+            options[option_name] = True
+        elif option_name in module.list_options:
+            options[option_name] = args[0].split(',')
+        elif option_name in PORT_OPTIONS and ":" in args[0]:
+            # Handle port ranges
+            options[option_name] = args[0].split(":")
         else:
-            # Generic handling for unknown match types
-            if i + 1 < len(parts) and not parts[i + 1].startswith('-'):
-                options[option_name] = parts[i + 1]
-                i += 2
-            else:
-                options[option_name] = True
-                i += 1
+            options[option_name] = " ".join(args)
     
     return options, i
 
@@ -262,41 +204,41 @@ def parse_iptables_save_file(filename: str) -> Dict[str, IPTablesTable]:
             if line.startswith('-A') and current_table:
                 rule = IPTablesRule()
                 rule.table = current_table.name
-                parts = line.split()
+                tokens = tokenize(line)
                 i = 1  # Skip -A
                 
                 # Get chain name
-                rule.chain = parts[i]
+                rule.chain = tokens[i][1]
                 i += 1
                 
-                while i < len(parts):
-                    part = parts[i]
+                while i < len(tokens):
+                    part = tokens[i][1]
                     
                     if part == '-p':
-                        rule.proto = parts[i + 1]
+                        rule.proto = tokens[i + 1][1]
                         i += 2
                     elif part == '-s':
-                        rule.src_ip, rule.src_mask = parse_ip_and_mask(parts[i + 1])
+                        rule.src_ip, rule.src_mask = parse_ip_and_mask(tokens[i + 1][1])
                         i += 2
                     elif part == '-d':
-                        rule.dst_ip, rule.dst_mask = parse_ip_and_mask(parts[i + 1])
+                        rule.dst_ip, rule.dst_mask = parse_ip_and_mask(tokens[i + 1][1])
                         i += 2
                     elif part == '-i':
-                        rule.in_interface = parts[i + 1]
+                        rule.in_interface = tokens[i + 1][1]
                         i += 2
                     elif part == '-o':
-                        rule.out_interface = parts[i + 1]
+                        rule.out_interface = tokens[i + 1][1]
                         i += 2
                     elif part == '-m':
-                        match_name = parts[i + 1]
+                        match_name = tokens[i + 1][1]
                         i += 2
-                        match_options, i = parse_match_options(match_name, parts, i)
+                        match_options, i = parse_match_options(match_name, tokens, i)
                         rule.matches[match_name] = match_options
                     elif part == '-j':
-                        rule.action = parts[i + 1]
+                        rule.action = tokens[i + 1][1]
                         i += 2
                         if rule.action in ['DNAT', 'SNAT', 'MASQUERADE']:
-                            options, i = parse_target_options(parts, i)
+                            options, i = parse_target_options(tokens, i)
                             rule.target_options = options
                     else:
                         i += 1
@@ -15,6 +15,8 @@ class IPTablesChain:
         self.name: str = name
         self.policy: str = policy
         self.rules: List['IPTablesRule'] = []
+        self.packets: int = 0  # Policy counters from iptables-save, 0 if not recorded
+        self.bytes: int = 0
 
     def __str__(self):
         rules_str = "\\n  ".join(str(rule) for rule in self.rules)
@@ -29,13 +31,21 @@ class IPTablesRule:
         self.src_mask: int = 0
         self.dst_ip: int = 0
         self.dst_mask: int = 0
+        self.src_prefix: int = 0  # Id in prefix_table.PREFIXES, 0 for any address
+        self.dst_prefix: int = 0
         self.src_port: str = "0"  # Add source port attribute, default "0" for no port specified
         self.dst_port: str = "0"  # Add destination port attribute, default "0" for no port specified
+        self.src_ports: int = 0  # Id in port_set.PORT_SETS, 0 for any port
+        self.dst_ports: int = 0
         self.in_interface: str = ""
         self.out_interface: str = ""
         self.matches: dict = {}
         self.action: str = ""
         self.target_options: List[str] = []
+        self.goto: bool = False  # Target given with -g: a RETURN there resumes in this chain's caller
+        self.negated: tuple = ()  # Options preceded by '!', e.g. ('-s',)
+        self.packets: int = 0  # Counters from iptables-save -c, 0 if not recorded
+        self.bytes: int = 0
 
     def __str__(self):
         return f"Rule(table={self.table}, chain={self.chain}, proto={self.proto}, src_ip={self.src_ip}, src_mask={self.src_mask}, dst_ip={self.dst_ip}, dst_mask={self.dst_mask}, in_interface={self.in_interface}, out_interface={self.out_interface}, matches={self.matches}, action={self.action}, target_options={self.target_options})"
@@ -0,0 +1,88 @@
+# iptablesToSMT/live_ingest.py
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+from typing import Iterator, Optional, Sequence, Tuple, Union
+
+from iptables_parser import iter_iptables_save, build_tables
+from ruleset import RuleSet
+
+# Command whose stdout is parsed; IPTABLES_SAVE_COMMAND overrides it
+DEFAULT_COMMAND = ("iptables-save", "-c")
+DEFAULT_TIMEOUT = 30.0
+
+Command = Union[str, Sequence[str]]
+
+
+def resolve_command(command: Optional[Command] = None) -> list:
+    """Return the command as an argument list.
+
+    None selects $IPTABLES_SAVE_COMMAND or DEFAULT_COMMAND; a string is split
+    shell-style (no shell is involved).
+    """
+    if command is None:
+        command = os.environ.get("IPTABLES_SAVE_COMMAND") or DEFAULT_COMMAND
+    if isinstance(command, str):
+        return shlex.split(command)
+    return list(command)
+
+
+def iter_live_iptables(command: Optional[Command] = None,
+                       timeout: Optional[float] = DEFAULT_TIMEOUT) -> Iterator[Tuple[str, object]]:
+    """Run iptables-save and parse its stdout while it is being written.
+
+    Yields the same (kind, payload) events as iptables_parser.iter_iptables_save;
+    '[packets:bytes]' counter prefixes from '-c' are accepted. The process is
+    killed if it has not finished within ``timeout`` seconds (None waits
+    forever). Raises RuntimeError if it cannot be started, times out or exits
+    with a non-zero status.
+    """
+    argv = resolve_command(command)
+    with tempfile.TemporaryFile() as stderr:
+        try:
+            process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=stderr,
+                                       text=True, bufsize=1 << 16)
+        except OSError as e:
+            raise RuntimeError(f"Could not run {argv[0]}: {e}")
+
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout is not None else None
+        if timer is not None:
+            timer.daemon = True
+            timer.start()
+        try:
+            with process.stdout:
+                yield from iter_iptables_save(process.stdout)
+            returncode = process.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if process.poll() is None:  # The consumer stopped early
+                process.kill()
+                process.wait()
+
+        if timed_out.is_set():
+            raise RuntimeError(f"{argv[0]} timed out after {timeout} seconds")
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode(errors="replace").strip()
+            raise RuntimeError(f"{argv[0]} exited with status {returncode}: {message}")
+
+
+def read_live_ruleset(command: Optional[Command] = None,
+                      timeout: Optional[float] = DEFAULT_TIMEOUT) -> RuleSet:
+    """Read the live ruleset straight into a RuleSet."""
+    return RuleSet.from_events(iter_live_iptables(command, timeout))
+
+
+def read_live_tables(command: Optional[Command] = None,
+                     timeout: Optional[float] = DEFAULT_TIMEOUT) -> dict:
+    """Read the live ruleset into a {name: IPTablesTable} dict."""
+    return build_tables(iter_live_iptables(command, timeout))
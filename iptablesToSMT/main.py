@@ -1,6 +1,7 @@
 import sys
 import os
 from index import runner  # Modified import to specify directory
+from ingest import find_rule_files, load_ruleset
 import shutil
 
 
@@ -9,15 +10,7 @@ def process_directory(input_dir, output_dir, max_files=None):
     os.makedirs(output_dir, exist_ok=True)
 
     # Get list of files recursively
-    rule_files = []
-    for root, _, files in os.walk(input_dir):
-        for f in files:
-            # Get relative path from input_dir
-            rel_path = os.path.relpath(os.path.join(root, f), input_dir)
-            rule_files.append(rel_path)
-
-    if max_files:
-        rule_files = rule_files[:max_files]
+    rule_files = find_rule_files(input_dir, max_files)
 
     # Process each selected file
     for rel_path in rule_files:
@@ -44,6 +37,25 @@ def process_directory(input_dir, output_dir, max_files=None):
         print("runner() returned")  # Verbose output
 
 
+def process_firewall(input_file, output_file, cache=None):
+    """Convert one iptables-save file to an SMT-LIB file and return its path.
+
+    ``cache`` is an optional parse_cache.ParseCache; with it, converting the
+    same rules again skips parsing. Duplicate and inert rules are removed
+    (see normalize.py) before generation. Errors are raised rather than printed.
+    """
+    from code_generator import generate_c_code
+    from normalize import normalize_tables
+
+    output_parent = os.path.dirname(output_file)
+    if output_parent:
+        os.makedirs(output_parent, exist_ok=True)
+    ruleset = cache.load(input_file) if cache is not None else load_ruleset(input_file)
+    tables, _ = normalize_tables(ruleset.as_tables())
+    generate_c_code(tables, output_file)
+    return output_file
+
+
 def main():
     if len(sys.argv) not in [3, 4]:
         print("Usage: python main.py <input_directory> <output_directory> [max_files]")
@@ -0,0 +1,502 @@
+# iptablesToSMT/match_modules.py
+import ipaddress
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from port_set import PORT_SETS, PortRanges, smt_port_condition, c_port_condition
+
+# Parsed options handed to MatchModule.parse(): option name -> (negated, arguments)
+RawOptions = Dict[str, Tuple[bool, List[str]]]
+
+# Conntrack states as bits of the 8-bit `state` packet variable
+CT_STATES = {
+    "NEW": 0x01,
+    "ESTABLISHED": 0x02,
+    "RELATED": 0x04,
+    "INVALID": 0x08,
+    "UNTRACKED": 0x10,
+    "SNAT": 0x20,
+    "DNAT": 0x40,
+}
+
+# TCP flag bits, as in byte 13 of the TCP header
+TCP_FLAGS = {
+    "FIN": 0x01,
+    "SYN": 0x02,
+    "RST": 0x04,
+    "PSH": 0x08,
+    "ACK": 0x10,
+    "URG": 0x20,
+    "ECE": 0x40,
+    "CWR": 0x80,
+}
+TCP_FLAGS["ALL"] = 0xFF
+TCP_FLAGS["NONE"] = 0x00
+
+_MATCH_MODULES: Dict[str, "MatchModule"] = {}
+
+
+class MatchModule:
+    """Handler for one '-m <module>' match.
+
+    ``options`` maps each long option (without the leading '--') to the
+    number of arguments it takes; options not listed swallow every following
+    argument. parse() turns the raw options into a small immutable value,
+    which is cached so rules with identical matches share one object.
+
+    to_smt() lowers the value to an SMT-LIB condition over the packet
+    variables of code_generator (src_ip, dst_ip, src_port, dst_port, proto,
+    state). to_ebpf() lowers it to a C condition for a TC program that has
+    parsed ``iph``, ``tcph``/``udph``/``icmph`` and holds ``skb`` and the
+    conntrack bits in ``ct_state``. Both return None when the packet model has
+    no field for the match, i.e. the match is left unconstrained.
+    """
+
+    name = ""
+    options: Dict[str, int] = {}
+    list_options = frozenset()   # options whose argument is a comma-separated list
+
+    def __init__(self):
+        self._values: Dict[object, object] = {}
+        self._spellings: Dict[tuple, object] = {}
+
+    def arity(self, option: str) -> int:
+        """Number of arguments of an option; -1 means 'all following arguments'."""
+        return self.options.get(option, -1)
+
+    def build(self, raw: RawOptions):
+        """Parse raw options and return the shared (interned) value.
+
+        Options are parsed only the first time a given spelling is seen; most
+        dumps repeat a handful of matches (e.g. '--state RELATED,ESTABLISHED')
+        thousands of times.
+        """
+        key = tuple([(option, negated, *args) for option, (negated, args) in raw.items()])
+        value = self._spellings.get(key)
+        if value is None:
+            try:
+                value = self.parse(raw)
+            except (ValueError, IndexError):
+                value = MatchModule.parse(self, raw)  # Malformed options are kept verbatim
+            value = self._spellings[key] = self._values.setdefault(value, value)
+        return value
+
+    def parse(self, raw: RawOptions):
+        return GenericMatch(self.name, tuple(
+            (negated, option, tuple(args)) for option, (negated, args) in raw.items()
+        ))
+
+    def to_smt(self, value) -> Optional[str]:
+        return None
+
+    def to_ebpf(self, value) -> Optional[str]:
+        return None
+
+
+def register_match(*names: str):
+    """Class decorator registering a MatchModule under one or more '-m' names."""
+    def decorator(cls):
+        for name in names:
+            module = cls()
+            module.name = name
+            _MATCH_MODULES[name] = module
+        return cls
+    return decorator
+
+
+def get_match_module(name: str) -> MatchModule:
+    """Return the handler for a match name; unknown modules get a generic one."""
+    module = _MATCH_MODULES.get(name)
+    if module is None:
+        module = MatchModule()
+        module.name = name
+        _MATCH_MODULES[name] = module
+    return module
+
+
+def registered_matches() -> List[str]:
+    return sorted(name for name, module in _MATCH_MODULES.items() if type(module) is not MatchModule)
+
+
+def _any_of(conditions: List[str], smt: bool) -> str:
+    if len(conditions) == 1:
+        return conditions[0]
+    return f"(or {' '.join(conditions)})" if smt else "(" + " || ".join(conditions) + ")"
+
+
+def _negate(condition: str, negated: bool, smt: bool) -> str:
+    if not negated:
+        return condition
+    return f"(not {condition})" if smt else f"!({condition})"
+
+
+class GenericMatch(NamedTuple):
+    module: str
+    options: Tuple[Tuple[bool, str, Tuple[str, ...]], ...]
+
+
+class ConntrackMatch(NamedTuple):
+    states: int                 # OR of CT_STATES bits, 0 if not matched on
+    negated: bool
+    other: Tuple[Tuple[bool, str, Tuple[str, ...]], ...] = ()
+
+
+@register_match("state", "conntrack")
+class ConntrackModule(MatchModule):
+    options = {
+        "state": 1, "ctstate": 1, "ctproto": 1, "ctstatus": 1, "ctexpire": 1, "ctdir": 1,
+        "ctorigsrc": 1, "ctorigdst": 1, "ctreplsrc": 1, "ctrepldst": 1,
+        "ctorigsrcport": 1, "ctorigdstport": 1, "ctreplsrcport": 1, "ctrepldstport": 1,
+    }
+    list_options = frozenset(["state", "ctstate", "ctstatus"])
+
+    def parse(self, raw: RawOptions):
+        states, negated, other = 0, False, []
+        for option, (option_negated, args) in raw.items():
+            if option in ("state", "ctstate"):
+                for state in args[0].split(','):
+                    states |= CT_STATES.get(state.upper(), 0)
+                negated = option_negated
+            else:
+                other.append((option_negated, option, tuple(args)))
+        return ConntrackMatch(states, negated, tuple(other))
+
+    def to_smt(self, value: ConntrackMatch) -> Optional[str]:
+        if not value.states:
+            return None
+        test = f"(= (bvand state #x{value.states:02x}) #x00)"
+        return test if value.negated else f"(not {test})"
+
+    def to_ebpf(self, value: ConntrackMatch) -> Optional[str]:
+        if not value.states:
+            return None
+        return f"(ct_state & 0x{value.states:02x}) {'==' if value.negated else '!='} 0"
+
+
+class MultiportMatch(NamedTuple):
+    direction: str              # 'src', 'dst' or 'both'
+    ports: PortRanges           # merged ranges, shared with port_set.PORT_SETS
+    negated: bool
+
+
+@register_match("multiport")
+class MultiportModule(MatchModule):
+    options = {
+        "sports": 1, "source-ports": 1, "dports": 1, "destination-ports": 1, "ports": 1,
+    }
+    list_options = frozenset(options)
+    _directions = {
+        "sports": "src", "source-ports": "src", "dports": "dst", "destination-ports": "dst", "ports": "both",
+    }
+
+    def parse(self, raw: RawOptions):
+        for option, (negated, args) in raw.items():
+            if option in self._directions:
+                return MultiportMatch(self._directions[option], PORT_SETS.get(PORT_SETS.intern(args[0])), negated)
+        return super().parse(raw)
+
+    def _tests(self, value: MultiportMatch, smt: bool) -> str:
+        fields = {"src": ["src"], "dst": ["dst"], "both": ["src", "dst"]}[value.direction]
+        tests = []
+        for field in fields:
+            if smt:
+                tests.append(smt_port_condition(f"{field}_port", value.ports))
+            else:
+                header = "bpf_ntohs(tcph->source)" if field == "src" else "bpf_ntohs(tcph->dest)"
+                tests.append(c_port_condition(header, value.ports))
+        return _negate(_any_of(tests, smt), value.negated, smt)
+
+    def to_smt(self, value) -> Optional[str]:
+        if not isinstance(value, MultiportMatch) or not value.ports:
+            return None
+        return self._tests(value, smt=True)
+
+    def to_ebpf(self, value) -> Optional[str]:
+        if not isinstance(value, MultiportMatch) or not value.ports:
+            return None
+        return self._tests(value, smt=False)
+
+
+class TcpMatch(NamedTuple):
+    flag_mask: int              # flags examined, 0 if no flag test
+    flag_comp: int              # flags that must be set among flag_mask
+    negated: bool
+    option: str = ""            # --tcp-option number, if any
+
+
+@register_match("tcp")
+class TcpModule(MatchModule):
+    options = {"syn": 0, "tcp-flags": 2, "tcp-option": 1, "sport": 1, "dport": 1}
+
+    def parse(self, raw: RawOptions):
+        mask = comp = 0
+        negated = False
+        tcp_option = ""
+        for option, (option_negated, args) in raw.items():
+            if option == "syn":
+                mask = TCP_FLAGS["SYN"] | TCP_FLAGS["RST"] | TCP_FLAGS["ACK"] | TCP_FLAGS["FIN"]
+                comp = TCP_FLAGS["SYN"]
+                negated = option_negated
+            elif option == "tcp-flags" and len(args) == 2:
+                mask = self._flag_bits(args[0])
+                comp = self._flag_bits(args[1])
+                negated = option_negated
+            elif option == "tcp-option" and args:
+                tcp_option = args[0]
+        return TcpMatch(mask, comp, negated, tcp_option)
+
+    @staticmethod
+    def _flag_bits(names: str) -> int:
+        bits = 0
+        for name in names.split(','):
+            bits |= TCP_FLAGS.get(name.upper(), 0)
+        return bits
+
+    def to_ebpf(self, value: TcpMatch) -> Optional[str]:
+        if not value.flag_mask:
+            return None
+        test = f"(((__u8 *)tcph)[13] & 0x{value.flag_mask:02x}) == 0x{value.flag_comp:02x}"
+        return _negate(test, value.negated, smt=False)
+
+
+class UdpMatch(NamedTuple):
+    pass
+
+
+@register_match("udp", "udplite", "sctp", "dccp")
+class UdpModule(MatchModule):
+    options = {"sport": 1, "dport": 1}
+
+    def parse(self, raw: RawOptions):
+        return UdpMatch()
+
+
+class IcmpMatch(NamedTuple):
+    type: int                   # -1 for 'any'
+    code: int                   # -1 for every code
+    negated: bool
+    name: str = ""              # symbolic type name, when given by name
+
+
+@register_match("icmp", "icmp6", "icmpv6")
+class IcmpModule(MatchModule):
+    options = {"icmp-type": 1, "icmpv6-type": 1}
+
+    def parse(self, raw: RawOptions):
+        for option, (negated, args) in raw.items():
+            spec = args[0] if args else "any"
+            type_part, _, code_part = spec.partition('/')
+            if type_part.isdigit():
+                return IcmpMatch(int(type_part), int(code_part) if code_part.isdigit() else -1, negated)
+            return IcmpMatch(-1, -1, negated, spec)
+        return IcmpMatch(-1, -1, False)
+
+    def to_ebpf(self, value: IcmpMatch) -> Optional[str]:
+        if value.type < 0:
+            return None
+        test = f"icmph->type == {value.type}"
+        if value.code >= 0:
+            test = f"({test} && icmph->code == {value.code})"
+        return _negate(test, value.negated, smt=False)
+
+
+class IpRangeMatch(NamedTuple):
+    src: Tuple[int, int]        # (0, 0) when not matched on
+    dst: Tuple[int, int]
+    src_negated: bool
+    dst_negated: bool
+
+
+@register_match("iprange")
+class IpRangeModule(MatchModule):
+    options = {"src-range": 1, "dst-range": 1}
+
+    @staticmethod
+    def _range(spec: str) -> Tuple[int, int]:
+        low, _, high = spec.partition('-')
+        return int(ipaddress.IPv4Address(low)), int(ipaddress.IPv4Address(high or low))
+
+    def parse(self, raw: RawOptions):
+        src = dst = (0, 0)
+        src_negated = dst_negated = False
+        for option, (negated, args) in raw.items():
+            if option == "src-range":
+                src, src_negated = self._range(args[0]), negated
+            elif option == "dst-range":
+                dst, dst_negated = self._range(args[0]), negated
+        return IpRangeMatch(src, dst, src_negated, dst_negated)
+
+    def _tests(self, value: IpRangeMatch, smt: bool) -> Optional[str]:
+        tests = []
+        for field, (low, high), negated in (("src", value.src, value.src_negated),
+                                            ("dst", value.dst, value.dst_negated)):
+            if (low, high) == (0, 0):
+                continue
+            if smt:
+                test = f"(and (bvuge {field}_ip #x{low:08x}) (bvule {field}_ip #x{high:08x}))"
+            else:
+                addr = "bpf_ntohl(iph->saddr)" if field == "src" else "bpf_ntohl(iph->daddr)"
+                test = f"({addr} >= 0x{low:08x} && {addr} <= 0x{high:08x})"
+            tests.append(_negate(test, negated, smt))
+        if not tests:
+            return None
+        if len(tests) == 1:
+            return tests[0]
+        return f"(and {' '.join(tests)})" if smt else " && ".join(tests)
+
+    def to_smt(self, value: IpRangeMatch) -> Optional[str]:
+        return self._tests(value, smt=True)
+
+    def to_ebpf(self, value: IpRangeMatch) -> Optional[str]:
+        return self._tests(value, smt=False)
+
+
+class MarkMatch(NamedTuple):
+    value: int
+    mask: int
+    negated: bool
+
+
+@register_match("mark", "connmark")
+class MarkModule(MatchModule):
+    options = {"mark": 1}
+
+    def parse(self, raw: RawOptions):
+        negated, args = raw.get("mark", (False, ["0"]))
+        value, _, mask = args[0].partition('/')
+        return MarkMatch(int(value, 0), int(mask, 0) if mask else 0xFFFFFFFF, negated)
+
+    def to_ebpf(self, value: MarkMatch) -> Optional[str]:
+        if self.name != "mark":
+            return None  # The connection mark is not visible to a TC program
+        return _negate(f"(skb->mark & 0x{value.mask:x}) == 0x{value.value:x}", value.negated, smt=False)
+
+
+class LimitMatch(NamedTuple):
+    rate: str                   # e.g. '3/min'
+    burst: int
+
+
+@register_match("limit")
+class LimitModule(MatchModule):
+    options = {"limit": 1, "limit-burst": 1}
+
+    def parse(self, raw: RawOptions):
+        rate = raw.get("limit", (False, ["3/hour"]))[1][0]
+        burst = raw.get("limit-burst", (False, ["5"]))[1][0]
+        return LimitMatch(rate, int(burst) if burst.isdigit() else 5)
+
+
+class HashlimitMatch(NamedTuple):
+    name: str
+    rate: str                   # --hashlimit-upto / --hashlimit (or --hashlimit-above)
+    above: bool
+    burst: int
+    mode: str
+
+
+@register_match("hashlimit")
+class HashlimitModule(MatchModule):
+    options = {
+        "hashlimit": 1, "hashlimit-upto": 1, "hashlimit-above": 1, "hashlimit-burst": 1,
+        "hashlimit-mode": 1, "hashlimit-name": 1, "hashlimit-srcmask": 1, "hashlimit-dstmask": 1,
+        "hashlimit-htable-size": 1, "hashlimit-htable-max": 1, "hashlimit-htable-expire": 1,
+        "hashlimit-htable-gcinterval": 1,
+    }
+
+    def parse(self, raw: RawOptions):
+        def arg(option, default=""):
+            return raw.get(option, (False, [default]))[1][0]
+
+        above = "hashlimit-above" in raw
+        rate = arg("hashlimit-above") if above else arg("hashlimit-upto") or arg("hashlimit")
+        burst = arg("hashlimit-burst", "5")
+        return HashlimitMatch(arg("hashlimit-name"), rate, above,
+                              int(burst) if burst.isdigit() else 5, arg("hashlimit-mode"))
+
+
+class RecentMatch(NamedTuple):
+    name: str
+    command: str                # set, rcheck, update or remove
+    seconds: int
+    hitcount: int
+    negated: bool
+
+
+@register_match("recent")
+class RecentModule(MatchModule):
+    options = {
+        "name": 1, "set": 0, "rcheck": 0, "update": 0, "remove": 0, "seconds": 1, "hitcount": 1,
+        "rttl": 0, "rsource": 0, "rdest": 0, "reap": 0, "mask": 1,
+    }
+
+    def parse(self, raw: RawOptions):
+        command, negated = "", False
+        for option in ("set", "rcheck", "update", "remove"):
+            if option in raw:
+                command, negated = option, raw[option][0]
+        seconds = raw.get("seconds", (False, ["0"]))[1][0]
+        hitcount = raw.get("hitcount", (False, ["0"]))[1][0]
+        return RecentMatch(raw.get("name", (False, ["DEFAULT"]))[1][0], command,
+                           int(seconds) if seconds.isdigit() else 0,
+                           int(hitcount) if hitcount.isdigit() else 0, negated)
+
+
+class AddrtypeMatch(NamedTuple):
+    src_type: str
+    dst_type: str
+    src_negated: bool
+    dst_negated: bool
+
+
+@register_match("addrtype")
+class AddrtypeModule(MatchModule):
+    options = {"src-type": 1, "dst-type": 1, "limit-iface-in": 0, "limit-iface-out": 0}
+
+    def parse(self, raw: RawOptions):
+        src_negated, src = raw.get("src-type", (False, [""]))
+        dst_negated, dst = raw.get("dst-type", (False, [""]))
+        return AddrtypeMatch(src[0], dst[0], src_negated, dst_negated)
+
+
+class SetMatch(NamedTuple):
+    name: str
+    flags: Tuple[str, ...]      # e.g. ('src', 'dst')
+    negated: bool
+
+
+@register_match("set")
+class SetModule(MatchModule):
+    options = {"match-set": 2, "set": 2, "return-nomatch": 0, "update-counters": 0,
+               "update-subcounters": 0, "packets-eq": 1, "packets-lt": 1, "packets-gt": 1,
+               "bytes-eq": 1, "bytes-lt": 1, "bytes-gt": 1}
+
+    def parse(self, raw: RawOptions):
+        negated, args = raw.get("match-set", raw.get("set", (False, ["", ""])))
+        name = args[0] if args else ""
+        flags = tuple(args[1].split(',')) if len(args) > 1 else ()
+        return SetMatch(name, flags, negated)
+
+
+class MacMatch(NamedTuple):
+    address: str
+    negated: bool
+
+
+@register_match("mac")
+class MacModule(MatchModule):
+    options = {"mac-source": 1, "mac": 1}
+
+    def parse(self, raw: RawOptions):
+        negated, args = raw.get("mac-source", raw.get("mac", (False, [""])))
+        return MacMatch(args[0].upper(), negated)
+
+
+class CommentMatch(NamedTuple):
+    text: str
+
+
+@register_match("comment")
+class CommentModule(MatchModule):
+    options = {"comment": 1}
+
+    def parse(self, raw: RawOptions):
+        return CommentMatch(raw.get("comment", (False, [""]))[1][0])
@@ -0,0 +1,197 @@
+# iptablesToSMT/normalize.py
+"""Canonicalization and deduplication pass run before generation.
+
+Removes rules that cannot change the verdict of any packet:
+  unreachable  -- rules of chains no built-in chain jumps to
+  duplicate    -- a repeat of an earlier rule with the same canonical form
+                  whose target already ended the chain
+  logging      -- LOG/NFLOG/ULOG rules, which only have side effects
+  no_target    -- rules without a target, which only count packets
+  empty_jump   -- '-j' jumps to a chain left with no rules
+  policy_noop  -- trailing rules whose target is what the chain does anyway
+                  (RETURN, or a built-in chain's policy)
+
+Usage: python normalize.py FILE [--json] [--output FILE]
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from iptables_rule_classes import IPTablesTable, IPTablesChain
+from iptables_parser import iter_iptables_save, build_tables, RULE
+from chain_graph import ChainGraph, BUILTIN_CHAINS, RETURN
+from snapshot_diff import rule_key
+from rule_ir import LOGGING_ACTIONS
+
+# Targets that end the traversal of the chain when the rule matches
+TERMINAL_ACTIONS = frozenset(('ACCEPT', 'DROP', 'REJECT', RETURN, 'DNAT', 'SNAT', 'MASQUERADE', 'REDIRECT'))
+# Matches that keep state or have side effects, so two identical rules can match differently
+STATEFUL_MATCHES = frozenset(('limit', 'hashlimit', 'recent', 'statistic', 'quota', 'connlimit'))
+
+REASONS = ('unreachable', 'duplicate', 'logging', 'no_target', 'empty_jump', 'policy_noop')
+
+
+class NormalizeReport:
+    """Counts of the rules a normalization pass kept and removed."""
+
+    def __init__(self):
+        self.total = 0
+        self.removed: Counter = Counter()
+
+    @property
+    def kept(self) -> int:
+        return self.total - sum(self.removed.values())
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of the rules removed."""
+        return 1 - self.kept / self.total if self.total else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "kept": self.kept,
+            "removed": {reason: self.removed[reason] for reason in REASONS},
+            "ratio": round(self.ratio, 4),
+        }
+
+    def __str__(self):
+        details = ", ".join(f"{self.removed[reason]} {reason}" for reason in REASONS if self.removed[reason])
+        return (f"Kept {self.kept} of {self.total} rules ({self.ratio:.1%} removed"
+                + (f": {details})" if details else ")"))
+
+
+def _stateful(rule) -> bool:
+    return any(name in STATEFUL_MATCHES for name in rule.matches)
+
+
+def _inert_reason(rule):
+    """Why a rule can never affect a verdict on its own, or None."""
+    if not rule.action:
+        return 'no_target'
+    if rule.action in LOGGING_ACTIONS:
+        return 'logging'
+    return None
+
+
+def _normalize_chain(chain, builtin: bool, empty_chains: set, report: NormalizeReport) -> List:
+    rules = []
+    terminal_keys = set()  # canonical forms of earlier rules that ended the chain
+    for rule in chain.rules:
+        reason = _inert_reason(rule)
+        if reason is None and rule.action in empty_chains and not getattr(rule, 'goto', False):
+            reason = 'empty_jump'
+        if reason is None and not _stateful(rule):
+            key = rule_key(rule)
+            if key in terminal_keys:
+                reason = 'duplicate'
+            elif rule.action in TERMINAL_ACTIONS or getattr(rule, 'goto', False):
+                terminal_keys.add(key)
+        if reason is None:
+            rules.append(rule)
+        else:
+            report.removed[reason] += 1
+
+    # Falling off the end does what these rules do, whether or not they match
+    fall_through = chain.policy if builtin else RETURN
+    while rules and not _stateful(rules[-1]) and not getattr(rules[-1], 'goto', False) \
+            and rules[-1].action in (RETURN, fall_through):
+        rules.pop()
+        report.removed['policy_noop'] += 1
+    return rules
+
+
+def normalize_tables(tables: dict) -> Tuple[Dict[str, IPTablesTable], NormalizeReport]:
+    """Return normalized copies of a {name: IPTablesTable} dict and a report.
+
+    Chains and tables are new objects; the kept rules are shared with the
+    input. Chains are visited callee-first, so a jump to a chain that
+    normalization emptied is removed as well.
+    """
+    report = NormalizeReport()
+    result = {}
+    for table_name, table in tables.items():
+        graph = ChainGraph(table)
+        reachable = graph.reachable()
+        try:
+            order = graph.topological_order()
+        except ValueError:
+            order = list(table.chains)  # Looping chains: no emptied-chain propagation
+        normalized = {}
+        empty_chains = set()
+        for chain_name in order:
+            chain = table.chains[chain_name]
+            count = len(chain.rules)
+            report.total += count
+            copy = IPTablesChain(chain_name, chain.policy)
+            if chain_name in reachable:
+                copy.rules = _normalize_chain(chain, chain_name in BUILTIN_CHAINS, empty_chains, report)
+                if not copy.rules and chain_name not in BUILTIN_CHAINS:
+                    empty_chains.add(chain_name)
+            else:
+                report.removed['unreachable'] += count
+            normalized[chain_name] = copy
+
+        result[table_name] = IPTablesTable(table_name)
+        result[table_name].chains = {name: normalized[name] for name in table.chains}
+    return result, report
+
+
+def normalize_save_text(text: str) -> Tuple[str, NormalizeReport]:
+    """Normalize iptables-save text, keeping the original spelling of kept lines.
+
+    Used where the rules are consumed as text (e.g. LLM prompts): the rule
+    lines that normalization removes are dropped, everything else is kept.
+    """
+    lines = text.splitlines(keepends=True)
+    position = 0
+    rule_lines = {}  # id(rule) -> index of its line
+
+    def feed():
+        nonlocal position
+        for position, line in enumerate(lines):
+            yield line
+
+    def events():
+        for kind, payload in iter_iptables_save(feed()):
+            if kind == RULE:
+                rule_lines[id(payload)] = position
+            yield kind, payload
+
+    tables = build_tables(events())
+    normalized, report = normalize_tables(tables)
+    kept = {id(rule) for table in normalized.values()
+            for chain in table.chains.values() for rule in chain.rules}
+    dropped = {line for rule_id, line in rule_lines.items() if rule_id not in kept}
+    return "".join(line for index, line in enumerate(lines) if index not in dropped), report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Normalize an iptables-save file")
+    parser.add_argument("file", help="iptables-save file ('-' for stdin)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--output", help="Write the normalized rules to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.file == '-':
+            text = sys.stdin.read()
+        else:
+            with open(args.file, 'r') as f:
+                text = f.read()
+        normalized_text, report = normalize_save_text(text)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(normalized_text)
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
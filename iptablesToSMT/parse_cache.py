@@ -0,0 +1,116 @@
+# iptablesToSMT/parse_cache.py
+import hashlib
+import os
+import pickle
+from typing import Optional
+
+from iptables_parser import PARSER_VERSION
+from ruleset import RuleSet
+from ingest import load_ruleset
+
+CACHE_SUFFIX = ".ruleset"
+
+
+def content_key(filename: str, version: str = PARSER_VERSION) -> str:
+    """SHA-256 of the file content and the parser version, as hex."""
+    digest = hashlib.sha256()
+    digest.update(f"iptables_parser {version}\0".encode())
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Content-addressed on-disk cache of parsed rulesets.
+
+    Entries are pickled RuleSets named after content_key(), so a renamed or
+    copied file is still a hit and an edited file (or a new parser version)
+    is a miss. Entry mtimes record use; once the directory grows past
+    ``max_bytes`` the least recently used entries are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key: str) -> Optional[RuleSet]:
+        """Return the cached RuleSet for a key, or None (an unreadable entry is removed)."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                ruleset = pickle.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # Truncated, corrupt or written by an incompatible version of the classes
+            self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)  # Mark as recently used
+        self.hits += 1
+        return ruleset
+
+    def put(self, key: str, ruleset: RuleSet):
+        """Store a RuleSet under a key and evict old entries if over budget."""
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(ruleset, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)  # Readers never see a partial entry
+        self.evict()
+
+    def load(self, filename: str) -> RuleSet:
+        """Parse an iptables-save file or command script, or reload its cached parse."""
+        if filename == '-':
+            return load_ruleset(filename)  # stdin cannot be hashed and re-read
+        try:
+            key = content_key(filename)
+        except FileNotFoundError:
+            raise RuntimeError(f"Could not find iptables rules file: {filename}")
+        ruleset = self.get(key)
+        if ruleset is None:
+            ruleset = load_ruleset(filename)
+            self.put(key, ruleset)
+        return ruleset
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_SUFFIX):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        for _, _, name in self._entries():
+            os.remove(os.path.join(self.directory, name))
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
@@ -0,0 +1,175 @@
+# iptablesToSMT/port_set.py
+import socket
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PortRanges = Tuple[Tuple[int, int], ...]
+
+MAX_PORT = 65535
+
+# Port set id 0 is reserved for "no port match" (any port) and id 1 for an
+# explicit 0:65535, which differs from it once negated: '! --dport 0:65535'
+# matches nothing
+ANY_PORTS = 0
+ALL_PORTS = 1
+FULL_RANGE = ((0, MAX_PORT),)
+
+
+def port_number(port: str) -> int:
+    """Convert a port number or service name to an int; ValueError if it is neither."""
+    if port.isdigit():
+        number = int(port)
+        if number > MAX_PORT:
+            raise ValueError(f"port {port} out of range")
+        return number
+    try:
+        return socket.getservbyname(port)
+    except OSError:
+        raise ValueError(f"unknown port or service name '{port}'") from None
+
+
+def merge_ranges(ranges: Iterable[Tuple[int, int]]) -> PortRanges:
+    """Sort (low, high) pairs and merge overlapping or adjacent ones."""
+    merged: List[List[int]] = []
+    for low, high in sorted((min(low, high), max(low, high)) for low, high in ranges):
+        if merged and low <= merged[-1][1] + 1:
+            if high > merged[-1][1]:
+                merged[-1][1] = high
+        else:
+            merged.append([low, high])
+    return tuple((low, high) for low, high in merged)
+
+
+def parse_ports(text: str) -> PortRanges:
+    """Parse '22', '1000:2000', ':1023', 'ssh' or a multiport '22,80,8000:8080' list.
+
+    Returns the normalized, merged ranges.
+    """
+    ranges = []
+    for item in text.split(','):
+        if ':' in item:
+            low, high = item.split(':', 1)
+            ranges.append((port_number(low) if low else 0, port_number(high) if high else MAX_PORT))
+        elif item:
+            number = port_number(item)
+            ranges.append((number, number))
+    return merge_ranges(ranges)
+
+
+def ranges_to_text(ranges: PortRanges) -> str:
+    """'22,80,1000:2000'; "0" for any port, as IPTablesRule uses, so port 0 is '0:0'."""
+    if not ranges:
+        return "0"
+    return ",".join(str(low) if low == high and low else f"{low}:{high}" for low, high in ranges)
+
+
+class PortSetTable:
+    """Interns port sets so each distinct port spec is parsed and stored once.
+
+    A port set is a sorted tuple of disjoint (low, high) ranges. Every distinct
+    set gets a small integer id, and each spelling ('ssh', '22', '1000:2000')
+    is cached, so rules refer to their ports by id and repeated port specs
+    cost a single dict lookup.
+    """
+
+    def __init__(self):
+        self._text_ids: Dict[str, int] = {}
+        self._ids: Dict[PortRanges, int] = {(): ANY_PORTS, FULL_RANGE: ALL_PORTS}
+        self.sets: List[PortRanges] = [(), FULL_RANGE]
+        self.texts: List[str] = ["0", ranges_to_text(FULL_RANGE)]
+
+    def __len__(self):
+        return len(self.sets)
+
+    def intern(self, text: str) -> int:
+        """Return the id of a textual port spec, parsing it on first sight."""
+        sid = self._text_ids.get(text)
+        if sid is None:
+            sid = self.intern_ranges(parse_ports(text))
+            self._text_ids[text] = sid
+        return sid
+
+    def intern_ranges(self, ranges: Iterable[Tuple[int, int]]) -> int:
+        """Return the id of a set of (low, high) ranges, normalizing them first."""
+        ranges = merge_ranges(ranges)
+        sid = self._ids.get(ranges)
+        if sid is None:
+            sid = len(self.sets)
+            self._ids[ranges] = sid
+            self.sets.append(ranges)
+            self.texts.append(ranges_to_text(ranges))
+        return sid
+
+    def get(self, sid: int) -> PortRanges:
+        return self.sets[sid]
+
+    def to_text(self, sid: int) -> str:
+        return self.texts[sid]
+
+    def bounds(self, sid: int) -> Tuple[int, int]:
+        """Lowest and highest port of the set ((0, 65535) for any port)."""
+        ranges = self.sets[sid]
+        if not ranges:
+            return 0, MAX_PORT
+        return ranges[0][0], ranges[-1][1]
+
+
+# Process-wide table shared by the parser, RuleSet and the emitters
+PORT_SETS = PortSetTable()
+
+
+def rule_ports(rule, side: str, port_sets: PortSetTable = PORT_SETS) -> int:
+    """Return the port set id of a rule's 'src' or 'dst' port match.
+
+    Rules from iptables_parser carry the id directly; for other rule objects
+    it is interned from the src_port/dst_port attribute.
+    """
+    sid = getattr(rule, f"{side}_ports", None)
+    if sid is not None:
+        return sid
+    port = getattr(rule, f"{side}_port", None)
+    if port in (None, "", "0", 0):
+        return ANY_PORTS
+    if isinstance(port, (list, tuple)):
+        port = ":".join(str(p) for p in port)
+    return port_sets.intern(str(port))
+
+
+def smt_port_condition(field: str, ranges: PortRanges) -> Optional[str]:
+    """SMT-LIB test of a 16-bit port field against a port set (None for any port).
+
+    Ranges are compared unsigned; bounds at 0 or 65535 are left out.
+    """
+    if ranges == FULL_RANGE:
+        return "true"
+    tests = []
+    for low, high in ranges:
+        if low == high:
+            tests.append(f"(= {field} #x{low:04x})")
+        elif low == 0:
+            tests.append(f"(bvule {field} #x{high:04x})")
+        elif high == MAX_PORT:
+            tests.append(f"(bvuge {field} #x{low:04x})")
+        else:
+            tests.append(f"(and (bvuge {field} #x{low:04x}) (bvule {field} #x{high:04x}))")
+    if not tests:
+        return None
+    return tests[0] if len(tests) == 1 else f"(or {' '.join(tests)})"
+
+
+def c_port_condition(expr: str, ranges: PortRanges) -> Optional[str]:
+    """C test of a host-order port expression against a port set (None for any port)."""
+    if ranges == FULL_RANGE:
+        return "1"
+    tests = []
+    for low, high in ranges:
+        if low == high:
+            tests.append(f"{expr} == {low}")
+        elif low == 0:
+            tests.append(f"{expr} <= {high}")
+        elif high == MAX_PORT:
+            tests.append(f"{expr} >= {low}")
+        else:
+            tests.append(f"({expr} >= {low} && {expr} <= {high})")
+    if not tests:
+        return None
+    return tests[0] if len(tests) == 1 else "(" + " || ".join(tests) + ")"
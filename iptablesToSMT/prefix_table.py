@@ -0,0 +1,105 @@
+# iptablesToSMT/prefix_table.py
+import ipaddress
+from array import array
+from typing import Dict, List, Tuple
+
+# Prefix id 0 is reserved for "no address match" (any address)
+ANY_PREFIX = 0
+
+
+def parse_prefix(text: str) -> Tuple[int, int, int]:
+    """Parse '1.2.3.0/24', '1.2.3.4/255.255.255.0', '2001:db8::/32' or a bare address.
+
+    Returns (family, network int, prefix length); host bits are cleared.
+    """
+    network = ipaddress.ip_network(text, strict=False)
+    return network.version, int(network.network_address), network.prefixlen
+
+
+class PrefixTable:
+    """Interns IPv4/IPv6 prefixes so each distinct CIDR is parsed exactly once.
+
+    Every distinct (family, network, length) triple gets a small integer id.
+    The same textual spelling is cached as well, so repeated '-s 10.0.0.0/8'
+    tokens cost a single dict lookup. The parser, RuleSet and the emitters all
+    refer to prefixes by id and read the pre-parsed values from here.
+    """
+
+    def __init__(self):
+        self._text_ids: Dict[str, int] = {}
+        self._ids: Dict[Tuple[int, int, int], int] = {(0, 0, 0): ANY_PREFIX}
+        self.families = array('B', [0])
+        self.networks: List[int] = [0]  # Python ints: IPv6 networks need 128 bits
+        self.lengths = array('B', [0])
+
+    def __len__(self):
+        return len(self.networks)
+
+    def intern(self, text: str) -> int:
+        """Return the id of a textual prefix, parsing it on first sight."""
+        pid = self._text_ids.get(text)
+        if pid is None:
+            pid = self.intern_network(*parse_prefix(text))
+            self._text_ids[text] = pid
+        return pid
+
+    def intern_network(self, family: int, network: int, length: int) -> int:
+        """Return the id of an already-parsed (family, network, length) prefix."""
+        width = 128 if family == 6 else 32
+        network &= ((1 << width) - 1) ^ ((1 << (width - length)) - 1)
+        key = (family, network, length)
+        pid = self._ids.get(key)
+        if pid is None:
+            pid = len(self.networks)
+            self._ids[key] = pid
+            self.families.append(family)
+            self.networks.append(network)
+            self.lengths.append(length)
+        return pid
+
+    def get(self, pid: int) -> Tuple[int, int, int]:
+        return self.families[pid], self.networks[pid], self.lengths[pid]
+
+    def width(self, pid: int) -> int:
+        """Address width in bits (32 or 128)."""
+        return 128 if self.families[pid] == 6 else 32
+
+    def mask(self, pid: int) -> int:
+        """Netmask of the prefix as an int of the family's width."""
+        width = self.width(pid)
+        length = self.lengths[pid]
+        return ((1 << width) - 1) ^ ((1 << (width - length)) - 1)
+
+    def to_text(self, pid: int) -> str:
+        family, network, length = self.get(pid)
+        if family == 0:
+            return "any"
+        address = ipaddress.IPv6Address(network) if family == 6 else ipaddress.IPv4Address(network)
+        return f"{address}/{length}"
+
+
+# Process-wide table shared by the parser, RuleSet and the emitters
+PREFIXES = PrefixTable()
+
+
+def rule_prefix(rule, side: str, prefixes: PrefixTable = PREFIXES) -> int:
+    """Return the prefix id of a rule's 'src' or 'dst' address.
+
+    Rules from iptables_parser carry the id directly; for other rule objects
+    (e.g. iptables_parser_original, which keeps address strings) it is
+    interned from the ip/mask attributes.
+    """
+    pid = getattr(rule, f"{side}_prefix", None)
+    if pid is not None:
+        return pid
+    ip = getattr(rule, f"{side}_ip", None)
+    mask = getattr(rule, f"{side}_mask", None)
+    if ip in (None, "", "any"):
+        return ANY_PREFIX
+    if mask == "":
+        mask = None
+    if isinstance(ip, int):
+        if not ip and not mask:
+            return ANY_PREFIX
+        return prefixes.intern_network(4, ip, 32 if mask is None else int(mask))
+    return prefixes.intern(ip if mask is None else f"{ip}/{mask}")
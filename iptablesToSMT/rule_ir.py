@@ -0,0 +1,371 @@
+# iptablesToSMT/rule_ir.py
+"""Typed rule IR shared by the emitters.
+
+Each rule is lowered once into a RuleIR: a tuple of typed predicates that
+must all hold, plus its target. The SMT-LIB text emitter (chain_encoding),
+the z3 term builder (smt_generator) and the C emitters for the KLEE harness
+and TC programs (c_generator) all render the same predicates, so the
+attribute probing and option decoding of a rule happen in one place.
+
+Predicates are interned, so equal tests of different rules are one object
+and emitters can memoize their output per predicate.
+"""
+import weakref
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from prefix_table import PREFIXES, rule_prefix
+from port_set import PORT_SETS, smt_port_condition, c_port_condition, rule_ports
+from match_modules import ConntrackMatch, get_match_module
+from chain_graph import ChainGraph, RETURN
+from ruleset import PROTO_NUMBERS
+
+
+def _same_predicate(self, other):
+    return type(self) is type(other) and tuple.__eq__(self, other)
+
+
+def _other_predicate(self, other):
+    return not _same_predicate(self, other)
+
+
+def _predicate_hash(self):
+    return hash((type(self).__name__, tuple(self)))
+
+
+# Predicates compare equal only to predicates of the same type, so e.g. a
+# PrefixTest and a PortTest with the same field and id are distinct keys.
+class ProtoTest(NamedTuple):
+    protos: FrozenSet[int]      # IP protocol numbers, any of which matches
+    negated: bool = False
+    __eq__ = _same_predicate
+    __ne__ = _other_predicate
+    __hash__ = _predicate_hash
+
+
+class PrefixTest(NamedTuple):
+    field: str                  # 'src' or 'dst'
+    pid: int                    # id in prefix_table.PREFIXES, never the any-address prefix
+    negated: bool = False
+    __eq__ = _same_predicate
+    __ne__ = _other_predicate
+    __hash__ = _predicate_hash
+
+
+class PortTest(NamedTuple):
+    field: str                  # 'src' or 'dst'
+    sid: int                    # id in port_set.PORT_SETS, never the any-port set
+    negated: bool = False
+    __eq__ = _same_predicate
+    __ne__ = _other_predicate
+    __hash__ = _predicate_hash
+
+
+class AddressRangeTest(NamedTuple):
+    field: str                  # 'src' or 'dst'
+    ranges: Tuple[Tuple[int, int], ...]  # sorted, disjoint IPv4 (low, high) pairs, as rule_merge unions them
+    negated: bool = False
+    __eq__ = _same_predicate
+    __ne__ = _other_predicate
+    __hash__ = _predicate_hash
+
+
+class StateTest(NamedTuple):
+    states: int                 # OR of match_modules.CT_STATES bits, any of which matches
+    negated: bool = False
+    __eq__ = _same_predicate
+    __ne__ = _other_predicate
+    __hash__ = _predicate_hash
+
+
+class MatchTest(NamedTuple):
+    name: str                   # '-m' module name
+    value: object               # the module's parsed value
+    __eq__ = _same_predicate
+    __ne__ = _other_predicate
+    __hash__ = _predicate_hash
+
+
+MAX_ADDRESS = 0xFFFFFFFF
+
+# Predicate that no packet of the model satisfies (e.g. an IPv6 prefix)
+NEVER = ProtoTest(frozenset())
+
+
+class RuleIR(NamedTuple):
+    predicates: Tuple[object, ...]  # all must hold; empty matches every packet
+    action: str
+    goto: bool = False
+
+
+# Spellings of the options a rule can negate, as recorded in IPTablesRule.negated
+NEGATION_FLAGS = {
+    'proto': ('-p', '--protocol'),
+    'src': ('-s', '--source', '--src'),
+    'dst': ('-d', '--destination', '--dst'),
+    'src_port': ('--sport', '--source-port'),
+    'dst_port': ('--dport', '--destination-port'),
+}
+
+_PREDICATES: Dict[object, object] = {}
+_LOWERED = weakref.WeakKeyDictionary()
+
+
+def intern_predicate(predicate):
+    """Return the shared instance of an equal predicate."""
+    try:
+        return _PREDICATES.setdefault(predicate, predicate)
+    except TypeError:
+        return predicate  # A match value that cannot be hashed
+
+
+def proto_number(proto: str) -> Optional[int]:
+    """Protocol number of a '-p' argument, None for any protocol and -1 if unknown."""
+    if not proto or proto in ("any", "all", "0"):
+        return None
+    proto = proto.lower()
+    if proto in PROTO_NUMBERS:
+        return PROTO_NUMBERS[proto]
+    return int(proto) if proto.isdigit() and int(proto) <= 255 else -1
+
+
+def _lower(rule) -> RuleIR:
+    negated = getattr(rule, 'negated', ())
+
+    def is_negated(option):
+        return any(flag in negated for flag in NEGATION_FLAGS[option])
+
+    predicates = []
+    number = proto_number(rule.proto)
+    if number is not None:
+        predicates.append(ProtoTest(frozenset([number]) if number >= 0 else frozenset(), is_negated('proto')))
+    for side in ('src', 'dst'):
+        pid = rule_prefix(rule, side)
+        if PREFIXES.lengths[pid]:
+            predicates.append(PrefixTest(side, pid, is_negated(side)))
+    for side in ('src', 'dst'):
+        sid = rule_ports(rule, side)
+        if PORT_SETS.get(sid):
+            predicates.append(PortTest(side, sid, is_negated(side + '_port')))
+    for name, value in rule.matches.items():
+        if isinstance(value, ConntrackMatch):
+            if value.states:
+                predicates.append(StateTest(value.states, value.negated))
+        else:
+            predicates.append(MatchTest(name, value))
+    return RuleIR(tuple(intern_predicate(predicate) for predicate in predicates),
+                  rule.action, bool(getattr(rule, 'goto', False)))
+
+
+def lower_rule(rule) -> RuleIR:
+    """The IR of a rule, lowered on first use and cached for rule objects that allow it."""
+    try:
+        return _LOWERED[rule]
+    except KeyError:
+        ir = _LOWERED[rule] = _lower(rule)
+        return ir
+    except TypeError:
+        return _lower(rule)  # Rule views cannot be weakly referenced
+
+
+# Targets that only log the packet and never change its verdict
+LOGGING_ACTIONS = frozenset(('LOG', 'NFLOG', 'ULOG'))
+# Rules with these actions, or jumping to chains named like these, are not modelled
+SKIPPED_CHAINS = frozenset(('LOGGING', 'LOGGING_FORWARD'))
+SKIPPED_CHAIN_PARTS = ('ufw-logging', 'ufw-track', 'ufw-before-logging', 'ufw-after-logging', 'ufw-skip-to-policy')
+
+
+def is_modelled(rule):
+    """False for logging rules and jumps to logging or UFW tracking chains"""
+    return not (rule.action in LOGGING_ACTIONS or rule.action in SKIPPED_CHAINS
+                or any(x in rule.action for x in SKIPPED_CHAIN_PARTS))
+
+
+# Targets that decide a packet's fate in the model, and whether they accept it
+VERDICTS = {"ACCEPT": True, "DROP": False, "REJECT": False}
+
+
+def input_policy(tables) -> bool:
+    """Whether the INPUT policy accepts; True when there is no filter table (nothing is dropped)."""
+    filter_table = tables.get('filter')
+    if filter_table is None or 'INPUT' not in filter_table.chains:
+        return True
+    return VERDICTS.get(filter_table.chains['INPUT'].policy, False)
+
+
+# Outcome of a chain for a packet: fall through to the caller (or the policy), accept or drop
+CONTINUE, ACCEPTED, DROPPED = 0, 1, 2
+
+
+class ChainIR(NamedTuple):
+    name: str
+    rules: Tuple[RuleIR, ...]   # targets: a VERDICTS target, RETURN, or a chain listed before this one
+
+
+def chain_rules(filter_table, hook: str = 'INPUT') -> List[ChainIR]:
+    """The chains a packet entering ``hook`` can traverse, each after the chains it jumps to.
+
+    ``hook`` comes last. A chain keeps the rules that decide or steer: verdict
+    targets, RETURN, and jumps or gotos to modelled user chains (see
+    is_modelled). Rules with other targets only have side effects and fall
+    through, so they are left out. Raises ValueError on a chain loop, which
+    iptables itself refuses to load.
+    """
+    if hook not in filter_table.chains:
+        return []
+    graph = ChainGraph(filter_table)
+
+    def jumps(name):
+        rules = filter_table.chains[name].rules
+        return {edge.index: edge.target for edge in graph.edges[name] if is_modelled(rules[edge.index])}
+
+    targets = {hook: jumps(hook)}
+    order = []
+    visiting = {hook}
+    work = [(hook, iter(dict.fromkeys(targets[hook].values())))]
+    while work:
+        name, children = work[-1]
+        for child in children:
+            if child in visiting:
+                raise ValueError(f"chain loop in table {filter_table.name}: {name} -> {child}")
+            if child not in targets:
+                targets[child] = jumps(child)
+                visiting.add(child)
+                work.append((child, iter(dict.fromkeys(targets[child].values()))))
+                break
+        else:
+            work.pop()
+            visiting.discard(name)
+            order.append(name)
+
+    chains = []
+    for name in order:
+        rules = tuple(lower_rule(rule) for index, rule in enumerate(filter_table.chains[name].rules)
+                      if index in targets[name] or rule.action in VERDICTS or rule.action == RETURN)
+        chains.append(ChainIR(name, rules))
+    return chains
+
+
+# SMT-LIB text
+
+def _smt_not(condition: str, negated: bool) -> str:
+    return f"(not {condition})" if negated else condition
+
+
+def _smt_address_ranges(field: str, ranges) -> str:
+    tests = []
+    for low, high in ranges:
+        if low == high:
+            tests.append(f"(= {field} #x{low:08x})")
+        elif low == 0:
+            tests.append(f"(bvule {field} #x{high:08x})")
+        elif high == MAX_ADDRESS:
+            tests.append(f"(bvuge {field} #x{low:08x})")
+        else:
+            tests.append(f"(and (bvuge {field} #x{low:08x}) (bvule {field} #x{high:08x}))")
+    return "false" if not tests else tests[0] if len(tests) == 1 else f"(or {' '.join(tests)})"
+
+
+def smt_predicate(predicate) -> Optional[str]:
+    """SMT-LIB condition over code_generator's packet variables (None if unconstrained)."""
+    kind = type(predicate)
+    if kind is ProtoTest:
+        tests = [f"(= proto #b{number:08b})" for number in sorted(predicate.protos)]
+        condition = "false" if not tests else tests[0] if len(tests) == 1 else f"(or {' '.join(tests)})"
+        return _smt_not(condition, predicate.negated)
+    if kind is PrefixTest:
+        family, network, _ = PREFIXES.get(predicate.pid)
+        if family == 6:
+            condition = "false"  # IPv6 prefixes never match the IPv4 packet model
+        else:
+            condition = f"(= (apply_mask {predicate.field}_ip #x{PREFIXES.mask(predicate.pid):08x}) #x{network:08x})"
+        return _smt_not(condition, predicate.negated)
+    if kind is PortTest:
+        condition = smt_port_condition(f"{predicate.field}_port", PORT_SETS.get(predicate.sid))
+        return _smt_not(condition, predicate.negated)
+    if kind is AddressRangeTest:
+        return _smt_not(_smt_address_ranges(f"{predicate.field}_ip", predicate.ranges), predicate.negated)
+    if kind is StateTest:
+        test = f"(= (bvand state #x{predicate.states:02x}) #x00)"
+        return test if predicate.negated else f"(not {test})"
+    return get_match_module(predicate.name).to_smt(predicate.value)
+
+
+def smt_condition(ir: RuleIR, cache: Optional[dict] = None) -> str:
+    """SMT-LIB condition of a rule: the 'and' of its predicates, or 'true'.
+
+    ``cache`` memoizes the text of each predicate across rules.
+    """
+    tests = []
+    for predicate in ir.predicates:
+        if cache is None:
+            test = smt_predicate(predicate)
+        else:
+            test = cache.get(predicate)
+            if test is None and predicate not in cache:
+                test = cache[predicate] = smt_predicate(predicate)
+        if test:
+            tests.append(test)
+    return "(and " + " ".join(tests) + ")" if tests else "true"
+
+
+# C text
+
+# C expressions of the packet fields for the KLEE harness, whose check_packet
+# takes them as host-order arguments and keeps the conntrack bits in 'state'
+# (None would leave state tests unconstrained).
+C_FIELDS = {
+    'src_ip': 'src_ip', 'dst_ip': 'dst_ip', 'src_port': 'src_port', 'dst_port': 'dst_port',
+    'proto': 'proto', 'state': 'state',
+}
+# ... and for a TC program with the headers parsed as match_modules.MatchModule.to_ebpf expects
+EBPF_FIELDS = {
+    'src_ip': 'bpf_ntohl(iph->saddr)', 'dst_ip': 'bpf_ntohl(iph->daddr)',
+    'src_port': 'bpf_ntohs(tcph->source)', 'dst_port': 'bpf_ntohs(tcph->dest)',
+    'proto': 'iph->protocol', 'state': 'ct_state',
+}
+
+
+def _c_not(condition: str, negated: bool) -> str:
+    return f"!({condition})" if negated else condition
+
+
+def c_predicate(predicate, fields: dict = C_FIELDS) -> Optional[str]:
+    """C condition over ``fields`` (None if unconstrained).
+
+    Match modules are only lowered for TC programs (fields is EBPF_FIELDS);
+    the KLEE harness has no fields for them.
+    """
+    kind = type(predicate)
+    if kind is ProtoTest:
+        tests = [f"{fields['proto']} == {number}" for number in sorted(predicate.protos)]
+        condition = "0" if not tests else tests[0] if len(tests) == 1 else "(" + " || ".join(tests) + ")"
+        return _c_not(condition, predicate.negated)
+    if kind is PrefixTest:
+        family, network, _ = PREFIXES.get(predicate.pid)
+        if family == 6:
+            condition = "0"
+        else:
+            condition = f"({fields[predicate.field + '_ip']} & 0x{PREFIXES.mask(predicate.pid):08x}) == 0x{network:08x}"
+        return _c_not(condition, predicate.negated)
+    if kind is PortTest:
+        condition = c_port_condition(fields[predicate.field + '_port'], PORT_SETS.get(predicate.sid))
+        return _c_not(condition, predicate.negated)
+    if kind is AddressRangeTest:
+        expr = fields[predicate.field + '_ip']
+        tests = [f"{expr} == 0x{low:08x}" if low == high else f"({expr} >= 0x{low:08x} && {expr} <= 0x{high:08x})"
+                 for low, high in predicate.ranges]
+        condition = "0" if not tests else tests[0] if len(tests) == 1 else "(" + " || ".join(tests) + ")"
+        return _c_not(condition, predicate.negated)
+    if kind is StateTest:
+        if fields['state'] is None:
+            return None
+        return f"({fields['state']} & 0x{predicate.states:02x}) {'==' if predicate.negated else '!='} 0"
+    if fields is EBPF_FIELDS:
+        return get_match_module(predicate.name).to_ebpf(predicate.value)
+    return None
+
+
+def c_condition(ir: RuleIR, fields: dict = C_FIELDS) -> str:
+    """C condition of a rule: the '&&' of its predicates, or '1'."""
+    tests = [test for test in (c_predicate(predicate, fields) for predicate in ir.predicates) if test]
+    return " && ".join(tests) if tests else "1"
@@ -0,0 +1,218 @@
+# iptablesToSMT/rule_merge.py
+"""Merge runs of same-action rules into interval and prefix unions.
+
+Within a run of consecutive rules with the same target, the order of the
+rules cannot change any verdict: the run accepts (or drops) the union of
+what its rules match. Two rules of a run that differ only in their protocol,
+one address or one port field become one rule testing the union of the two
+values. Repeating this to a fixpoint turns e.g. a ufw allow list of
+'-p tcp --dport N' and '-p udp --dport N' pairs into one test of the protocol
+pair and a few unsigned port ranges:
+
+    chains, report = merge_chains(chain_rules(filter_table))
+    print(report)   # Merged 1200 rules into 3 (2400 tests into 9)
+
+Address unions are kept as a prefix when they form one (two adjacent /25s
+become a /24) and as an AddressRangeTest of unsigned ranges otherwise.
+Consecutive jumps to the same chain (or RETURNs) merge the same way, since a
+chain's outcome only depends on the packet. Predicates the SMT model leaves
+unconstrained (matches without a to_smt lowering, such as comments) are
+dropped first, so the pass is meant for the SMT-LIB and z3 emitters; negated
+tests and match modules only merge when they are identical.
+"""
+from typing import Dict, List, Tuple
+
+from prefix_table import PREFIXES
+from port_set import PORT_SETS, FULL_RANGE, merge_ranges
+from match_modules import get_match_module
+from rule_ir import (ProtoTest, PrefixTest, PortTest, AddressRangeTest, MatchTest, RuleIR, ChainIR, MAX_ADDRESS,
+                     intern_predicate)
+
+# Fields whose values are unioned, in the order the merged predicates are emitted
+SLOTS = ("proto", "src_ip", "dst_ip", "src_port", "dst_port")
+
+
+class MergeReport:
+    """Rule and comparison counts before and after a merge pass."""
+
+    def __init__(self):
+        self.rules_before = self.rules_after = 0
+        self.tests_before = self.tests_after = 0
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of the comparisons removed."""
+        return 1 - self.tests_after / self.tests_before if self.tests_before else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "rules_before": self.rules_before,
+            "rules_after": self.rules_after,
+            "tests_before": self.tests_before,
+            "tests_after": self.tests_after,
+            "ratio": round(self.ratio, 4),
+        }
+
+    def __str__(self):
+        return (f"Merged {self.rules_before} rules into {self.rules_after} "
+                f"({self.tests_before} tests into {self.tests_after}, {self.ratio:.1%} fewer)")
+
+
+def count_tests(ir: RuleIR) -> int:
+    """Number of comparisons an emitter writes for a rule."""
+    tests = 0
+    for predicate in ir.predicates:
+        kind = type(predicate)
+        if kind is ProtoTest:
+            tests += len(predicate.protos)
+        elif kind is PortTest:
+            tests += len(PORT_SETS.get(predicate.sid))
+        elif kind is AddressRangeTest:
+            tests += len(predicate.ranges)
+        elif kind is not MatchTest or get_match_module(predicate.name).to_smt(predicate.value) is not None:
+            tests += 1
+    return tests
+
+
+def _slots(ir: RuleIR) -> Tuple[Dict[str, object], frozenset]:
+    """Split a rule into unionable slot values and the other (fixed) predicates."""
+    slots, fixed = {}, []
+    for predicate in ir.predicates:
+        kind = type(predicate)
+        if kind is MatchTest and get_match_module(predicate.name).to_smt(predicate.value) is None:
+            continue
+        if getattr(predicate, 'negated', True):
+            fixed.append(predicate)
+        elif kind is ProtoTest:
+            slots["proto"] = predicate.protos
+        elif kind is PortTest:
+            slots[predicate.field + "_port"] = PORT_SETS.get(predicate.sid)
+        elif kind is AddressRangeTest:
+            slots[predicate.field + "_ip"] = predicate.ranges
+        elif kind is PrefixTest and PREFIXES.families[predicate.pid] == 4:
+            _, network, _ = PREFIXES.get(predicate.pid)
+            slots[predicate.field + "_ip"] = ((network, network | (~PREFIXES.mask(predicate.pid) & MAX_ADDRESS)),)
+        else:
+            fixed.append(predicate)
+    return slots, frozenset(fixed)
+
+
+def _union(slot: str, first, second):
+    """Union of two slot values; None when it covers the whole field."""
+    if slot == "proto":
+        return first | second
+    if slot.endswith("_port"):
+        merged = merge_ranges(first + second)
+        return None if merged == FULL_RANGE else merged
+    merged = []
+    for low, high in sorted(first + second):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(high, merged[-1][1]))
+        else:
+            merged.append((low, high))
+    return None if merged == [(0, MAX_ADDRESS)] else tuple(merged)
+
+
+def _address_predicate(field: str, ranges) -> object:
+    if len(ranges) == 1:
+        low, high = ranges[0]
+        size = high - low + 1
+        if size & (size - 1) == 0 and low % size == 0:  # An aligned power of two: a prefix
+            return PrefixTest(field, PREFIXES.intern_network(4, low, 32 - size.bit_length() + 1))
+    return AddressRangeTest(field, ranges)
+
+
+def _rebuild(slots: Dict[str, object], fixed: frozenset, position: Dict[object, int], action: str,
+             goto: bool) -> RuleIR:
+    predicates = []
+    for slot in SLOTS:
+        value = slots.get(slot)
+        if value is None:
+            continue
+        side = slot.split("_")[0]
+        if slot == "proto":
+            predicates.append(ProtoTest(value))
+        elif slot.endswith("_port"):
+            predicates.append(PortTest(side, PORT_SETS.intern_ranges(value)))
+        else:
+            predicates.append(_address_predicate(side, value))
+    predicates.extend(sorted(fixed, key=position.__getitem__))
+    return RuleIR(tuple(intern_predicate(predicate) for predicate in predicates), action, goto)
+
+
+def _merge_run(run: List[RuleIR]) -> List[RuleIR]:
+    """Merge the rules of a same-action run until no slot union applies."""
+    members = []
+    for ir in run:
+        try:
+            slots, fixed = _slots(ir)
+            hash(fixed)
+        except TypeError:
+            return run  # A match value that cannot be hashed: leave the run as it is
+        members.append((slots, fixed))
+
+    changed = True
+    while changed and len(members) > 1:
+        changed = False
+        for slot in SLOTS:
+            groups: Dict[tuple, int] = {}
+            merged = []
+            for slots, fixed in members:
+                key = (fixed,) + tuple(slots.get(other) for other in SLOTS if other != slot)
+                index = groups.get(key)
+                if index is None:
+                    groups[key] = len(merged)
+                    merged.append((slots, fixed))
+                    continue
+                kept = merged[index][0]
+                if slot not in kept or slot not in slots:
+                    union = None  # One of them takes any value of the field
+                else:
+                    union = _union(slot, kept[slot], slots[slot])
+                kept = dict(kept)
+                if union is None:
+                    kept.pop(slot, None)
+                else:
+                    kept[slot] = union
+                merged[index] = (kept, fixed)
+                changed = True
+            members = merged
+
+    position: Dict[object, int] = {}  # Fixed predicates keep the order they first appear in
+    for ir in run:
+        for predicate in ir.predicates:
+            position.setdefault(predicate, len(position))
+    action, goto = run[0].action, run[0].goto
+    return [_rebuild(slots, fixed, position, action, goto) for slots, fixed in members]
+
+
+def merge_rules(rules: List[RuleIR]) -> Tuple[List[RuleIR], MergeReport]:
+    """Merge each run of consecutive rules with the same target; first-match order is kept."""
+    report = MergeReport()
+    result: List[RuleIR] = []
+    start = 0
+    while start < len(rules):
+        end = start + 1
+        while end < len(rules) and (rules[end].action, rules[end].goto) == (rules[start].action, rules[start].goto):
+            end += 1
+        run = rules[start:end]
+        result.extend(_merge_run(run) if len(run) > 1 else run)
+        start = end
+    report.rules_before, report.rules_after = len(rules), len(result)
+    report.tests_before = sum(count_tests(ir) for ir in rules)
+    report.tests_after = sum(count_tests(ir) for ir in result)
+    return result, report
+
+
+def merge_chains(chains: List[ChainIR]) -> Tuple[List[ChainIR], MergeReport]:
+    """merge_rules applied to each chain of rule_ir.chain_rules; one report for all of them."""
+    total = MergeReport()
+    merged = []
+    for chain in chains:
+        rules, report = merge_rules(list(chain.rules))
+        merged.append(ChainIR(chain.name, tuple(rules)))
+        total.rules_before += report.rules_before
+        total.rules_after += report.rules_after
+        total.tests_before += report.tests_before
+        total.tests_after += report.tests_after
+    return merged, total
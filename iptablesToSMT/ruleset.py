@@ -0,0 +1,444 @@
+# iptablesToSMT/ruleset.py
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from iptables_rule_classes import IPTablesTable, IPTablesChain
+from iptables_parser import iter_iptables_save, TABLE, CHAIN, RULE, COMMIT
+from prefix_table import PREFIXES, PrefixTable, rule_prefix
+from port_set import PORT_SETS, PortSetTable, rule_ports
+
+# IP protocol numbers stored in the proto column; PROTO_ANY means no -p match
+PROTO_ANY = -1
+PROTO_NUMBERS = {
+    "icmp": 1,
+    "igmp": 2,
+    "tcp": 6,
+    "udp": 17,
+    "ipv6": 41,
+    "gre": 47,
+    "esp": 50,
+    "ah": 51,
+    "icmpv6": 58,
+    "ipv6-icmp": 58,
+    "sctp": 132,
+    "udplite": 136,
+}
+PROTO_NAMES = {number: name for name, number in PROTO_NUMBERS.items()}
+PROTO_NAMES[58] = "icmpv6"
+
+
+class StringTable:
+    """Interns strings once and hands out small integer ids; id 0 is the empty string."""
+
+    def __init__(self):
+        self.strings: List[str] = [""]
+        self._ids: Dict[str, int] = {"": 0}
+
+    def intern(self, value: Optional[str]) -> int:
+        if not value:
+            return 0
+        sid = self._ids.get(value)
+        if sid is None:
+            sid = len(self.strings)
+            self._ids[value] = sid
+            self.strings.append(value)
+        return sid
+
+    def __getitem__(self, sid: int) -> str:
+        return self.strings[sid]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class RuleView:
+    """Lightweight, read-only view of one row of a RuleSet.
+
+    Exposes the same attributes as IPTablesRule so existing consumers such as
+    code_generator.generate_c_code work unchanged.
+    """
+
+    __slots__ = ("_rs", "_row")
+
+    def __init__(self, ruleset: "RuleSet", row: int):
+        self._rs = ruleset
+        self._row = row
+
+    @property
+    def table(self) -> str:
+        return self._rs.chain_table(self._rs.chain_ids[self._row])
+
+    @property
+    def chain(self) -> str:
+        return self._rs.chain_name(self._rs.chain_ids[self._row])
+
+    @property
+    def proto(self) -> str:
+        rs, row = self._rs, self._row
+        if row in rs.proto_overrides:
+            return rs.proto_overrides[row]
+        code = rs.protos[row]
+        if code == PROTO_ANY:
+            return ""
+        return PROTO_NAMES.get(code, str(code))
+
+    @property
+    def src_prefix(self) -> int:
+        return self._rs.src_prefixes[self._row]
+
+    @property
+    def dst_prefix(self) -> int:
+        return self._rs.dst_prefixes[self._row]
+
+    @property
+    def src_ip(self) -> int:
+        return self._rs.prefixes.networks[self._rs.src_prefixes[self._row]]
+
+    @property
+    def src_mask(self) -> int:
+        return self._rs.prefixes.lengths[self._rs.src_prefixes[self._row]]
+
+    @property
+    def dst_ip(self) -> int:
+        return self._rs.prefixes.networks[self._rs.dst_prefixes[self._row]]
+
+    @property
+    def dst_mask(self) -> int:
+        return self._rs.prefixes.lengths[self._rs.dst_prefixes[self._row]]
+
+    @property
+    def src_port(self) -> str:
+        return self._rs.port_sets.texts[self._rs.sport_sets[self._row]]
+
+    @property
+    def dst_port(self) -> str:
+        return self._rs.port_sets.texts[self._rs.dport_sets[self._row]]
+
+    @property
+    def src_ports(self) -> int:
+        return self._rs.sport_sets[self._row]
+
+    @property
+    def dst_ports(self) -> int:
+        return self._rs.dport_sets[self._row]
+
+    @property
+    def in_interface(self) -> str:
+        return self._rs.strings[self._rs.in_ifaces[self._row]]
+
+    @property
+    def out_interface(self) -> str:
+        return self._rs.strings[self._rs.out_ifaces[self._row]]
+
+    @property
+    def matches(self) -> dict:
+        return self._rs.matches.get(self._row, {})
+
+    @property
+    def action(self) -> str:
+        return self._rs.strings[self._rs.actions[self._row]]
+
+    @property
+    def target_options(self) -> list:
+        return self._rs.target_options.get(self._row, [])
+
+    @property
+    def negated(self) -> tuple:
+        return self._rs.negations.get(self._row, ())
+
+    @property
+    def goto(self) -> bool:
+        return self._row in self._rs.gotos
+
+    @property
+    def packets(self) -> int:
+        return self._rs.packet_counts[self._row]
+
+    @property
+    def bytes(self) -> int:
+        return self._rs.byte_counts[self._row]
+
+    def __str__(self):
+        return f"Rule(table={self.table}, chain={self.chain}, proto={self.proto}, src_ip={self.src_ip}, src_mask={self.src_mask}, dst_ip={self.dst_ip}, dst_mask={self.dst_mask}, in_interface={self.in_interface}, out_interface={self.out_interface}, matches={self.matches}, action={self.action}, target_options={self.target_options})"
+
+
+class ChainRules:
+    """Sequence of RuleViews for one chain; views are created on access."""
+
+    __slots__ = ("_rs", "_rows")
+
+    def __init__(self, ruleset: "RuleSet", rows: array):
+        self._rs = ruleset
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        view = self._rs.view_class
+        if isinstance(index, slice):
+            return [view(self._rs, row) for row in self._rows[index]]
+        return view(self._rs, self._rows[index])
+
+    def __iter__(self) -> Iterator[RuleView]:
+        rs = self._rs
+        view = rs.view_class
+        for row in self._rows:
+            yield view(rs, row)
+
+
+class RuleSet:
+    """Columnar store for parsed iptables rules.
+
+    Every rule is one row across a set of typed ``array`` columns instead of a
+    Python object with its own ``__dict__``. Interface, chain, table and target
+    names are interned once in ``strings``; addresses and ports are ids into a
+    shared PrefixTable and PortSetTable. Match and target options are rare and irregular, so they live
+    in sparse dicts keyed by row.
+    """
+
+    view_class = RuleView
+
+    def __init__(self, prefixes: PrefixTable = PREFIXES, port_sets: PortSetTable = PORT_SETS):
+        self.strings = StringTable()
+        self.prefixes = prefixes
+        self.port_sets = port_sets
+
+        # Chains, indexed by chain id
+        self.chain_keys: List[Tuple[int, int]] = []  # (table sid, chain sid)
+        self.chain_policies = array('I')             # policy sid
+        self.chain_rows: List[array] = []            # rows of each chain, in order
+        self.chain_packets = array('Q')              # policy counters
+        self.chain_bytes = array('Q')
+        self._chain_index: Dict[Tuple[str, str], int] = {}
+        self.table_names: List[str] = []             # tables in input order
+
+        # Rule columns, indexed by row
+        self.chain_ids = array('I')
+        self.protos = array('h')
+        self.src_prefixes = array('I')
+        self.dst_prefixes = array('I')
+        self.sport_sets = array('I')
+        self.dport_sets = array('I')
+        self.in_ifaces = array('I')
+        self.out_ifaces = array('I')
+        self.actions = array('I')
+        self.packet_counts = array('Q')  # iptables-save -c counters, 0 if not recorded
+        self.byte_counts = array('Q')
+        self.has_counters = False        # True once any rule or chain counter is non-zero
+
+        # Sparse per-row side tables
+        self.proto_overrides: Dict[int, str] = {}
+        self.matches: Dict[int, dict] = {}
+        self.target_options: Dict[int, list] = {}
+        self.negations: Dict[int, tuple] = {}
+        self.gotos: Set[int] = set()  # rows whose target was given with -g
+
+    def __len__(self):
+        return sum(len(self.chain_rows[chain_id]) for chain_id in self._chain_index.values())
+
+    def __getitem__(self, index: int) -> RuleView:
+        """The index-th rule in iteration order; rows of replaced chains are skipped like in len()."""
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for chain_id in self._chain_index.values():
+                rows = self.chain_rows[chain_id]
+                if index < len(rows):
+                    return self.view_class(self, rows[index])
+                index -= len(rows)
+        raise IndexError("rule index out of range")
+
+    def row_view(self, row: int) -> RuleView:
+        """The rule stored at a raw column row, whether or not its chain is still live."""
+        if not 0 <= row < len(self.chain_ids):
+            raise IndexError("rule row out of range")
+        return self.view_class(self, row)
+
+    def __iter__(self) -> Iterator[RuleView]:
+        """Iterate the rules of every live chain, chain by chain."""
+        view = self.view_class
+        for chain_id in self._chain_index.values():
+            for row in self.chain_rows[chain_id]:
+                yield view(self, row)
+
+    def iter_chains(self) -> Iterator[Tuple[str, str, array]]:
+        """(table, chain, rows) of every live chain, in input order; rows index the rule columns."""
+        for (table, chain), chain_id in self._chain_index.items():
+            yield table, chain, self.chain_rows[chain_id]
+
+    def chain_table(self, chain_id: int) -> str:
+        return self.strings[self.chain_keys[chain_id][0]]
+
+    def chain_name(self, chain_id: int) -> str:
+        return self.strings[self.chain_keys[chain_id][1]]
+
+    def chain_id(self, table: str, chain: str) -> Optional[int]:
+        return self._chain_index.get((table, chain))
+
+    def add_table(self, table: str):
+        """Declare a table; a repeated '*table' section replaces the earlier one."""
+        if table not in self.table_names:
+            self.table_names.append(table)
+            return
+        # Rows of the replaced chains stay in the columns but are no longer reachable
+        for key in [key for key in self._chain_index if key[0] == table]:
+            del self._chain_index[key]
+
+    def add_chain(self, table: str, chain: str, policy: str = "ACCEPT",
+                  packets: int = 0, byte_count: int = 0) -> int:
+        """Declare a chain (or update its policy and counters) and return its id."""
+        if table not in self.table_names:
+            self.table_names.append(table)
+        chain_id = self._chain_index.get((table, chain))
+        if chain_id is None:
+            chain_id = len(self.chain_keys)
+            self._chain_index[(table, chain)] = chain_id
+            self.chain_keys.append((self.strings.intern(table), self.strings.intern(chain)))
+            self.chain_policies.append(self.strings.intern(policy))
+            self.chain_rows.append(array('I'))
+            self.chain_packets.append(packets)
+            self.chain_bytes.append(byte_count)
+        else:
+            self.chain_policies[chain_id] = self.strings.intern(policy)
+            self.chain_packets[chain_id] = packets
+            self.chain_bytes[chain_id] = byte_count
+        if packets or byte_count:
+            self.has_counters = True
+        return chain_id
+
+    def add_rule(self, rule) -> Optional[int]:
+        """Append an IPTablesRule-like object; returns its row, or None if its chain is unknown."""
+        chain_id = self._chain_index.get((rule.table, rule.chain))
+        if chain_id is None:
+            return None
+        row = len(self.chain_ids)
+        intern = self.strings.intern
+
+        self.chain_ids.append(chain_id)
+
+        proto = (rule.proto or "").lower()
+        if not proto or proto == "all":
+            self.protos.append(PROTO_ANY)
+        elif proto in PROTO_NUMBERS:
+            self.protos.append(PROTO_NUMBERS[proto])
+        elif proto.isdigit():
+            self.protos.append(int(proto))
+        else:
+            self.protos.append(PROTO_ANY)
+            self.proto_overrides[row] = rule.proto
+
+        self.src_prefixes.append(rule_prefix(rule, 'src', self.prefixes))
+        self.dst_prefixes.append(rule_prefix(rule, 'dst', self.prefixes))
+
+        self.sport_sets.append(rule_ports(rule, 'src', self.port_sets))
+        self.dport_sets.append(rule_ports(rule, 'dst', self.port_sets))
+
+        self.in_ifaces.append(intern(rule.in_interface))
+        self.out_ifaces.append(intern(rule.out_interface))
+        self.actions.append(intern(rule.action))
+        packets, byte_count = getattr(rule, 'packets', 0), getattr(rule, 'bytes', 0)
+        self.packet_counts.append(packets)
+        self.byte_counts.append(byte_count)
+        if packets or byte_count:
+            self.has_counters = True
+
+        if rule.matches:
+            self.matches[row] = rule.matches
+        if rule.target_options:
+            self.target_options[row] = rule.target_options
+        if getattr(rule, 'negated', None):
+            self.negations[row] = tuple(rule.negated)
+        if getattr(rule, 'goto', False):
+            self.gotos.add(row)
+
+        self.chain_rows[chain_id].append(row)
+        return row
+
+    @classmethod
+    def from_events(cls, events: Iterable[Tuple[str, object]]) -> "RuleSet":
+        """Build a RuleSet from iptables_parser.iter_iptables_save() events.
+
+        Rule objects are converted to columns as they arrive and then dropped,
+        so only the columnar form is kept in memory.
+        """
+        ruleset = cls()
+        current_table = None
+        for kind, payload in events:
+            if kind == RULE:
+                ruleset.add_rule(payload)
+            elif kind == CHAIN:
+                ruleset.add_chain(current_table, payload.name, payload.policy, payload.packets, payload.bytes)
+            elif kind == TABLE:
+                current_table = payload.name
+                ruleset.add_table(current_table)
+            elif kind == COMMIT:
+                current_table = None
+        return ruleset
+
+    @classmethod
+    def from_file(cls, filename: str) -> "RuleSet":
+        """Stream an iptables-save file ('-' reads stdin) straight into a RuleSet."""
+        try:
+            if filename == '-':
+                return cls.from_events(iter_iptables_save(sys.stdin))
+
+            with open(filename, 'r') as f:
+                return cls.from_events(iter_iptables_save(f))
+
+        except FileNotFoundError:
+            raise RuntimeError(f"Could not find iptables rules file: {filename}")
+        except Exception as e:
+            raise RuntimeError(f"Error parsing iptables rules file: {str(e)}")
+
+    @classmethod
+    def from_tables(cls, tables: dict) -> "RuleSet":
+        """Build a RuleSet from a {name: IPTablesTable} dict."""
+        ruleset = cls()
+        for table_name, table in tables.items():
+            ruleset.add_table(table_name)
+            for chain_name, chain in table.chains.items():
+                ruleset.add_chain(table_name, chain_name, chain.policy,
+                                  getattr(chain, 'packets', 0), getattr(chain, 'bytes', 0))
+                for rule in chain.rules:
+                    ruleset.add_rule(rule)
+        return ruleset
+
+    def __getstate__(self) -> dict:
+        """Pickle support: store the prefix and port set values instead of table ids.
+
+        Ids are only meaningful within one process's PREFIXES/PORT_SETS, so the
+        values of the ids in use are saved and re-interned on load.
+        """
+        state = self.__dict__.copy()
+        del state['prefixes'], state['port_sets']
+        used = set(self.src_prefixes) | set(self.dst_prefixes)
+        state['prefix_values'] = [(pid, self.prefixes.get(pid)) for pid in used]
+        used = set(self.sport_sets) | set(self.dport_sets)
+        state['port_set_values'] = [(sid, self.port_sets.get(sid)) for sid in used]
+        return state
+
+    def __setstate__(self, state: dict):
+        prefix_values = state.pop('prefix_values')
+        port_set_values = state.pop('port_set_values')
+        self.__dict__.update(state)
+        self.prefixes = PREFIXES
+        self.port_sets = PORT_SETS
+
+        ids = {pid: PREFIXES.intern_network(*value) for pid, value in prefix_values}
+        self.src_prefixes = array('I', [ids[pid] for pid in self.src_prefixes])
+        self.dst_prefixes = array('I', [ids[pid] for pid in self.dst_prefixes])
+        ids = {sid: PORT_SETS.intern_ranges(ranges) for sid, ranges in port_set_values}
+        self.sport_sets = array('I', [ids[sid] for sid in self.sport_sets])
+        self.dport_sets = array('I', [ids[sid] for sid in self.dport_sets])
+
+    def as_tables(self) -> Dict[str, IPTablesTable]:
+        """Return IPTablesTable/IPTablesChain wrappers whose rules are RuleViews."""
+        tables: Dict[str, IPTablesTable] = {name: IPTablesTable(name) for name in self.table_names}
+        for (table_name, chain_name), chain_id in self._chain_index.items():
+            chain = IPTablesChain(chain_name, self.strings[self.chain_policies[chain_id]])
+            chain.packets, chain.bytes = self.chain_packets[chain_id], self.chain_bytes[chain_id]
+            chain.rules = ChainRules(self, self.chain_rows[chain_id])
+            tables[table_name].chains[chain_name] = chain
+        return tables
@@ -0,0 +1,359 @@
+# iptablesToSMT/ruleset_file.py
+"""Versioned, memory-mappable binary format for RuleSets.
+
+Layout (native byte order, recorded in the header):
+
+    header    magic b"IPTRSET\\0", format version (H), byte order (B), section count (I)
+    directory one (name, typecode, offset, item count) entry per section
+    sections  raw array data, each aligned to 8 bytes
+
+Every rule column of RuleSet is stored as a fixed-width section, as are the
+chain tables, a string table (offsets + UTF-8 blob), the prefixes and port sets
+the file uses (file-local ids) and a pickled blob of the sparse per-row data.
+
+open_ruleset() maps the file read-only and wraps the sections in memoryviews,
+so loading costs a header read plus work proportional to the number of chains,
+not rules; prefixes, port sets, strings and the sparse data are decoded on
+first use. The pages are shared by every process that maps the same file.
+"""
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from typing import Dict, List, Tuple
+
+from prefix_table import PREFIXES
+from port_set import PORT_SETS
+from ruleset import RuleSet, RuleView, StringTable
+
+MAGIC = b"IPTRSET\0"
+FORMAT_VERSION = 3
+
+_HEADER = struct.Struct("<8sHBxI")
+_ENTRY = struct.Struct("<16sc7xQQ")
+_BYTE_ORDERS = {"little": 0, "big": 1}
+
+# RuleSet rule columns, in file order
+RULE_COLUMNS = (
+    "chain_ids", "protos", "src_prefixes", "dst_prefixes", "sport_sets", "dport_sets",
+    "in_ifaces", "out_ifaces", "actions", "packet_counts", "byte_counts",
+)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def write_ruleset(ruleset: RuleSet, filename: str):
+    """Write a RuleSet to ``filename`` in the binary format."""
+    sections: List[Tuple[str, array]] = []
+
+    table_sids = array('I', [ruleset.strings.intern(name) for name in ruleset.table_names])
+
+    # String table
+    strings = [s.encode('utf-8') for s in ruleset.strings.strings]
+    offsets = array('I', [0])
+    for data in strings:
+        offsets.append(offsets[-1] + len(data))
+    sections.append(("strings.offsets", offsets))
+    sections.append(("strings.data", array('B', b"".join(strings))))
+
+    # Tables and chains
+    sections.append(("tables", table_sids))
+    sections.append(("chain.table", array('I', [table for table, _ in ruleset.chain_keys])))
+    sections.append(("chain.name", array('I', [chain for _, chain in ruleset.chain_keys])))
+    sections.append(("chain.policy", array('I', ruleset.chain_policies)))
+    sections.append(("chain.packets", array('Q', ruleset.chain_packets)))
+    sections.append(("chain.bytes", array('Q', ruleset.chain_bytes)))
+    row_offsets = array('I', [0])
+    rows = array('I')
+    for chain_rows in ruleset.chain_rows:
+        rows.extend(chain_rows)
+        row_offsets.append(len(rows))
+    sections.append(("chain.offsets", row_offsets))
+    sections.append(("chain.rows", rows))
+    live = array('I', [ruleset.chain_id(table, chain) for table, chain, _ in ruleset.iter_chains()])
+    sections.append(("chain.live", live))
+
+    # Prefixes and port sets get dense file-local ids, 0 still meaning "any"
+    prefix_ids: Dict[int, int] = {0: 0}
+    for column in (ruleset.src_prefixes, ruleset.dst_prefixes):
+        for pid in column:
+            if pid not in prefix_ids:
+                prefix_ids[pid] = len(prefix_ids)
+    families, lengths, networks = array('B'), array('B'), array('Q')
+    for pid in prefix_ids:
+        family, network, length = ruleset.prefixes.get(pid)
+        families.append(family)
+        lengths.append(length)
+        networks.extend((network >> 64, network & 0xFFFFFFFFFFFFFFFF))
+    sections += [("prefix.family", families), ("prefix.length", lengths), ("prefix.network", networks)]
+
+    port_set_ids: Dict[int, int] = {0: 0}
+    for column in (ruleset.sport_sets, ruleset.dport_sets):
+        for sid in column:
+            if sid not in port_set_ids:
+                port_set_ids[sid] = len(port_set_ids)
+    bounds_offsets = array('I', [0])
+    bounds = array('H')
+    for sid in port_set_ids:
+        for low, high in ruleset.port_sets.get(sid):
+            bounds.extend((low, high))
+        bounds_offsets.append(len(bounds))
+    sections += [("ports.offsets", bounds_offsets), ("ports.bounds", bounds)]
+
+    # Rule columns
+    for name in RULE_COLUMNS:
+        column = getattr(ruleset, name)
+        if name in ("src_prefixes", "dst_prefixes"):
+            column = array('I', [prefix_ids[pid] for pid in column])
+        elif name in ("sport_sets", "dport_sets"):
+            column = array('I', [port_set_ids[sid] for sid in column])
+        sections.append((name, column))
+
+    sparse = {
+        "proto_overrides": ruleset.proto_overrides,
+        "matches": ruleset.matches,
+        "target_options": ruleset.target_options,
+        "negations": ruleset.negations,
+        "gotos": ruleset.gotos,
+        "has_counters": ruleset.has_counters,
+    }
+    sections.append(("sparse", array('B', pickle.dumps(sparse, protocol=pickle.HIGHEST_PROTOCOL))))
+
+    # Header, directory, then the aligned section data
+    offset = _align(_HEADER.size + _ENTRY.size * len(sections))
+    directory = []
+    for name, data in sections:
+        assert len(name) <= 16, name
+        directory.append(_ENTRY.pack(name.encode(), data.typecode.encode(), offset, len(data)))
+        offset = _align(offset + len(data) * data.itemsize)
+
+    temp_name = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_name, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, _BYTE_ORDERS[sys.byteorder], len(sections)))
+        f.write(b"".join(directory))
+        for name, data in sections:
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            data.tofile(f)
+    os.replace(temp_name, filename)
+
+
+class MappedStringTable(StringTable):
+    """Read-only string table decoded from the file on first access."""
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+        self._cache: Dict[int, str] = {}
+        self._ids = None
+
+    @property
+    def strings(self) -> List[str]:
+        return [self[sid] for sid in range(len(self))]
+
+    def __getitem__(self, sid: int) -> str:
+        value = self._cache.get(sid)
+        if value is None:
+            value = str(self._data[self._offsets[sid]:self._offsets[sid + 1]], 'utf-8')
+            self._cache[sid] = value
+        return value
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def intern(self, value) -> int:
+        """Look up an existing string (the mapped table cannot grow)."""
+        if not value:
+            return 0
+        if self._ids is None:
+            self._ids = {self[sid]: sid for sid in range(len(self))}
+        return self._ids[value]
+
+
+class MappedRuleView(RuleView):
+    """RuleView of a MappedRuleSet.
+
+    Prefix and port columns hold file-local ids; they are translated to ids
+    of the process-wide PREFIXES/PORT_SETS, which the emitters expect.
+    """
+
+    __slots__ = ()
+
+    @property
+    def src_prefix(self) -> int:
+        return self._rs.prefix_id(self._rs.src_prefixes[self._row])
+
+    @property
+    def dst_prefix(self) -> int:
+        return self._rs.prefix_id(self._rs.dst_prefixes[self._row])
+
+    @property
+    def src_ip(self) -> int:
+        return PREFIXES.networks[self.src_prefix]
+
+    @property
+    def src_mask(self) -> int:
+        return PREFIXES.lengths[self.src_prefix]
+
+    @property
+    def dst_ip(self) -> int:
+        return PREFIXES.networks[self.dst_prefix]
+
+    @property
+    def dst_mask(self) -> int:
+        return PREFIXES.lengths[self.dst_prefix]
+
+    @property
+    def src_ports(self) -> int:
+        return self._rs.port_set_id(self._rs.sport_sets[self._row])
+
+    @property
+    def dst_ports(self) -> int:
+        return self._rs.port_set_id(self._rs.dport_sets[self._row])
+
+    @property
+    def src_port(self) -> str:
+        return PORT_SETS.texts[self.src_ports]
+
+    @property
+    def dst_port(self) -> str:
+        return PORT_SETS.texts[self.dst_ports]
+
+
+class MappedRuleSet(RuleSet):
+    """Read-only RuleSet whose columns are memoryviews into a mapped file."""
+
+    view_class = MappedRuleView
+
+    def __init__(self, sections: dict, mapping=None):
+        self._mapping = mapping  # Closed by the garbage collector once no view is left
+        self._sections = sections
+        self._sparse_data = None
+        self.strings = MappedStringTable(sections["strings.offsets"], sections["strings.data"])
+        self.prefixes = PREFIXES
+        self.port_sets = PORT_SETS
+
+        # Chains
+        self.table_names = [self.strings[sid] for sid in sections["tables"]]
+        self.chain_keys = list(zip(sections["chain.table"], sections["chain.name"]))
+        self.chain_policies = sections["chain.policy"]
+        self.chain_packets = sections["chain.packets"]
+        self.chain_bytes = sections["chain.bytes"]
+        row_offsets, rows = sections["chain.offsets"], sections["chain.rows"]
+        self.chain_rows = [rows[row_offsets[i]:row_offsets[i + 1]] for i in range(len(self.chain_keys))]
+        self._chain_index = {}
+        for chain_id in sections["chain.live"]:
+            table, chain = self.chain_keys[chain_id]
+            self._chain_index[(self.strings[table], self.strings[chain])] = chain_id
+
+        # File-local prefix/port set id -> id in the shared tables, filled on use
+        self._prefix_ids: Dict[int, int] = {0: 0}
+        self._port_set_ids: Dict[int, int] = {0: 0}
+
+        for name in RULE_COLUMNS:
+            setattr(self, name, sections[name])
+
+    def prefix_id(self, local_id: int) -> int:
+        """PREFIXES id of a file-local prefix id."""
+        pid = self._prefix_ids.get(local_id)
+        if pid is None:
+            sections = self._sections
+            networks = sections["prefix.network"]
+            pid = PREFIXES.intern_network(sections["prefix.family"][local_id],
+                                          (networks[2 * local_id] << 64) | networks[2 * local_id + 1],
+                                          sections["prefix.length"][local_id])
+            self._prefix_ids[local_id] = pid
+        return pid
+
+    def port_set_id(self, local_id: int) -> int:
+        """PORT_SETS id of a file-local port set id."""
+        sid = self._port_set_ids.get(local_id)
+        if sid is None:
+            offsets, bounds = self._sections["ports.offsets"], self._sections["ports.bounds"]
+            flat = bounds[offsets[local_id]:offsets[local_id + 1]]
+            sid = PORT_SETS.intern_ranges(zip(flat[0::2], flat[1::2]))
+            self._port_set_ids[local_id] = sid
+        return sid
+
+    def _sparse_tables(self) -> dict:
+        if self._sparse_data is None:
+            self._sparse_data = pickle.loads(self._sections["sparse"])
+        return self._sparse_data
+
+    @property
+    def proto_overrides(self) -> dict:
+        return self._sparse_tables()["proto_overrides"]
+
+    @property
+    def matches(self) -> dict:
+        return self._sparse_tables()["matches"]
+
+    @property
+    def target_options(self) -> dict:
+        return self._sparse_tables()["target_options"]
+
+    @property
+    def negations(self) -> dict:
+        return self._sparse_tables()["negations"]
+
+    @property
+    def gotos(self) -> set:
+        return self._sparse_tables()["gotos"]
+
+    @property
+    def has_counters(self) -> bool:
+        return self._sparse_tables()["has_counters"]
+
+    def add_table(self, table: str):
+        raise TypeError("a mapped RuleSet is read-only")
+
+    add_chain = add_rule = add_table
+
+    def __reduce__(self):
+        """Pickle as a plain, in-memory RuleSet."""
+        return _ruleset_from_state, (RuleSet.from_tables(self.as_tables()).__getstate__(),)
+
+
+def _ruleset_from_state(state: dict) -> RuleSet:
+    ruleset = RuleSet.__new__(RuleSet)
+    ruleset.__setstate__(state)
+    return ruleset
+
+
+def read_sections(buffer) -> dict:
+    """Parse the header and directory of a ruleset file held in ``buffer``."""
+    view = memoryview(buffer)
+    if len(view) < _HEADER.size:
+        raise ValueError("not a ruleset file (too short)")
+    magic, version, byte_order, count = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("not a ruleset file (bad magic)")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"unsupported ruleset file version {version} (expected {FORMAT_VERSION})")
+    swap = byte_order != _BYTE_ORDERS[sys.byteorder]
+
+    sections = {}
+    for index in range(count):
+        name, typecode, offset, length = _ENTRY.unpack_from(view, _HEADER.size + index * _ENTRY.size)
+        name, typecode = name.rstrip(b"\0").decode(), typecode.decode()
+        itemsize = array(typecode).itemsize
+        data = view[offset:offset + length * itemsize]
+        if swap and itemsize > 1:
+            column = array(typecode, data.tobytes())
+            column.byteswap()
+            sections[name] = column
+        elif typecode == 'B':
+            sections[name] = data
+        else:
+            sections[name] = data.cast(typecode)
+    return sections
+
+
+def open_ruleset(filename: str) -> MappedRuleSet:
+    """Map a ruleset file read-only and return a MappedRuleSet over it."""
+    with open(filename, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return MappedRuleSet(read_sections(mapping), mapping)
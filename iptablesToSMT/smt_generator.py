@@ -1,63 +1,188 @@
 # iptablesToSMT/smt_generator.py
+from typing import Dict, Optional
 
-def generate_smtlib_from_tables(tables):
+from prefix_table import PREFIXES
+from port_set import PORT_SETS, MAX_PORT
+from match_modules import get_match_module
+from rule_ir import (ProtoTest, PrefixTest, PortTest, AddressRangeTest, StateTest, MAX_ADDRESS, VERDICTS,
+                     RETURN, CONTINUE, ACCEPTED, DROPPED, lower_rule, chain_rules)
+from rule_merge import merge_chains
+
+try:
+    import z3
+except ImportError:  # Only the z3 term builder needs it
+    z3 = None
+
+# Packet fields of the model and their widths, as declared by chain_encoding
+PACKET_FIELDS = {"src_ip": 32, "dst_ip": 32, "src_port": 16, "dst_port": 16, "proto": 8, "state": 8}
+
+
+class Z3TermBuilder:
+    """Builds rule conditions as z3 terms, creating each distinct predicate once.
+
+    Terms are hash-consed on the rule IR: each interned predicate of
+    rule_ir (a prefix, port set, protocol, state or match test) is one term,
+    a repeated rule condition is one conjunction and chains with the same
+    rules have one outcome term.
     """
-    Generates SMT-LIB expressions from parsed iptables tables.
+
+    def __init__(self):
+        if z3 is None:
+            raise RuntimeError("The z3 term builder needs z3 (pip install z3-solver)")
+        self.fields = {name: z3.BitVec(name, width) for name, width in PACKET_FIELDS.items()}
+        self._terms: Dict[object, object] = {}
+        self.hits = 0  # Lookups answered by an existing term
+
+    def __len__(self):
+        return len(self._terms)
+
+    def term(self, key):
+        return self._terms[key]
+
+    def predicate(self, predicate):
+        """Make sure the term of a rule_ir predicate exists and return its key."""
+        if predicate in self._terms:
+            self.hits += 1
+        else:
+            self._terms[predicate] = self._build(predicate)
+        return predicate
+
+    def _build(self, predicate):
+        kind = type(predicate)
+        if kind is ProtoTest:
+            tests = [self.fields["proto"] == number for number in sorted(predicate.protos)]
+            term = z3.Or(tests) if len(tests) > 1 else tests[0] if tests else z3.BoolVal(False)
+        elif kind is PrefixTest:
+            family, network, _ = PREFIXES.get(predicate.pid)
+            if family == 6:
+                term = z3.BoolVal(False)  # IPv6 never matches the IPv4 model
+            else:
+                term = self.fields[predicate.field + "_ip"] & PREFIXES.mask(predicate.pid) == network
+        elif kind is PortTest:
+            term = self._ranges(self.fields[predicate.field + "_port"], PORT_SETS.get(predicate.sid), MAX_PORT)
+        elif kind is AddressRangeTest:
+            term = self._ranges(self.fields[predicate.field + "_ip"], predicate.ranges, MAX_ADDRESS)
+        elif kind is StateTest:
+            term = self.fields["state"] & predicate.states != 0
+        else:
+            # Match modules: read from their SMT-LIB text, once per distinct match
+            text = get_match_module(predicate.name).to_smt(predicate.value)
+            return z3.parse_smt2_string(f"(assert {text})", decls=self.fields)[0] if text else None
+        return z3.Not(term) if predicate.negated else term
+
+    @staticmethod
+    def _ranges(field, ranges, max_value):
+        tests = []
+        for low, high in ranges:
+            if low == high:
+                tests.append(field == low)
+            elif low == 0:
+                tests.append(z3.ULE(field, high))
+            elif high == max_value:
+                tests.append(z3.UGE(field, low))
+            else:
+                tests.append(z3.And(z3.UGE(field, low), z3.ULE(field, high)))
+        return z3.Or(tests) if len(tests) > 1 else tests[0] if tests else z3.BoolVal(False)
+
+    def rule(self, rule) -> Optional[tuple]:
+        """The key of a rule's condition (None if it matches every packet)."""
+        return self.condition(lower_rule(rule))
+
+    def condition(self, ir) -> Optional[tuple]:
+        """The key of the condition of a rule_ir.RuleIR (None if it matches every packet)."""
+        keys = tuple(key for key in (self.predicate(predicate) for predicate in ir.predicates)
+                     if self._terms[key] is not None)
+        if not keys:
+            return None
+        if len(keys) == 1:
+            return keys[0]
+        key = ('and',) + keys
+        if key in self._terms:
+            self.hits += 1
+        else:
+            self._terms[key] = z3.And([self._terms[part] for part in keys])
+        return key
+
+    def chain(self, chain_ir, callees: Dict[str, tuple]) -> tuple:
+        """The key of a chain's outcome term, a 2-bit CONTINUE/ACCEPTED/DROPPED value.
+
+        ``callees`` maps the chains it jumps to (listed before it by
+        rule_ir.chain_rules) to their keys.
+        """
+        steps = []
+        for ir in chain_ir.rules:
+            condition = self.condition(ir)
+            if ir.action in VERDICTS:
+                steps.append((condition, ACCEPTED if VERDICTS[ir.action] else DROPPED, True))
+            elif ir.action == RETURN:
+                steps.append((condition, CONTINUE, True))
+            else:
+                steps.append((condition, callees[ir.action], ir.goto))
+        key = ('chain',) + tuple(steps)
+        if key in self._terms:
+            self.hits += 1
+            return key
+
+        outcome = z3.BitVecVal(CONTINUE, 2)
+        for condition, target, ends in reversed(steps):
+            result = z3.BitVecVal(target, 2) if type(target) is int else self._terms[target]
+            # A jump only ends the chain when the jumped-to chain decides
+            matched = None if ends else result != CONTINUE
+            if condition is not None:
+                matched = self._terms[condition] if matched is None else z3.And(self._terms[condition], matched)
+            outcome = result if matched is None else z3.If(matched, result, outcome)
+        self._terms[key] = outcome
+        return key
+
+
+def generate_z3_from_tables(tables, builder: Optional[Z3TermBuilder] = None, chain: str = "INPUT",
+                            merge: bool = False):
+    """Build, as one z3 Bool over the packet fields, whether the filter table accepts a packet.
+
+    Every chain reachable from ``chain`` (rule_ir.chain_rules) is one term
+    giving its outcome: ACCEPT and DROP/REJECT decide, RETURN and the end of
+    the chain fall through, a jump decides if the jumped-to chain does and
+    a goto ends with that chain's outcome. Each chain's term is built once
+    and shared by all the rules that jump to it. ``chain``'s policy applies
+    when it falls through. Pass a builder to share terms across firewalls
+    (e.g. the two sides of a consistency check). ``merge`` runs the
+    rule_merge pass on every chain first.
     """
-    smtlib_code = ""
-    smtlib_code += "(set-logic ALL_SUPPORTED)\n"  # Set logic at the beginning
+    if builder is None:
+        builder = Z3TermBuilder()
+    filter_table = tables.get('filter')
+    if filter_table is None or chain not in filter_table.chains:
+        return z3.BoolVal(True)  # No filter table: nothing is dropped
+
+    chains = chain_rules(filter_table, chain)
+    if merge:
+        chains = merge_chains(chains)[0]
+    outcomes: Dict[str, tuple] = {}
+    for chain_ir in chains:
+        outcomes[chain_ir.name] = builder.chain(chain_ir, outcomes)
+    outcome = builder.term(outcomes[chain])
+    if VERDICTS.get(filter_table.chains[chain].policy, False):
+        return outcome != DROPPED
+    return outcome == ACCEPTED
+
 
-    for table_name, table in tables.items():
-        smtlib_code += f";; Table: {table_name}\n"
-        for chain_name, chain in table.chains.items():
-            smtlib_code += f";; Chain: {chain_name} (policy: {chain.policy})\n"
-            for rule in chain.rules:
-                rule_str = str(rule).replace("\n", " ")  # avoid newlines in comment
-                smtlib_code += f";; Rule: {rule_str}\n"
-                # TODO: Generate actual SMT-LIB assertions for each rule here
+def z3_to_smtlib(formula) -> str:
+    """SMT-LIB text asserting ``formula``, with the declarations it needs."""
+    solver = z3.Solver()
+    solver.add(formula)
+    return solver.sexpr()
 
-    return smtlib_code
+
+def generate_smtlib_from_tables(tables) -> str:
+    """SMT-LIB text of generate_z3_from_tables: the optional text dump of the z3 model."""
+    return z3_to_smtlib(generate_z3_from_tables(tables))
 
 
 if __name__ == "__main__":
-    # Example usage (for testing purposes)
-    # You might want to parse example.rules and then call generate_smtlib_from_tables
-    # For now, just a placeholder:
-    print("smt_generator.py running (placeholder)")
-
-    class MockIPTablesTable:  # Mock class for testing
-        def __init__(self, name):
-            self.name = name
-            self.chains = {}
-
-    class MockIPTablesChain:
-        def __init__(self, name, policy="ACCEPT"):
-            self.name = name
-            self.policy = policy
-            self.rules = []
-
-    class MockIPTablesRule:
-        def __init__(self, table, chain, proto, dport, action):
-            self.table = table
-            self.chain = chain
-            self.proto = proto
-            self.dport = dport
-            self.action = action
-
-        def __str__(self):
-            return (
-                f"MockRule(table={self.table}, chain={self.chain}, proto={self.proto}, "
-                f"dport={self.dport}, action={self.action})"
-            )
-
-    mock_tables = {"filter": MockIPTablesTable("filter")}
-    mock_tables["filter"].chains["INPUT"] = MockIPTablesChain("INPUT", policy="DROP")
-    mock_tables["filter"].chains["INPUT"].rules.append(
-        MockIPTablesRule(table="filter", chain="INPUT", proto="tcp", dport="22", action="ACCEPT")
-    )
-    mock_tables["filter"].chains["INPUT"].rules.append(
-        MockIPTablesRule(table="filter", chain="INPUT", proto="tcp", dport="80", action="ACCEPT")
-    )
-
-    smtlib_output = generate_smtlib_from_tables(mock_tables)  # Example mock tables
-    print("\nSMT-LIB Output:\n", smtlib_output)
+    import sys
+    from iptables_parser import parse_iptables_save_file
+
+    if len(sys.argv) != 2:
+        print("Usage: python smt_generator.py <iptables-save file>")
+        sys.exit(1)
+    print(generate_smtlib_from_tables(parse_iptables_save_file(sys.argv[1])), end="")
@@ -0,0 +1,229 @@
+# iptablesToSMT/snapshot_diff.py
+"""Structural diff of two iptables-save snapshots.
+
+Usage: python snapshot_diff.py OLD NEW [--json]
+"""
+import argparse
+import bisect
+import json
+import sys
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+
+from prefix_table import PREFIXES, rule_prefix
+from port_set import PORT_SETS, rule_ports
+from ruleset import RuleSet, PROTO_NAMES, PROTO_NUMBERS
+
+# Long spellings of negatable options, mapped to the short form
+_FLAG_ALIASES = {
+    '--source-port': '--sport',
+    '--destination-port': '--dport',
+}
+
+
+def rule_key(rule) -> tuple:
+    """Normalized, hashable form of a rule; equal keys mean the same rule.
+
+    Spelling differences that do not change meaning are removed: protocol
+    case, numbers and 'all', address and port notation (prefixes and port
+    sets are compared by value), the order of -m matches and the spelling
+    and order of negated options. Target arguments ('--to-destination ...',
+    '--reject-with ...') are compared word for word.
+    """
+    proto = (rule.proto or "").lower()
+    if proto == "all":
+        proto = ""
+    elif proto.isdigit():
+        proto = PROTO_NAMES.get(int(proto), proto)
+    elif proto in PROTO_NUMBERS:
+        proto = PROTO_NAMES[PROTO_NUMBERS[proto]]
+    return (
+        proto,
+        PREFIXES.get(rule_prefix(rule, 'src')),
+        PREFIXES.get(rule_prefix(rule, 'dst')),
+        PORT_SETS.get(rule_ports(rule, 'src')),
+        PORT_SETS.get(rule_ports(rule, 'dst')),
+        rule.in_interface or "",
+        rule.out_interface or "",
+        tuple(sorted(rule.matches.items(), key=lambda item: item[0])),
+        rule.action or "",
+        getattr(rule, 'goto', False),
+        tuple(rule.target_options or ()),
+        tuple(sorted(_FLAG_ALIASES.get(flag, flag) for flag in getattr(rule, 'negated', ()))),
+    )
+
+
+class ChainDiff:
+    """Changes to one chain. Indexes are rule positions in the old/new chain."""
+
+    def __init__(self, table: str, chain: str):
+        self.table = table
+        self.chain = chain
+        self.old_policy: Optional[str] = None  # None if the chain did not exist
+        self.new_policy: Optional[str] = None
+        self.added: List[Tuple[int, object]] = []         # (new index, rule)
+        self.removed: List[Tuple[int, object]] = []       # (old index, rule)
+        self.moved: List[Tuple[int, int, object]] = []    # (old index, new index, rule)
+
+    @property
+    def policy_changed(self) -> bool:
+        return self.old_policy != self.new_policy
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.policy_changed or self.added or self.removed or self.moved)
+
+    def to_dict(self) -> dict:
+        return {
+            "table": self.table,
+            "chain": self.chain,
+            "old_policy": self.old_policy,
+            "new_policy": self.new_policy,
+            "added": [[index, str(rule)] for index, rule in self.added],
+            "removed": [[index, str(rule)] for index, rule in self.removed],
+            "moved": [[old, new, str(rule)] for old, new, rule in self.moved],
+        }
+
+
+class SnapshotDiff:
+    """Per-chain differences between two snapshots, keyed by (table, chain)."""
+
+    def __init__(self):
+        self.chains: Dict[Tuple[str, str], ChainDiff] = {}
+
+    def changed_chains(self) -> List[Tuple[str, str]]:
+        """(table, chain) pairs that need re-processing."""
+        return [key for key, chain_diff in self.chains.items() if chain_diff.changed]
+
+    def changed_tables(self) -> List[str]:
+        return list(dict.fromkeys(table for table, _ in self.changed_chains()))
+
+    def __bool__(self):
+        return bool(self.changed_chains())
+
+    def to_dict(self) -> dict:
+        return {
+            "changed_chains": [f"{table}/{chain}" for table, chain in self.changed_chains()],
+            "chains": [self.chains[key].to_dict() for key in self.changed_chains()],
+        }
+
+
+def _stable_positions(sequence: List[int]) -> set:
+    """Indexes into ``sequence`` forming its longest increasing subsequence."""
+    tails: List[int] = []        # sequence index ending the best run of each length
+    tail_values: List[int] = []
+    previous = [-1] * len(sequence)
+    for i, value in enumerate(sequence):
+        length = bisect.bisect_left(tail_values, value)
+        if length:
+            previous[i] = tails[length - 1]
+        if length == len(tails):
+            tails.append(i)
+            tail_values.append(value)
+        else:
+            tails[length] = i
+            tail_values[length] = value
+    stable = set()
+    i = tails[-1] if tails else -1
+    while i != -1:
+        stable.add(i)
+        i = previous[i]
+    return stable
+
+
+def diff_chain(table: str, chain: str, old_chain, new_chain) -> ChainDiff:
+    """Diff the rules of one chain (either side may be None)."""
+    result = ChainDiff(table, chain)
+    old_rules = list(old_chain.rules) if old_chain is not None else []
+    new_rules = list(new_chain.rules) if new_chain is not None else []
+    result.old_policy = old_chain.policy if old_chain is not None else None
+    result.new_policy = new_chain.policy if new_chain is not None else None
+
+    # Pair every new rule with the earliest unmatched old rule of the same key
+    unmatched = defaultdict(deque)
+    for index, rule in enumerate(old_rules):
+        unmatched[rule_key(rule)].append(index)
+    pairs = []  # (old index, new index), in new order
+    for index, rule in enumerate(new_rules):
+        candidates = unmatched.get(rule_key(rule))
+        if candidates:
+            pairs.append((candidates.popleft(), index))
+        else:
+            result.added.append((index, rule))
+    for candidates in unmatched.values():
+        for index in candidates:
+            result.removed.append((index, old_rules[index]))
+    result.removed.sort(key=lambda item: item[0])
+
+    # Pairs outside the longest run that kept its relative order have moved
+    stable = _stable_positions([old for old, _ in pairs])
+    for position, (old, new) in enumerate(pairs):
+        if position not in stable:
+            result.moved.append((old, new, new_rules[new]))
+    return result
+
+
+def diff_snapshots(old_tables, new_tables) -> SnapshotDiff:
+    """Diff two snapshots given as {name: IPTablesTable} dicts or RuleSets.
+
+    Runs in time linear in the number of rules, apart from an O(k log k)
+    step over the k matched rules of each chain to tell moved rules apart.
+    """
+    if isinstance(old_tables, RuleSet):
+        old_tables = old_tables.as_tables()
+    if isinstance(new_tables, RuleSet):
+        new_tables = new_tables.as_tables()
+
+    result = SnapshotDiff()
+    for table in list(dict.fromkeys(list(old_tables) + list(new_tables))):
+        old_chains = old_tables[table].chains if table in old_tables else {}
+        new_chains = new_tables[table].chains if table in new_tables else {}
+        for chain in list(dict.fromkeys(list(old_chains) + list(new_chains))):
+            result.chains[(table, chain)] = diff_chain(
+                table, chain, old_chains.get(chain), new_chains.get(chain)
+            )
+    return result
+
+
+def format_diff(snapshot_diff: SnapshotDiff) -> str:
+    """Human-readable report of a SnapshotDiff."""
+    lines = []
+    for key in snapshot_diff.changed_chains():
+        chain_diff = snapshot_diff.chains[key]
+        lines.append(f"{chain_diff.table}/{chain_diff.chain}: "
+                     f"+{len(chain_diff.added)} -{len(chain_diff.removed)} ~{len(chain_diff.moved)}")
+        if chain_diff.policy_changed:
+            lines.append(f"  policy {chain_diff.old_policy} -> {chain_diff.new_policy}")
+        for index, rule in chain_diff.removed:
+            lines.append(f"  - [{index}] {rule}")
+        for index, rule in chain_diff.added:
+            lines.append(f"  + [{index}] {rule}")
+        for old, new, rule in chain_diff.moved:
+            lines.append(f"  ~ [{old} -> {new}] {rule}")
+    if not lines:
+        lines.append("No changes")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff two iptables-save snapshots")
+    parser.add_argument("old", help="Older iptables-save file ('-' for stdin)")
+    parser.add_argument("new", help="Newer iptables-save file")
+    parser.add_argument("--json", action="store_true", help="Print the diff as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        snapshot_diff = diff_snapshots(RuleSet.from_file(args.old), RuleSet.from_file(args.new))
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    if args.json:
+        print(json.dumps(snapshot_diff.to_dict(), indent=2))
+    else:
+        print(format_diff(snapshot_diff))
+    return 1 if snapshot_diff else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save
+from chain_encoding import ENCODINGS, iter_encoded_chunks
+from code_generator import generate_c_code
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+-A INPUT -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j DROP
+-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p tcp -m multiport --dports 80,443 -j ACCEPT
+-A INPUT -s 192.168.0.0/16 -j REJECT
+-A INPUT -p udp -m udp --dport 53 -j ACCEPT
+COMMIT
+"""
+
+# blocklist RETURNs early, services is reached by a jump and a goto, ssh RETURNs into services
+CHAINS = """*filter
+:INPUT ACCEPT [0:0]
+:blocklist - [0:0]
+:services - [0:0]
+:ssh - [0:0]
+-A INPUT -j blocklist
+-A INPUT -p tcp -j services
+-A INPUT -p udp -g services
+-A INPUT -s 172.16.0.0/12 -j DROP
+-A blocklist -s 10.1.0.0/16 -j RETURN
+-A blocklist -s 10.0.0.0/8 -j DROP
+-A services -p tcp -m tcp --dport 22 -j ssh
+-A services -p tcp -m tcp --dport 80 -j ACCEPT
+-A services -p udp -m udp --dport 53 -j ACCEPT
+-A ssh -s 192.168.0.0/16 -j ACCEPT
+-A ssh -j RETURN
+-A ssh -j DROP
+COMMIT
+"""
+
+# (src_ip, proto, dst_port) -> accepted, for CHAINS
+CHAIN_PACKETS = {
+    (0x0A020001, 6, 80): False,     # Dropped in blocklist
+    (0x0A010001, 6, 80): True,      # RETURN from blocklist, then services
+    (0xC0A80001, 6, 22): True,      # ssh
+    (0x08080808, 6, 22): True,      # RETURN from ssh and services: the policy
+    (0xAC100001, 6, 22): False,     # ... unless INPUT drops it after the jump
+    (0xAC100001, 17, 53): True,     # Through the goto
+    (0xAC100001, 17, 54): True,     # The goto falls through: INPUT's policy, not its last rule
+}
+
+
+def tables_of(text):
+    return build_tables(iter_iptables_save(text.splitlines()))
+
+
+def deepest(text):
+    depth = result = 0
+    for char in text:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        result = max(result, depth)
+    return result
+
+
+def test_flat_and_tree_do_not_nest_with_chain_length():
+    """Test that only the nested encoding grows deeper as the chain grows."""
+    long_chain = SAVE.replace("COMMIT", "".join(f"-A INPUT -p tcp -m tcp --dport {port} -j ACCEPT\n"
+                                                for port in range(1000, 1200)) + "COMMIT")
+    tables = tables_of(long_chain)
+    depths = {encoding: deepest("".join(iter_encoded_chunks(tables, encoding))) for encoding in ENCODINGS}
+    assert depths["nested"] > 200
+    assert depths["flat"] < 10 and depths["tree"] < 10
+    with pytest.raises(ValueError):
+        list(iter_encoded_chunks(tables, "balanced"))
+
+
+def test_user_chains_are_defined_once():
+    """Test that each chain is one definition, whatever the number of rules jumping to it."""
+    script = "".join(iter_encoded_chunks(tables_of(CHAINS), "nested"))
+    assert [line for line in script.splitlines() if line.startswith("; chain")] == [
+        "; chain blocklist", "; chain ssh", "; chain services", "; chain INPUT"]
+    assert script.count("(define-fun chain_2 ") == 1
+    assert script.count("chain_2") == 4  # Defined, then tested and used by the jump and used by the goto
+    assert "(define-fun accepted () Bool (not (= chain_3 #b10)))" in script
+
+
+def test_user_chain_semantics():
+    """Test RETURN, jumps, gotos and the policy in the diagram and the z3 formula."""
+    z3 = pytest.importorskip("z3")
+    from decision_diagram import compile_tables
+    from smt_generator import generate_z3_from_tables
+    tables = tables_of(CHAINS)
+    diagram = compile_tables(tables)
+    formula = generate_z3_from_tables(tables)
+    for (src_ip, proto, dst_port), accepted in CHAIN_PACKETS.items():
+        assert diagram.evaluate(src_ip=src_ip, proto=proto, dst_port=dst_port) is accepted
+        packet = [(z3.BitVec("src_ip", 32), z3.BitVecVal(src_ip, 32)), (z3.BitVec("proto", 8), z3.BitVecVal(proto, 8)),
+                  (z3.BitVec("dst_port", 16), z3.BitVecVal(dst_port, 16))]
+        assert z3.is_true(z3.simplify(z3.substitute(formula, *packet))) is accepted
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("save", [SAVE, CHAINS], ids=["input", "chains"])
+def test_encodings_match_first_match_formula(encoding, save, tmp_path):
+    """Test each encoding against generate_z3_from_tables, for accepted and dropped packets."""
+    z3 = pytest.importorskip("z3")
+    from smt_generator import generate_z3_from_tables
+    tables = tables_of(save)
+    output = tmp_path / "rules.smt2"
+    generate_c_code(tables, str(output), encoding=encoding)
+    script = output.read_text()
+    reference = generate_z3_from_tables(tables)
+    for accepted_side, check in ((script, z3.Not(reference)),
+                                 (script.replace("(assert accepted)", "(assert (not accepted))"), reference)):
+        solver = z3.Solver()
+        solver.add(list(z3.parse_smt2_string(accepted_side)))
+        solver.add(check)
+        assert solver.check() == z3.unsat
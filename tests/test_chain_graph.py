@@ -0,0 +1,89 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save
+from chain_graph import ChainGraph, Edge, prune_unreachable
+from rule_ir import chain_rules
+from ruleset import RuleSet
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+:fail2ban-ssh - [0:0]
+:ufw-before-input - [0:0]
+:ufw-user-input - [0:0]
+:ufw-logging-deny - [0:0]
+:docker-dead - [0:0]
+-A INPUT -p tcp -m multiport --dports 22 -j fail2ban-ssh
+-A INPUT -j ufw-before-input
+-A INPUT -p tcp --dport 80 -j ACCEPT
+-A fail2ban-ssh -s 10.0.0.1/32 -j DROP
+-A fail2ban-ssh -j RETURN
+-A ufw-before-input -i lo -j ACCEPT
+-A ufw-before-input -m state --state INVALID -j ufw-logging-deny
+-A ufw-before-input -g ufw-user-input
+-A ufw-user-input -p tcp --dport 443 -j ACCEPT
+-A ufw-logging-deny -j LOG
+-A docker-dead -j ACCEPT
+COMMIT
+"""
+
+
+def filter_table():
+    return build_tables(iter_iptables_save(SAVE.splitlines()))["filter"]
+
+
+def test_edges_and_returns():
+    """Test that -j/-g edges and RETURN points are recorded per chain."""
+    graph = ChainGraph(filter_table())
+    assert graph.hooks == ["INPUT", "FORWARD", "OUTPUT"]
+    assert graph.edges["INPUT"] == [Edge(0, "fail2ban-ssh", False), Edge(1, "ufw-before-input", False)]
+    assert graph.edges["ufw-before-input"][1] == Edge(2, "ufw-user-input", True)
+    assert graph.returns["fail2ban-ssh"] == [1]
+    assert graph.callers["ufw-user-input"] == ["ufw-before-input"]
+
+
+def test_reachability_and_pruning():
+    """Test that chains no built-in chain reaches are pruned."""
+    table = filter_table()
+    graph = ChainGraph(table)
+    assert graph.unreachable() == ["docker-dead"]
+    assert graph.reachable(["FORWARD"]) == {"FORWARD"}
+    tables = RuleSet.from_tables({"filter": table}).as_tables()
+    assert ChainGraph(tables["filter"]).edges == graph.edges
+    pruned = prune_unreachable(tables)["filter"]
+    assert "docker-dead" not in pruned.chains
+    assert len(pruned.chains) == len(table.chains) - 1
+
+
+def test_cycles_and_topological_order():
+    """Test cycle detection and callee-first ordering."""
+    table = filter_table()
+    order = ChainGraph(table).topological_order()
+    assert order.index("ufw-user-input") < order.index("ufw-before-input") < order.index("INPUT")
+
+    rules = build_tables(iter_iptables_save([
+        "*filter", ":INPUT ACCEPT [0:0]", ":a - [0:0]", ":b - [0:0]",
+        "-A INPUT -j a", "-A a -j b", "-A b -p tcp -j a", "COMMIT",
+    ]))["filter"]
+    graph = ChainGraph(rules)
+    assert graph.cycles() == [["a", "b"]]
+    with pytest.raises(ValueError):
+        graph.topological_order()
+
+
+def test_code_generator_follows_jumps():
+    """Test that the emitted INPUT chains come from the graph, not a fixed chain list."""
+    chains = chain_rules(filter_table())
+    assert [(chain.name, [(ir.action, ir.goto) for ir in chain.rules]) for chain in chains] == [
+        ("fail2ban-ssh", [("DROP", False), ("RETURN", False)]),
+        ("ufw-user-input", [("ACCEPT", False)]),
+        ("ufw-before-input", [("ACCEPT", False), ("ufw-user-input", True)]),
+        ("INPUT", [("fail2ban-ssh", False), ("ufw-before-input", False), ("ACCEPT", False)]),
+    ]
\ No newline at end of file
@@ -0,0 +1,70 @@
+import gzip
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save
+from code_generator import generate_c_code, iter_smtlib_chunks
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+-A INPUT -i lo -j ACCEPT
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p udp -m multiport --dports 53,123 -j ACCEPT
+COMMIT
+"""
+
+
+def tables_of(text):
+    return build_tables(iter_iptables_save(text.splitlines()))
+
+
+def test_chunks_are_streamed():
+    """Test that chunks come out a rule at a time and the writer stores exactly them."""
+    chunks = iter_smtlib_chunks(tables_of(SAVE))
+    assert next(chunks) == "(set-logic QF_BV)\n"
+    rest = list(chunks)
+    assert [chunk for chunk in rest if chunk.startswith("(define-fun chain0_rule_")] == [
+        "(define-fun chain0_rule_0 () Bool true)\n",  # -i is not modelled
+        "(define-fun chain0_rule_1 () Bool (and (= proto #b00000110) "
+        "(= (apply_mask src_ip #xff000000) #x0a000000) (= dst_port #x0016)))\n",
+        "(define-fun chain0_rule_2 () Bool (and (= proto #b00010001) "
+        "(or (= dst_port #x0035) (= dst_port #x007b))))\n",
+    ]
+    assert rest[-1] == "(assert accepted)\n"
+
+
+def test_drop_rules_and_policy_are_modelled(tmp_path):
+    """Test that the default output drops what DROP rules and a DROP policy drop."""
+    z3 = pytest.importorskip("z3")
+    output = tmp_path / "rules.smt2"
+    generate_c_code(tables_of(SAVE.replace("-A INPUT -i lo -j ACCEPT\n", "-A INPUT -s 10.0.0.1 -j DROP\n")),
+                    str(output))
+    accepted = z3.And(list(z3.parse_smt2_string(output.read_text())))
+    src_ip, proto, dst_port = z3.BitVec("src_ip", 32), z3.BitVec("proto", 8), z3.BitVec("dst_port", 16)
+
+    def admits(*conditions):
+        solver = z3.Solver()
+        solver.add(accepted, *conditions)
+        return solver.check() == z3.sat
+
+    assert admits(src_ip == 0x0A000002, proto == 6, dst_port == 22)
+    assert not admits(src_ip == 0x0A000001)                         # DROP rule
+    assert not admits(src_ip == 0x0B000001, proto == 6, dst_port == 22)  # Policy
+    assert admits(proto == 17, dst_port == 123)
+
+
+def test_plain_and_gzip_output(tmp_path):
+    """Test that gzip output, chosen by suffix or flag, holds the same text."""
+    text = "".join(iter_smtlib_chunks(tables_of(SAVE)))
+    assert generate_c_code(tables_of(SAVE), str(tmp_path / "a.smt2")) == len(text)
+    assert (tmp_path / "a.smt2").read_text() == text
+    generate_c_code(tables_of(SAVE), str(tmp_path / "b.smt2.gz"))
+    generate_c_code(tables_of(SAVE), str(tmp_path / "c.smt2"), compress=True)
+    for name in ("b.smt2.gz", "c.smt2"):
+        with gzip.open(tmp_path / name, "rt") as f:
+            assert f.read() == text
@@ -0,0 +1,110 @@
+import sys
+import zipfile
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+import corpus_export
+from corpus_export import export_directory, load_export, _read_npy, NEGATION_BITS
+
+SAVE_A = """*filter
+:INPUT DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+[10:800] -A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j ACCEPT
+[0:0] -A INPUT ! -d 192.168.1.1/32 -p udp -m udp --sport 53 -m comment --comment "dns" -j DROP
+-A OUTPUT -o eth0 -p tcp -m tcp --dport 80:443 -g LOGDROP
+COMMIT
+"""
+
+SCRIPT_B = """iptables -P INPUT DROP
+iptables -A INPUT -i lo -j ACCEPT
+"""
+
+SAVE_V6 = """*filter
+:INPUT ACCEPT [0:0]
+-A INPUT -s 2001:db8::/32 -j REJECT
+COMMIT
+"""
+
+
+def write_corpus(directory):
+    (directory / "a.rules").write_text(SAVE_A)
+    (directory / "sub").mkdir()
+    (directory / "sub" / "b.sh").write_text(SCRIPT_B)
+    (directory / "v6.rules").write_text(SAVE_V6)
+    (directory / "broken").write_text("*filter\n-A INPUT -d <private_ip> -j DROP\nCOMMIT\n")
+
+
+def load_without_numpy(path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)  # Makes 'import numpy' raise ImportError
+    return load_export(str(path))
+
+
+def test_export_columns_round_trip(tmp_path, monkeypatch):
+    """Test that per-rule columns and vocabularies survive the .npz round trip."""
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_corpus(corpus)
+    summary = export_directory(str(corpus), str(tmp_path / "out.npz"))
+    assert (summary["files"], summary["rules"]) == (3, 5)
+    assert [failure.split(":")[0] for failure in summary["failures"]] == ["broken"]
+
+    data = load_without_numpy(tmp_path / "out.npz", monkeypatch)
+    files, chains, actions = data["files"], data["chains"], data["actions"]
+    assert len(data["proto"]) == 5
+    a_rows = [i for i, fid in enumerate(data["file"]) if files[fid] == "a.rules"]
+    assert len(a_rows) == 3
+    first, second, third = a_rows
+
+    assert [chains[data["chain"][row]] for row in a_rows] == ["INPUT", "INPUT", "OUTPUT"]
+    assert [data["position"][row] for row in a_rows] == [0, 1, 0]
+    assert [data["proto"][row] for row in a_rows] == [6, 17, 6]
+    assert (data["src_family"][first], data["src_length"][first], data["src_network_lo"][first]) == (4, 8, 10 << 24)
+    assert (data["dport_low"][first], data["dport_high"][first], data["dport_ranges"][first]) == (22, 22, 1)
+    assert data["negated"][second] == NEGATION_BITS["-d"]
+    assert (data["packets"][first], data["bytes"][first]) == (10, 800)
+    assert actions[data["action"][third]] == "LOGDROP" and data["goto"][third] == 1
+    assert data["interfaces"][data["out_interface"][third]] == "eth0"
+    assert (data["dport_low"][third], data["dport_high"][third], data["dport_ranges"][third]) == (80, 443, 1)
+
+    offsets, modules = data["match_offsets"], data["match_modules"]
+    assert len(offsets) == 6
+    assert [modules[mid] for mid in data["match_ids"][offsets[second]:offsets[second + 1]]] == ["udp", "comment"]
+
+    v6 = [i for i, family in enumerate(data["src_family"]) if family == 6]
+    assert len(v6) == 1 and data["src_length"][v6[0]] == 32
+    assert data["src_network_hi"][v6[0]] == 0x20010db800000000
+
+
+def test_shards_are_self_contained(tmp_path, monkeypatch):
+    """Test that sharding never splits a file and each shard has its own vocabularies."""
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    write_corpus(corpus)
+    summary = export_directory(str(corpus), str(tmp_path / "out.npz"), shard_rules=1)
+    assert [Path(name).name for name in summary["archives"]] == [f"out-0000{i}.npz" for i in range(3)]
+    shards = [load_without_numpy(name, monkeypatch) for name in summary["archives"]]
+    assert sorted(len(shard["file"]) for shard in shards) == [1, 1, 3]
+    for shard in shards:
+        assert len(shard["files"]) == 2  # "" plus the one file
+        assert all(fid == 1 for fid in shard["file"])
+
+
+def test_npy_members_follow_format(tmp_path):
+    """Test that members have a 64-byte aligned version 1.0 header readable by the built-in reader."""
+    data = corpus_export._npy('<u4', 2, b"\x01\x00\x00\x00\x02\x00\x00\x00")
+    header_length = int.from_bytes(data[8:10], "little")
+    assert data[:8] == b"\x93NUMPY\x01\x00"
+    assert (10 + header_length) % 64 == 0 and data[9 + header_length:10 + header_length] == b"\n"
+    assert list(_read_npy(data)) == [1, 2]
+    assert _read_npy(corpus_export._string_npy(["", "filter", "nat"])) == ["", "filter", "nat"]
+
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "a.rules").write_text(SAVE_A)
+    export_directory(str(corpus), str(tmp_path / "out.npz"), compress=True)
+    with zipfile.ZipFile(tmp_path / "out.npz") as archive:
+        assert "proto.npy" in archive.namelist()
+        assert archive.getinfo("proto.npy").compress_type == zipfile.ZIP_DEFLATED
@@ -0,0 +1,63 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+sys.path.append(str(PROJECT_ROOT))
+
+from iptables_parser import build_tables, iter_iptables_save
+from decision_diagram import compile_tables, main
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+-A INPUT -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j DROP
+-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p tcp -m multiport --dports 80,443 -j ACCEPT
+-A INPUT ! -s 192.168.0.0/16 -p udp -m udp --dport 53 -j ACCEPT
+COMMIT
+"""
+
+
+def tables_of(text):
+    return build_tables(iter_iptables_save(text.splitlines()))
+
+
+def test_first_match_semantics():
+    """Test that queries on the diagram follow first-match order and the policy."""
+    diagram = compile_tables(tables_of(SAVE))
+    assert not diagram.evaluate(src_ip=0x0A000001, proto=6, dst_port=22)        # DROP before the ACCEPT
+    assert diagram.evaluate(src_ip=0x0A000001, proto=6, dst_port=22, state=2)   # ESTABLISHED first
+    assert diagram.evaluate(src_ip=0xC0A80001, proto=6, dst_port=22)
+    assert diagram.evaluate(proto=6, dst_port=443) and not diagram.evaluate(proto=6, dst_port=444)
+    assert diagram.evaluate(src_ip=0x08080808, proto=17, dst_port=53)
+    assert not diagram.evaluate(src_ip=0xC0A80001, proto=17, dst_port=53)
+    assert not diagram.evaluate(proto=1)
+    # One protocol and one destination port, over every value of the other fields
+    ssh_only = compile_tables(tables_of("*filter\n:INPUT DROP [0:0]\n-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT\nCOMMIT\n"))
+    assert ssh_only.count() == 1 << (32 + 32 + 16 + 8)
+    assert ssh_only.count() + ssh_only.count(False) == 1 << (8 + 32 + 32 + 16 + 16 + 8)
+
+
+def test_redundant_rules_add_no_nodes():
+    """Test that shadowed and repeated rules leave the diagram unchanged."""
+    size = len(compile_tables(tables_of(SAVE)))
+    padded = SAVE.replace("COMMIT", "-A INPUT -p tcp -m tcp --dport 22 -j DROP\n" * 50
+                          + "-A INPUT -p tcp -m multiport --dports 80,443 -j ACCEPT\n" * 50 + "COMMIT")
+    assert len(compile_tables(tables_of(padded))) == size
+    accept_all = SAVE.replace("-A INPUT -m conntrack", "-A INPUT -j ACCEPT\n-A INPUT -m conntrack")
+    diagram = compile_tables(tables_of(accept_all))
+    assert len(diagram) == 0 and diagram.root is True
+
+
+def test_smtlib_is_equivalent_to_ite_encoding(tmp_path):
+    """Test the emitted formula against the z3 first-match formula."""
+    pytest.importorskip("z3")
+    from smt_generator import generate_z3_from_tables
+    from checkConsistency.main import check_consistency
+    rules, dump = tmp_path / "rules.v4", tmp_path / "rules.smt2"
+    rules.write_text(SAVE)
+    assert main([str(rules), "--output", str(dump)]) == 0
+    assert check_consistency(generate_z3_from_tables(tables_of(SAVE)), str(dump))[0]
@@ -0,0 +1,66 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save, parse_rule_line
+from ruleset import RuleSet
+from ruleset_file import write_ruleset, open_ruleset
+from hotness import top_rules, never_hit, cumulative_share, rules_for_share, policy_hits, hotness_report
+
+COUNTED_SAVE = """*filter
+:INPUT DROP [120:9600]
+:OUTPUT ACCEPT [55:4400]
+[700:56000] -A INPUT -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT
+[0:0] -A INPUT -p tcp -m tcp --dport 23 -j ACCEPT
+[200:12000] -A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+[100:90000] -A INPUT -i lo -j ACCEPT
+[0:0] -A OUTPUT -o eth1 -j DROP
+COMMIT
+"""
+
+
+@pytest.fixture
+def ruleset():
+    return RuleSet.from_events(iter_iptables_save(COUNTED_SAVE.splitlines()))
+
+
+def test_counters_are_parsed():
+    """Test rule and chain counters, including the iptables-restore '-c' form."""
+    tables = build_tables(iter_iptables_save(COUNTED_SAVE.splitlines()))
+    chain = tables["filter"].chains["INPUT"]
+    assert (chain.packets, chain.bytes) == (120, 9600)
+    assert [(rule.packets, rule.bytes) for rule in chain.rules][:3] == [(700, 56000), (0, 0), (200, 12000)]
+    rule = parse_rule_line("-A INPUT -c 5 320 -p udp -j DROP", "filter")
+    assert (rule.packets, rule.bytes, rule.proto, rule.action) == (5, 320, "udp", "DROP")
+
+
+def test_counters_survive_storage(ruleset, tmp_path):
+    """Test that counters are kept by RuleSet views and the binary format."""
+    assert ruleset.has_counters
+    assert [rule.packets for rule in ruleset] == [700, 0, 200, 100, 0]
+    path = str(tmp_path / "counted.ruleset")
+    write_ruleset(ruleset, path)
+    mapped = open_ruleset(path)
+    assert mapped.has_counters
+    assert [rule.bytes for rule in mapped] == [56000, 0, 12000, 90000, 0]
+    assert mapped.as_tables()["filter"].chains["OUTPUT"].packets == 55
+    assert not RuleSet.from_events(iter_iptables_save(["*filter", ":INPUT ACCEPT [0:0]", "-A INPUT -j DROP", "COMMIT"])).has_counters
+
+
+def test_queries(ruleset):
+    """Test top-N, cumulative share, never-hit and policy queries."""
+    assert [(hits.chain, hits.index, hits.packets) for hits in top_rules(ruleset, 2)] == [("INPUT", 0, 700), ("INPUT", 2, 200)]
+    assert top_rules(ruleset, 1, by="bytes")[0].rule.in_interface == "lo"
+    assert [(hits.chain, hits.index) for hits in never_hit(ruleset)] == [("INPUT", 1), ("OUTPUT", 0)]
+    shares = [round(share, 2) for _, share in cumulative_share(ruleset)]
+    assert shares == [0.7, 0.9, 1.0]
+    assert rules_for_share(ruleset, 0.9) == 2
+    assert policy_hits(ruleset)[0] == ("filter", "INPUT", "DROP", 120, 9600)
+    report = hotness_report(ruleset, 1)
+    assert report["total_packets"] == 1000 and report["never_hit"] == 2
+    with pytest.raises(ValueError):
+        top_rules(ruleset, by="hits")
@@ -0,0 +1,136 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from ingest import (RuleSequence, CommandReplay, detect_format, load_ruleset, load_tables, replay_commands,
+                    COMMAND_FORMAT, SAVE_FORMAT)
+
+SCRIPT = """#!/bin/sh
+IPT=/sbin/iptables
+$IPT -F
+$IPT -P INPUT DROP
+$IPT -N ssh-guard
+$IPT -A INPUT -i lo -j ACCEPT
+$IPT -A INPUT -p tcp --dport 22 -j ssh-guard
+sudo iptables --append INPUT -p tcp --dport 80 -j ACCEPT  # web
+iptables -I INPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
+iptables -I INPUT 3 -p udp --dport 53 -j ACCEPT
+iptables -A ssh-guard --source 10.0.0.0/8 -j ACCEPT; iptables -A ssh-guard -j DROP
+iptables -D INPUT -p TCP --destination-port 80 -j ACCEPT
+iptables -t nat -A POSTROUTING -o eth0 -j MASQUERADE > /dev/null 2>&1
+iptables -A missing -j DROP
+iptables -L -n
+"""
+
+
+def test_detect_format():
+    """Test that save files and command streams are told apart without losing lines."""
+    file_format, lines = detect_format(SCRIPT.splitlines())
+    assert file_format == COMMAND_FORMAT
+    assert list(lines) == SCRIPT.splitlines()
+    file_format, _ = detect_format(["# Generated by iptables-save", "*filter", ":INPUT ACCEPT [0:0]"])
+    assert file_format == SAVE_FORMAT
+    file_format, _ = detect_format(["root@host:~# echo 1 > /proc/sys/net/ipv4/ip_forward",
+                                    "root@host:~# iptables -t nat -A POSTROUTING -j MASQUERADE"])
+    assert file_format == COMMAND_FORMAT
+    # A test guard is a shell line, not a '[packets:bytes]' counter prefix
+    guarded = ["IPT=/sbin/iptables", "[ -x $IPT ] || exit 1", "$IPT -A INPUT -j DROP"]
+    file_format, _ = detect_format(guarded)
+    assert file_format == COMMAND_FORMAT
+    assert len(replay_commands(guarded).tables()["filter"].chains["INPUT"].rules) == 1
+    file_format, _ = detect_format(["[3:180] -A INPUT -j DROP"])
+    assert file_format == SAVE_FORMAT
+
+
+def test_replay_commands():
+    """Test -A/-I/-D/-P/-N replay, variables, sudo, long options and errors."""
+    replay = replay_commands(SCRIPT.splitlines())
+    tables = replay.tables()
+    input_chain = tables["filter"].chains["INPUT"]
+    assert input_chain.policy == "DROP"
+    assert [(rule.in_interface, rule.dst_port, rule.action) for rule in input_chain.rules] == [
+        ("", "0", "ACCEPT"), ("lo", "0", "ACCEPT"), ("", "53", "ACCEPT"), ("", "22", "ssh-guard"),
+    ]
+    guard = tables["filter"].chains["ssh-guard"]
+    assert guard.policy == "-"
+    assert [rule.action for rule in guard.rules] == ["ACCEPT", "DROP"]
+    assert tables["nat"].chains["POSTROUTING"].rules[0].action == "MASQUERADE"
+    assert replay.errors == ["line 14: -A missing: no such chain"]
+
+
+def test_flush_delete_and_replace():
+    """Test -F, -X, -R and numbered -D."""
+    tables = replay_commands([
+        "iptables -N a", "iptables -A a -j DROP", "iptables -A INPUT -j ACCEPT",
+        "iptables -A INPUT -p tcp -j DROP", "iptables -R INPUT 1 -p udp -j ACCEPT",
+        "iptables -D INPUT 2", "iptables -F a", "iptables -X a",
+    ]).tables()
+    assert list(tables["filter"].chains) == ["INPUT", "FORWARD", "OUTPUT"]
+    assert [(rule.proto, rule.action) for rule in tables["filter"].chains["INPUT"].rules] == [("udp", "ACCEPT")]
+
+
+def test_delete_by_spec_compares_target_arguments():
+    """Test that '-D spec' removes the rule with the same target arguments, and forgets its key."""
+    replay = CommandReplay()
+    for line in ["iptables -t nat -A PREROUTING -p tcp -j DNAT --to-destination 10.0.0.1",
+                 "iptables -t nat -A PREROUTING -p tcp -j DNAT --to-destination 10.0.0.2",
+                 "iptables -t nat -D PREROUTING -p tcp -j DNAT --to-destination 10.0.0.2",
+                 "iptables -t nat -R PREROUTING 1 -p udp -j ACCEPT"]:
+        replay.feed(line)
+    rules = replay.tables()["nat"].chains["PREROUTING"].rules
+    assert [(rule.proto, rule.target_options) for rule in rules] == [("udp", [])]
+    assert replay._keys == {}
+
+
+def test_rule_sequence_matches_list():
+    """Test RuleSequence against a plain list under random edits."""
+    RuleSequence.BLOCK_SIZE, block_size = 4, RuleSequence.BLOCK_SIZE
+    try:
+        rng = random.Random(7)
+        sequence, expected = RuleSequence(), []
+        for step in range(2000):
+            choice = rng.random()
+            if choice < 0.5 or not expected:
+                index = rng.randint(0, len(expected))
+                sequence.insert(index, step)
+                expected.insert(index, step)
+            elif choice < 0.8:
+                index = rng.randrange(len(expected))
+                assert sequence.pop(index) == expected.pop(index)
+            else:
+                index = rng.randrange(len(expected))
+                sequence[index] = expected[index] = -step
+            assert len(sequence) == len(expected)
+        assert list(sequence) == expected
+        assert [sequence[i] for i in range(len(expected))] == expected
+    finally:
+        RuleSequence.BLOCK_SIZE = block_size
+
+
+def test_insert_at_top_scales_linearly():
+    """Test that 4x as many inserts at position 0 take far less than the 16x a list needs."""
+    def insert_time(count):
+        sequence = RuleSequence()
+        start = time.perf_counter()
+        for rule in range(count):
+            sequence.insert(0, rule)
+        return time.perf_counter() - start
+
+    small, large = min(insert_time(20000) for _ in range(3)), min(insert_time(80000) for _ in range(3))
+    assert large < 10 * small
+
+
+def test_load_from_files(tmp_path):
+    """Test that the loaders accept both formats and agree with each other."""
+    script = tmp_path / "script.sh"
+    script.write_text(SCRIPT)
+    assert len(load_ruleset(str(script))) == 7
+    saved = tmp_path / "rules.v4"
+    saved.write_text("*filter\n:INPUT ACCEPT [0:0]\n[3:180] -A INPUT -j DROP\nCOMMIT\n")
+    assert load_tables(str(saved))["filter"].chains["INPUT"].rules[0].action == "DROP"
+    assert len(load_ruleset(str(saved))) == 1
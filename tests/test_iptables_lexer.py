@@ -0,0 +1,67 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_lexer import tokenize, split_words, Quoted, FLAG, VALUE, QUOTED, NEGATION
+from iptables_parser import parse_rule_line
+
+
+def test_tokenize_kinds():
+    """Test flag, value, quoted and negation tokens."""
+    tokens = tokenize('-A INPUT ! -s 10.0.0.0/8 -m comment --comment "allow ssh" -j ACCEPT')
+    assert tokens == [
+        (FLAG, "-A"), (VALUE, "INPUT"),
+        (NEGATION, "!"), (FLAG, "-s"), (VALUE, "10.0.0.0/8"),
+        (FLAG, "-m"), (VALUE, "comment"), (FLAG, "--comment"), (QUOTED, "allow ssh"),
+        (FLAG, "-j"), (VALUE, "ACCEPT"),
+    ]
+
+
+def test_quoted_edge_cases():
+    """Test empty, escaped, trailing-space and quoted-flag arguments."""
+    assert split_words('--comment ""') == ["--comment", ""]
+    assert split_words(r'--comment "say \"hi\""') == ["--comment", 'say "hi"']
+    assert split_words('--log-prefix "[UFW BLOCK] "') == ["--log-prefix", "[UFW BLOCK] "]
+    # A quoted '-x' or '!' is an argument, not a flag or negation
+    assert tokenize('--comment "-x" "!"')[1:] == [(QUOTED, "-x"), (QUOTED, "!")]
+    assert type(split_words('--comment "a b"')[1]) is Quoted
+
+
+def test_unbalanced_quote_is_a_value():
+    """Test that an unterminated quote does not swallow the line."""
+    assert tokenize('--comment "abc -j DROP') == [
+        (FLAG, "--comment"), (VALUE, '"abc'), (FLAG, "-j"), (VALUE, "DROP"),
+    ]
+
+
+@pytest.mark.parametrize("line", [
+    "-A INPUT ! -s 192.168.0.0/16 -j DROP",
+    "-A INPUT -s ! 192.168.0.0/16 -j DROP",
+])
+def test_parser_records_negation(line):
+    """Test both the modern and the older placement of '!'."""
+    rule = parse_rule_line(line, "filter")
+    assert rule.negated == ("-s",)
+    assert rule.src_ip == 0xC0A80000
+    assert rule.action == "DROP"
+
+
+def test_parser_quoted_target_options():
+    """Test that a quoted NAT target option arrives as one argument."""
+    rule = parse_rule_line('-A PREROUTING -p tcp --dport 80 -j DNAT "10.0.0.1:8080" --random', "nat")
+    assert rule.dst_port == "80"
+    assert rule.target_options == ["10.0.0.1:8080", "--random"]
+
+
+def test_parser_keeps_target_words():
+    """Test that every target keeps its option words, up to the next rule option."""
+    rule = parse_rule_line('-A PREROUTING -j DNAT --to-destination 10.0.0.1:8080', "nat")
+    assert rule.target_options == ["--to-destination", "10.0.0.1:8080"]
+    rule = parse_rule_line('-A INPUT -j LOG --log-prefix "[UFW BLOCK] " -m comment --comment x', "filter")
+    assert rule.target_options == ["--log-prefix", "[UFW BLOCK] "]
+    assert rule.matches["comment"].text == "x"
+    assert parse_rule_line('-A INPUT -j ACCEPT', "filter").target_options == []
@@ -0,0 +1,146 @@
+import io
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+import iptables_parser
+from iptables_parser import iter_iptables_save, build_tables, TABLE, CHAIN, RULE, COMMIT
+
+SAMPLE_SAVE = """# Generated by iptables-save v1.4.21
+*nat
+:PREROUTING ACCEPT [0:0]
+:POSTROUTING ACCEPT [0:0]
+-A POSTROUTING -o eth0 -j MASQUERADE
+COMMIT
+*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+-A INPUT -i lo -j ACCEPT
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p udp --dport 53 -j ACCEPT
+COMMIT
+"""
+
+
+@pytest.fixture
+def save_file(tmp_path):
+    """Write the sample iptables-save dump to disk."""
+    rules_file = tmp_path / "rules.v4"
+    rules_file.write_text(SAMPLE_SAVE)
+    return str(rules_file)
+
+
+def test_iter_yields_events_in_order():
+    """Test that events follow the order of the dump."""
+    kinds = [kind for kind, _ in iter_iptables_save(io.StringIO(SAMPLE_SAVE))]
+    assert kinds == [
+        TABLE, CHAIN, CHAIN, RULE, COMMIT,
+        TABLE, CHAIN, CHAIN, CHAIN, RULE, RULE, RULE, COMMIT,
+    ]
+
+
+def test_iter_does_not_attach_rules():
+    """Test that streamed chains stay empty so nothing accumulates."""
+    for kind, payload in iter_iptables_save(io.StringIO(SAMPLE_SAVE)):
+        if kind == CHAIN:
+            assert payload.rules == []
+        elif kind == TABLE:
+            assert payload.chains == {}
+
+
+def test_iter_is_lazy():
+    """Test that the first event is produced before the stream is exhausted."""
+    def lines():
+        yield "*filter\n"
+        raise AssertionError("stream read past the first event")
+
+    kind, table = next(iter_iptables_save(lines()))
+    assert kind == TABLE
+    assert table.name == "filter"
+
+
+def test_parse_file_matches_stream(save_file):
+    """Test that the file wrapper builds the same tables as the event stream."""
+    tables = iptables_parser.parse_iptables_save_file(save_file)
+    streamed = build_tables(iter_iptables_save(io.StringIO(SAMPLE_SAVE)))
+    assert {n: str(t) for n, t in tables.items()} == {n: str(t) for n, t in streamed.items()}
+
+    assert list(tables) == ["nat", "filter"]
+    input_chain = tables["filter"].chains["INPUT"]
+    assert input_chain.policy == "DROP"
+    assert len(input_chain.rules) == 3
+    assert input_chain.rules[1].src_ip == 0x0A000000
+    assert input_chain.rules[1].src_mask == 8
+    assert input_chain.rules[1].dst_port == "22"
+
+
+def test_parse_stdin(monkeypatch):
+    """Test that '-' reads the dump from stdin."""
+    monkeypatch.setattr(sys, "stdin", io.StringIO(SAMPLE_SAVE))
+    tables = iptables_parser.parse_iptables_save_file("-")
+    assert len(tables["nat"].chains["POSTROUTING"].rules) == 1
+
+
+def test_parse_missing_file(tmp_path):
+    """Test the error raised for a missing file."""
+    with pytest.raises(RuntimeError):
+        iptables_parser.parse_iptables_save_file(str(tmp_path / "missing"))
+
+
+def test_split_blocks_tracks_open_table(save_file):
+    """Test that blocks start at sections and carry the table open at their start."""
+    blocks = iptables_parser.split_blocks(save_file, block_bytes=40)
+    data = Path(save_file).read_bytes()
+    assert blocks[0][0] == 0 and blocks[-1][1] == len(data)
+    assert all(end == next_start for (_, end, _), (next_start, _, _) in zip(blocks, blocks[1:]))
+    for start, _, table in blocks:
+        line = data[start:data.index(b"\n", start)].decode()
+        if line.startswith("-A INPUT"):
+            assert table == "filter"
+        elif line.startswith("*"):
+            assert data[start - 1:start] in (b"", b"\n")
+
+
+def test_parallel_parse_matches_serial(save_file):
+    """Test that parsing blocks on a process pool builds the same tables."""
+    serial = iptables_parser.parse_iptables_save_file(save_file)
+    parallel = iptables_parser.parse_iptables_save_parallel(save_file, workers=2, block_bytes=40)
+    assert {n: str(t) for n, t in parallel.items()} == {n: str(t) for n, t in serial.items()}
+    assert list(parallel) == ["nat", "filter"]
+    rule = parallel["filter"].chains["INPUT"].rules[1]
+    assert iptables_parser.PREFIXES.get(rule.src_prefix) == (4, 0x0A000000, 8)
+    assert iptables_parser.PORT_SETS.to_text(rule.dst_ports) == "22"
+
+
+def test_lazy_parse_defers_decoding(save_file):
+    """Test that lazy rules keep their line until a field is used, then match the eager parse."""
+    eager = iptables_parser.parse_iptables_save_file(save_file)
+    lazy = iptables_parser.parse_iptables_save_file(save_file, lazy=True)
+    assert {name: list(table.chains) for name, table in lazy.items()} == \
+        {name: list(table.chains) for name, table in eager.items()}
+
+    rule = lazy["filter"].chains["INPUT"].rules[1]
+    assert isinstance(rule, iptables_parser.LazyRule)
+    assert (rule.table, rule.chain, rule.action, rule.goto) == ("filter", "INPUT", "ACCEPT", False)
+    assert not rule.decoded
+    assert rule.dst_port == "22" and rule.decoded
+    assert str(rule) == str(eager["filter"].chains["INPUT"].rules[1])
+
+
+def test_lazy_rule_target_and_counters():
+    """Test the target read without decoding, quoted look-alikes, and '[p:b]' counters."""
+    lines = ['*filter', ':INPUT ACCEPT [0:0]',
+             '[3:180] -A INPUT -m comment --comment "-j DROP" -g LOGGING',
+             '-A INPUT -s not-an-address -j ACCEPT', 'COMMIT']
+    rules = build_tables(iter_iptables_save(lines, lazy=True))["filter"].chains["INPUT"].rules
+    assert (rules[0].action, rules[0].goto, rules[0].packets, rules[0].bytes) == ("LOGGING", True, 3, 180)
+    assert not rules[0].decoded
+    assert rules[0].matches["comment"] is not None and rules[0].packets == 3
+    assert rules[1].action == "ACCEPT"
+    with pytest.raises(ValueError):
+        rules[1].src_prefix  # Malformed rules raise once they are decoded
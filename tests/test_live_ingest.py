@@ -0,0 +1,70 @@
+import sys
+import time
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from live_ingest import iter_live_iptables, read_live_ruleset, read_live_tables, resolve_command
+
+COUNTED_SAVE = """# Generated by iptables-save v1.8.7
+*filter
+:INPUT DROP [120:9600]
+:OUTPUT ACCEPT [55:4400]
+[100:8000] -A INPUT -i lo -j ACCEPT
+[20:1600] -A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+COMMIT
+"""
+
+
+def fake_save(tmp_path, body):
+    """Write a script that stands in for iptables-save."""
+    script = tmp_path / "fake_iptables_save.py"
+    script.write_text("import sys, time\n" + body)
+    return [sys.executable, str(script)]
+
+
+def test_counter_prefixed_dump(tmp_path):
+    """Test that '-c' output with [packets:bytes] prefixes is parsed."""
+    command = fake_save(tmp_path, f"sys.stdout.write({COUNTED_SAVE!r})\n")
+    ruleset = read_live_ruleset(command)
+    assert len(ruleset) == 2
+    assert ruleset[1].dst_port == "22"
+    tables = read_live_tables(command)
+    assert tables["filter"].chains["INPUT"].policy == "DROP"
+
+
+def test_events_arrive_while_running(tmp_path):
+    """Test that the first events are parsed before the command exits."""
+    command = fake_save(tmp_path, "print('*filter', flush=True)\ntime.sleep(1)\nprint('COMMIT')\n")
+    started = time.monotonic()
+    kind, table = next(iter_live_iptables(command))
+    assert table.name == "filter"
+    assert time.monotonic() - started < 1
+
+
+def test_timeout(tmp_path):
+    """Test that a hanging command is killed and reported."""
+    command = fake_save(tmp_path, "print('*filter', flush=True)\ntime.sleep(30)\n")
+    with pytest.raises(RuntimeError, match="timed out"):
+        read_live_ruleset(command, timeout=0.5)
+
+
+def test_failing_command(tmp_path):
+    """Test that a non-zero exit status is reported with its stderr."""
+    command = fake_save(tmp_path, "sys.stderr.write('permission denied')\nsys.exit(4)\n")
+    with pytest.raises(RuntimeError, match="permission denied"):
+        read_live_ruleset(command)
+    with pytest.raises(RuntimeError):
+        read_live_ruleset([str(tmp_path / "missing-command")])
+
+
+def test_command_resolution(monkeypatch):
+    """Test the default, environment and string forms of the command."""
+    monkeypatch.delenv("IPTABLES_SAVE_COMMAND", raising=False)
+    assert resolve_command() == ["iptables-save", "-c"]
+    monkeypatch.setenv("IPTABLES_SAVE_COMMAND", "ip6tables-save -t filter")
+    assert resolve_command() == ["ip6tables-save", "-t", "filter"]
+    assert resolve_command("cat 'my rules'") == ["cat", "my rules"]
@@ -0,0 +1,85 @@
+import sys
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import parse_rule_line
+from match_modules import (
+    get_match_module, register_match, registered_matches,
+    MatchModule, ConntrackMatch, MultiportMatch, TcpMatch, GenericMatch, CT_STATES,
+)
+
+
+def matches(line):
+    return parse_rule_line(line, "filter").matches
+
+
+def test_registry_covers_common_modules():
+    """Test that the usual match modules have dedicated handlers."""
+    for name in ("state", "conntrack", "multiport", "limit", "recent", "addrtype",
+                 "set", "hashlimit", "mark", "tcp", "udp", "icmp", "comment"):
+        assert name in registered_matches()
+    assert get_match_module("state") is get_match_module("state")
+
+
+def test_state_and_conntrack_parse_to_bitmask():
+    """Test that state lists become a bitmask, including negation."""
+    parsed = matches("-A INPUT -m state --state RELATED,ESTABLISHED -m conntrack ! --ctstate INVALID -j ACCEPT")
+    assert parsed["state"] == ConntrackMatch(CT_STATES["RELATED"] | CT_STATES["ESTABLISHED"], False)
+    assert parsed["conntrack"] == ConntrackMatch(CT_STATES["INVALID"], True)
+    assert matches("-A INPUT -m state --state ! NEW -j ACCEPT")["state"].negated
+
+
+def test_identical_matches_share_one_value():
+    """Test that equal match values are interned across rules."""
+    first = matches("-A INPUT -m state --state RELATED,ESTABLISHED -j ACCEPT")["state"]
+    second = matches("-A FORWARD -m state --state RELATED,ESTABLISHED -j ACCEPT")["state"]
+    assert first is second
+
+
+def test_module_options_take_their_argument_count():
+    """Test that multi-argument and switch options are consumed correctly."""
+    parsed = matches("-A INPUT -p tcp -m tcp --tcp-flags FIN,SYN,RST,ACK SYN --dport 22 "
+                     "-m multiport --dports 80,443,8000:8080 -j DROP")
+    assert parsed["tcp"] == TcpMatch(0x17, 0x02, False)
+    assert parsed["multiport"] == MultiportMatch("dst", ((80, 80), (443, 443), (8000, 8080)), False)
+    assert parse_rule_line("-A INPUT -p tcp -m tcp --tcp-flags FIN,SYN,RST,ACK SYN --dport 22 -j DROP",
+                           "filter").dst_port == "22"
+
+
+def test_unknown_module_is_kept_generically():
+    """Test that unknown modules keep their options verbatim."""
+    parsed = matches("-A INPUT -m owner --uid-owner 1000 -j ACCEPT")
+    assert parsed["owner"] == GenericMatch("owner", ((False, "uid-owner", ("1000",)),))
+
+
+def test_smt_and_ebpf_lowering():
+    """Test the SMT and eBPF conditions produced for lowerable matches."""
+    rule = parse_rule_line("-A INPUT -p tcp -m state --state NEW -m multiport --dports 22,80 "
+                           "-m comment --comment \"web\" -j ACCEPT", "filter")
+    modules = [(get_match_module(name), value) for name, value in rule.matches.items()]
+    # A comment has no condition
+    assert [module.to_smt(value) for module, value in modules] == [
+        "(not (= (bvand state #x01) #x00))",
+        "(or (= dst_port #x0016) (= dst_port #x0050))",
+        None,
+    ]
+    assert [module.to_ebpf(value) for module, value in modules] == [
+        "(ct_state & 0x01) != 0",
+        "(bpf_ntohs(tcph->dest) == 22 || bpf_ntohs(tcph->dest) == 80)",
+        None,
+    ]
+
+
+def test_register_new_module():
+    """Test that a new module is dispatched without touching the parser."""
+    @register_match("testlen")
+    class LengthModule(MatchModule):
+        options = {"length": 1}
+
+        def parse(self, raw):
+            return int(raw["length"][1][0])
+
+    assert matches("-A INPUT -m testlen --length 64 -j DROP") == {"testlen": 64}
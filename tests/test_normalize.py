@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save
+from normalize import normalize_tables, normalize_save_text
+from ruleset import RuleSet
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+:ufw-logging-deny - [0:0]
+:ufw-user-input - [0:0]
+:unused - [0:0]
+-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p TCP -m tcp --destination-port 22 -j ACCEPT
+-A INPUT -p tcp -m limit --limit 3/min -j ACCEPT
+-A INPUT -p tcp -m limit --limit 3/min -j ACCEPT
+-A INPUT -j LOG --log-prefix "dropped "
+-A INPUT -s 10.0.0.0/8
+-A INPUT -m state --state INVALID -j ufw-logging-deny
+-A INPUT -j ufw-user-input
+-A INPUT -p udp -j DROP
+-A ufw-logging-deny -m limit --limit 3/min -j LOG
+-A ufw-user-input -p tcp -m tcp --dport 80 -j ACCEPT
+-A ufw-user-input -j RETURN
+-A unused -j ACCEPT
+COMMIT
+"""
+
+
+def tables():
+    return build_tables(iter_iptables_save(SAVE.splitlines()))
+
+
+def test_removed_rules():
+    """Test each kind of removed rule and what is kept."""
+    normalized, report = normalize_tables(tables())
+    kept = normalized["filter"].chains["INPUT"].rules
+    assert [rule.action for rule in kept] == ["ACCEPT", "ACCEPT", "ACCEPT", "ufw-user-input"]
+    assert [rule.action for rule in normalized["filter"].chains["ufw-user-input"].rules] == ["ACCEPT"]
+    assert normalized["filter"].chains["ufw-logging-deny"].rules == []
+    assert report.total == 13
+    assert dict(report.removed) == {
+        "duplicate": 1, "logging": 2, "no_target": 1, "empty_jump": 1,
+        "policy_noop": 2, "unreachable": 1,
+    }
+    assert report.kept == 5
+
+
+def test_stateful_rules_are_not_merged():
+    """Test that repeated rules with limit matches both survive."""
+    normalized, _ = normalize_tables(tables())
+    limited = [rule for rule in normalized["filter"].chains["INPUT"].rules if "limit" in rule.matches]
+    assert len(limited) == 2
+
+
+def test_ruleset_input_matches_parsed_tables():
+    """Test that RuleSet views normalize the same way as parsed rules."""
+    _, report = normalize_tables(tables())
+    _, ruleset_report = normalize_tables(RuleSet.from_tables(tables()).as_tables())
+    assert ruleset_report.to_dict() == report.to_dict()
+
+
+def test_save_text_keeps_original_spelling():
+    """Test that text normalization only drops removed rule lines."""
+    text, report = normalize_save_text(SAVE)
+    lines = text.splitlines()
+    assert "-A INPUT -p TCP -m tcp --destination-port 22 -j ACCEPT" not in lines
+    assert "-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT" in lines
+    assert ":unused - [0:0]" in lines and "-A unused -j ACCEPT" not in lines
+    assert len(lines) == len(SAVE.splitlines()) - 8
+    assert "61.5% removed" in str(report)
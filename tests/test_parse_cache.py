@@ -0,0 +1,112 @@
+import os
+import pickle
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from parse_cache import ParseCache, content_key
+from ruleset import RuleSet
+from prefix_table import PREFIXES
+from port_set import PORT_SETS
+
+SAMPLE_SAVE = """*filter
+:INPUT DROP [0:0]
+-A INPUT -s 10.0.0.0/8 -p tcp --dport 1000:2000 -j ACCEPT
+-A INPUT -d 2001:db8::/32 -p udp --sport 53 -j ACCEPT
+COMMIT
+"""
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    """Write the sample dump to disk."""
+    path = tmp_path / "rules.v4"
+    path.write_text(SAMPLE_SAVE)
+    return str(path)
+
+
+def flatten(ruleset):
+    return [str(rule) for rule in ruleset]
+
+
+def test_miss_then_hit(rules_file, tmp_path):
+    """Test that the second load of the same content is served from the cache."""
+    cache = ParseCache(str(tmp_path / "cache"))
+    first = cache.load(rules_file)
+    second = cache.load(rules_file)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert flatten(second) == flatten(first)
+    assert cache.stats()["entries"] == 1
+
+
+def test_key_follows_content_and_version(rules_file, tmp_path):
+    """Test that the key depends on content and parser version, not the path."""
+    copy = tmp_path / "copy.v4"
+    copy.write_text(SAMPLE_SAVE)
+    assert content_key(str(copy)) == content_key(rules_file)
+    assert content_key(rules_file, version="0") != content_key(rules_file)
+    copy.write_text(SAMPLE_SAVE.replace("DROP", "ACCEPT"))
+    assert content_key(str(copy)) != content_key(rules_file)
+
+
+def test_reload_reinterns_ids(rules_file):
+    """Test that prefix and port ids are valid after a pickle round trip."""
+    ruleset = RuleSet.from_file(rules_file)
+    state = pickle.dumps(ruleset)
+    restored = pickle.loads(state)
+    assert PREFIXES.to_text(restored.src_prefixes[0]) == "10.0.0.0/8"
+    assert PREFIXES.to_text(restored.dst_prefixes[1]) == "2001:db8::/32"
+    assert PORT_SETS.get(restored.dport_sets[0]) == ((1000, 2000),)
+    assert flatten(restored) == flatten(ruleset)
+
+
+def test_lru_eviction(tmp_path):
+    """Test that the least recently used entry is evicted when over budget."""
+    cache = ParseCache(str(tmp_path / "cache"))
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"rules{i}"
+        path.write_text(SAMPLE_SAVE + f"# {i}\n")
+        paths.append(str(path))
+        cache.load(paths[-1])
+        entry = os.path.join(cache.directory, content_key(paths[-1]) + ".ruleset")
+        os.utime(entry, (i, i))
+    entry_size = cache.stats()["bytes"] // 3
+
+    cache.load(paths[0])  # Touch the oldest entry
+    cache.max_bytes = entry_size * 2
+    cache.evict()
+    cache.hits = cache.misses = 0
+    cache.load(paths[0])
+    cache.load(paths[1])
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("payload", [
+    b"not a pickle",
+    pickle.dumps(RuleSet())[:20],
+    # A class whose module no longer exists
+    pickle.dumps(RuleSet()).replace(b"ruleset", b"rulezet"),
+    # A constructor call the current class cannot take
+    b"\x80\x04cprefix_table\nPrefixTable\n(K\x01K\x02K\x03tR.",
+])
+def test_bad_entry_is_a_miss(rules_file, tmp_path, payload):
+    """Test that a corrupt or incompatible entry is removed and re-parsed."""
+    cache = ParseCache(str(tmp_path / "cache"))
+    entry = os.path.join(cache.directory, content_key(rules_file) + ".ruleset")
+    with open(entry, 'wb') as f:
+        f.write(payload)
+    assert flatten(cache.load(rules_file)) == flatten(RuleSet.from_file(rules_file))
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.load(rules_file)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_missing_file(tmp_path):
+    """Test the error raised for a missing file."""
+    with pytest.raises(RuntimeError):
+        ParseCache(str(tmp_path / "cache")).load(str(tmp_path / "missing"))
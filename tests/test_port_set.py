@@ -0,0 +1,82 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import parse_rule_line
+from port_set import (
+    PortSetTable, ANY_PORTS, ALL_PORTS, parse_ports, merge_ranges,
+    smt_port_condition, c_port_condition,
+)
+from rule_ir import PortTest, lower_rule, smt_predicate
+
+
+def rule_port_condition(rule, side):
+    """SMT-LIB test of a rule's port predicate on one side (None for any port)."""
+    tests = [smt_predicate(predicate) for predicate in lower_rule(rule).predicates
+             if type(predicate) is PortTest and predicate.field == side]
+    return tests[0] if tests else None
+
+
+def test_parse_and_merge():
+    """Test that port lists are sorted and overlapping/adjacent ranges merged."""
+    assert parse_ports("22") == ((22, 22),)
+    assert parse_ports("1000:2000") == ((1000, 2000),)
+    assert parse_ports(":1023") == ((0, 1023),)
+    assert parse_ports("8080,80,81,82,1000:2000,1500:2500") == ((80, 82), (1000, 2500), (8080, 8080))
+    assert parse_ports("0:65535") == ((0, 65535),)
+    assert merge_ranges([(5, 1)]) == ((1, 5),)
+    with pytest.raises(ValueError):
+        parse_ports("nosuchservice")
+    with pytest.raises(ValueError):
+        parse_ports("65536")
+
+
+def test_table_interns_equivalent_spellings():
+    """Test that equal port sets share one id whatever their spelling."""
+    table = PortSetTable()
+    assert table.intern("0:65535") == table.intern(":") == ALL_PORTS != ANY_PORTS
+    assert table.to_text(table.intern("0")) == "0:0"
+    first = table.intern("80,81,82")
+    assert table.intern("80:82") == first
+    assert table.to_text(first) == "80:82"
+    assert table.bounds(first) == (80, 82)
+    assert len(table) == 4
+
+
+def test_parser_keeps_whole_range():
+    """Test that '--dport 1000:2000' is no longer truncated to its first port."""
+    rule = parse_rule_line("-A INPUT -p tcp --dport 1000:2000 --sport ssh -j ACCEPT", "filter")
+    assert rule.dst_port == "1000:2000"
+    assert rule.src_port == "22"
+    assert rule_port_condition(rule, 'dst') == "(and (bvuge dst_port #x03e8) (bvule dst_port #x07d0))"
+
+
+def test_negated_full_range_matches_nothing():
+    """Test that '! --dport 0:65535' keeps its negation instead of becoming 'any port'."""
+    rule = parse_rule_line("-A INPUT -p tcp --dport 0:65535 -j ACCEPT", "filter")
+    assert rule_port_condition(rule, 'dst') == "true"
+    rule = parse_rule_line("-A INPUT -p tcp ! --dport 0:65535 -j ACCEPT", "filter")
+    assert rule_port_condition(rule, 'dst') == "(not true)"
+    rule = parse_rule_line("-A INPUT -p tcp --dport 0 -j ACCEPT", "filter")
+    assert rule.dst_port == "0:0"
+    assert rule_port_condition(rule, 'dst') is not None
+
+
+def test_lowering_uses_few_range_tests():
+    """Test that a long multiport list lowers to one test per merged range."""
+    ports = ",".join(str(port) for port in range(8000, 8040)) + ",22"
+    rule = parse_rule_line(f"-A INPUT -p tcp -m multiport --dports {ports} -j ACCEPT", "filter")
+    assert rule.matches["multiport"].ports == ((22, 22), (8000, 8039))
+    assert smt_port_condition("dst_port", rule.matches["multiport"].ports) == \
+        "(or (= dst_port #x0016) (and (bvuge dst_port #x1f40) (bvule dst_port #x1f67)))"
+    assert c_port_condition("port", ((0, 1023),)) == "port <= 1023"
+
+
+def test_negated_port_condition():
+    """Test that '! --dport' negates the range test."""
+    rule = parse_rule_line("-A INPUT -p tcp ! --dport 22 -j DROP", "filter")
+    assert rule_port_condition(rule, 'dst') == "(not (= dst_port #x0016))"
@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_rule_classes import IPTablesRule
+from prefix_table import PrefixTable, ANY_PREFIX, parse_prefix, rule_prefix
+from rule_ir import PrefixTest, lower_rule, smt_predicate
+
+
+def test_parse_prefix_forms():
+    """Test CIDR, dotted netmask, bare address and IPv6 spellings."""
+    assert parse_prefix("10.1.2.0/24") == (4, 0x0A010200, 24)
+    assert parse_prefix("10.1.2.3/255.255.0.0") == (4, 0x0A010000, 16)
+    assert parse_prefix("192.168.1.1") == (4, 0xC0A80101, 32)
+    assert parse_prefix("2001:db8::/32") == (6, 0x20010DB8 << 96, 32)
+
+
+def test_intern_parses_each_prefix_once():
+    """Test that equal prefixes share one id regardless of spelling."""
+    prefixes = PrefixTable()
+    first = prefixes.intern("10.0.0.0/8")
+    assert prefixes.intern("10.0.0.0/8") == first
+    assert prefixes.intern("10.9.9.9/255.0.0.0") == first
+    assert prefixes.intern("10.0.0.0/16") != first
+    assert len(prefixes) == 3  # any + two prefixes
+
+
+def test_ipv6_masks():
+    """Test that 128-bit prefixes keep their width."""
+    prefixes = PrefixTable()
+    pid = prefixes.intern("fe80::1/64")
+    assert prefixes.width(pid) == 128
+    assert prefixes.mask(pid) == ((1 << 64) - 1) << 64
+    assert prefixes.to_text(pid) == "fe80::/64"
+
+
+def test_rule_prefix_fallbacks():
+    """Test prefix lookup for rules without an interned id."""
+    prefixes = PrefixTable()
+
+    class StringRule:
+        src_ip = "172.16.0.0"
+        src_mask = "12"
+        dst_ip = "any"
+        dst_mask = None
+
+    assert prefixes.get(rule_prefix(StringRule(), "src", prefixes)) == (4, 0xAC100000, 12)
+    assert rule_prefix(StringRule(), "dst", prefixes) == ANY_PREFIX
+    assert rule_prefix(IPTablesRule(), "src", prefixes) == ANY_PREFIX
+
+    class IntRule:
+        src_ip, src_mask = 0x0A000001, 0    # A /0 matches every address
+        dst_ip, dst_mask = 0x0A000001, None  # No mask: a single host
+
+    assert prefixes.get(rule_prefix(IntRule(), "src", prefixes)) == (4, 0, 0)
+    assert prefixes.get(rule_prefix(IntRule(), "dst", prefixes)) == (4, 0x0A000001, 32)
+
+
+def test_prefix_condition():
+    """Test the SMT-LIB address condition built from the shared table."""
+    assert not any(isinstance(predicate, PrefixTest) for predicate in lower_rule(IPTablesRule()).predicates)
+
+    from prefix_table import PREFIXES
+    pid = PREFIXES.intern("192.168.0.0/16")
+    assert smt_predicate(PrefixTest("dst", pid)) == "(= (apply_mask dst_ip #xffff0000) #xc0a80000)"
+    assert smt_predicate(PrefixTest("dst", PREFIXES.intern("::1/128"))) == "false"
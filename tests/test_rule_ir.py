@@ -0,0 +1,126 @@
+import shutil
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save
+from rule_ir import (ProtoTest, PrefixTest, PortTest, StateTest, EBPF_FIELDS, lower_rule,
+                     chain_rules, smt_condition, c_condition)
+from c_generator import generate_klee_harness, iter_klee_chunks, iter_ebpf_chunks
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+-A INPUT -m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT
+-A INPUT -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j DROP
+-A INPUT ! -s 192.168.0.0/16 -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p udp -m udp --dport 53 -j ACCEPT
+-A INPUT -p gre -j ACCEPT
+COMMIT
+"""
+
+CHAINS = """*filter
+:INPUT ACCEPT [0:0]
+:LOGDROP - [0:0]
+:services - [0:0]
+:unused - [0:0]
+:ufw-logging-deny - [0:0]
+-A INPUT -s 10.0.0.0/8 -j LOGDROP
+-A INPUT -j ufw-logging-deny
+-A INPUT -p tcp -j services
+-A INPUT -p udp -g services
+-A INPUT -s 172.16.0.0/12 -j DROP
+-A LOGDROP -j LOG --log-prefix "drop "
+-A LOGDROP -j NFLOG --nflog-group 1
+-A LOGDROP -j DROP
+-A services -p tcp -m tcp --dport 22 -j RETURN
+-A services -m multiport -p tcp --dports 80,443 -j ACCEPT
+-A services -p udp -m udp --dport 53 -j ACCEPT
+-A unused -j ACCEPT
+COMMIT
+"""
+
+
+def rules_of(text):
+    return build_tables(iter_iptables_save(text.splitlines()))['filter'].chains['INPUT'].rules
+
+
+def test_lowering_interns_predicates():
+    """Test that rules are lowered once and equal predicates are one object."""
+    rules = rules_of(SAVE)
+    drop, accept = lower_rule(rules[1]), lower_rule(rules[2])
+    assert lower_rule(rules[1]) is drop
+    assert drop.action == "DROP" and accept.action == "ACCEPT"
+    assert drop.predicates[0] is accept.predicates[0] == ProtoTest(frozenset([6]))
+    assert drop.predicates[2] is accept.predicates[2]
+    assert isinstance(accept.predicates[1], PrefixTest) and accept.predicates[1].negated
+    assert lower_rule(rules[4]).predicates == (ProtoTest(frozenset([47])),)
+    assert isinstance(lower_rule(rules[0]).predicates[0], StateTest)
+    # Predicates of different kinds never compare equal, even with the same fields
+    assert PrefixTest('dst', 1) != PortTest('dst', 1)
+    assert len({PrefixTest('dst', 1), PortTest('dst', 1)}) == 2
+
+
+def test_emitters_render_the_same_ir():
+    """Test the SMT-LIB and C renderings of one rule."""
+    ir = lower_rule(rules_of(SAVE)[2])
+    assert smt_condition(ir) == ("(and (= proto #b00000110) (not (= (apply_mask src_ip #xffff0000) #xc0a80000)) "
+                                 "(= dst_port #x0016))")
+    assert c_condition(ir) == "proto == 6 && !((src_ip & 0xffff0000) == 0xc0a80000) && dst_port == 22"
+    assert c_condition(ir, EBPF_FIELDS).startswith("iph->protocol == 6 && !((bpf_ntohl(iph->saddr)")
+    assert "(ct_state & 0x06) != 0" in "".join(iter_ebpf_chunks(build_tables(iter_iptables_save(SAVE.splitlines()))))
+
+
+def test_chain_rules_lists_callees_first():
+    """Test the chains reachable from INPUT, their kept rules and loop detection."""
+    chains = chain_rules(build_tables(iter_iptables_save(CHAINS.splitlines()))['filter'])
+    assert [chain.name for chain in chains] == ["LOGDROP", "services", "INPUT"]
+    assert [ir.action for ir in chains[0].rules] == ["DROP"]  # LOG and NFLOG only have side effects
+    assert [(ir.action, ir.goto) for ir in chains[2].rules] == [
+        ("LOGDROP", False), ("services", False), ("services", True), ("DROP", False)]
+    loop = CHAINS.replace("-A unused -j ACCEPT", "-A services -j LOGDROP\n-A LOGDROP -j services")
+    with pytest.raises(ValueError):
+        chain_rules(build_tables(iter_iptables_save(loop.splitlines()))['filter'])
+
+
+def build_driver(tmp_path, text):
+    generate_klee_harness(build_tables(iter_iptables_save(text.splitlines())), str(tmp_path / "output.c"))
+    driver = tmp_path / "driver.c"
+    driver.write_text('#include <stdio.h>\n#include <stdlib.h>\n#define CONCRETE_TEST\n#include "output.c"\n'
+                      'int main(int argc, char **argv) {\n    init_rules();\n'
+                      '    printf("%d\\n", check_packet(strtoul(argv[1], 0, 0), 0, 1024, atoi(argv[2]), atoi(argv[3])));\n'
+                      '    return 0;\n}\n')
+    subprocess.check_call(["gcc", "-Wall", "-Werror", str(driver), "-o", str(tmp_path / "driver")])
+
+    def check(src_ip, dst_port, proto):
+        return int(subprocess.check_output([str(tmp_path / "driver"), str(src_ip), str(dst_port), str(proto)]))
+
+    return check
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_klee_harness_runs_concretely(tmp_path):
+    """Test the generated harness with klee_runner's concrete-test driver."""
+    check = build_driver(tmp_path, SAVE)
+    assert check(0x0A000001, 22, 6) == 0    # DROP
+    assert check(0x08080808, 22, 6) == 1    # Not from 192.168/16
+    assert check(0xC0A80001, 22, 6) == 0    # Policy
+    assert check(0xC0A80001, 53, 17) == 1
+    assert check(0xC0A80001, 0, 47) == 1
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_klee_harness_calls_user_chains(tmp_path):
+    """Test that the harness follows jumps, gotos and RETURN, then applies the policy."""
+    harness = "".join(iter_klee_chunks(build_tables(iter_iptables_save(CHAINS.splitlines()))))
+    assert harness.count("static int chain_1(") == 1 and harness.count("chain_1(src_ip") == 2
+    check = build_driver(tmp_path, CHAINS)
+    assert check(0x0A000001, 443, 6) == 0    # LOGDROP
+    assert check(0xAC100001, 443, 6) == 1    # services
+    assert check(0xAC100001, 22, 6) == 0     # RETURN from services, then INPUT's DROP
+    assert check(0xAC100001, 22, 17) == 1    # The goto falls through: the policy
+    assert check(0x08080808, 22, 6) == 1
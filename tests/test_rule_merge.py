@@ -0,0 +1,64 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import build_tables, iter_iptables_save
+from prefix_table import PREFIXES
+from port_set import PORT_SETS
+from rule_ir import ProtoTest, PrefixTest, AddressRangeTest, chain_rules, smt_predicate
+from rule_merge import merge_rules
+
+
+def lowered(lines, policy="DROP"):
+    text = f"*filter\n:INPUT {policy} [0:0]\n" + "".join(line + "\n" for line in lines) + "COMMIT\n"
+    return list(chain_rules(build_tables(iter_iptables_save(text.splitlines()))['filter'])[-1].rules)
+
+
+def test_ufw_allow_list_becomes_a_few_ranges():
+    """Test that tcp/udp allow pairs merge into one rule with contiguous ports joined."""
+    lines = []
+    for port in list(range(1000, 1500)) + [22, 80, 443]:
+        lines += [f"-A INPUT -p tcp -m tcp --dport {port} -m comment --comment \"port {port}\" -j ACCEPT",
+                  f"-A INPUT -p udp -m udp --dport {port} -j ACCEPT"]
+    merged, report = merge_rules(lowered(lines))
+    assert len(merged) == 1
+    proto, ports = merged[0].predicates
+    assert proto == ProtoTest(frozenset([6, 17]))
+    assert PORT_SETS.get(ports.sid) == ((22, 22), (80, 80), (443, 443), (1000, 1499))
+    assert (report.rules_before, report.rules_after, report.tests_after) == (1006, 1, 6)
+    assert "bvs" not in smt_predicate(ports)  # Unsigned comparisons only
+
+
+def test_adjacent_prefixes_become_one_prefix():
+    """Test that two /25s give a /24 and that other unions become unsigned ranges."""
+    merged, _ = merge_rules(lowered(["-A INPUT -s 10.0.0.0/25 -j DROP", "-A INPUT -s 10.0.0.128/25 -j DROP"]))
+    assert merged[0].predicates == (PrefixTest('src', PREFIXES.intern("10.0.0.0/24")),)
+
+    merged, _ = merge_rules(lowered(["-A INPUT -d 10.0.0.0/24 -j DROP", "-A INPUT -d 10.0.1.0/25 -j DROP"]))
+    assert merged[0].predicates == (AddressRangeTest('dst', ((0x0A000000, 0x0A00017F),)),)
+    assert smt_predicate(merged[0].predicates[0]) == "(and (bvuge dst_ip #x0a000000) (bvule dst_ip #x0a00017f))"
+
+
+def test_first_match_order_is_kept():
+    """Test that only consecutive same-action rules merge and that results stay equivalent."""
+    lines = ["-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT",
+             "-A INPUT -s 10.0.0.0/8 -j DROP",
+             "-A INPUT -p tcp -m tcp --dport 23 -j ACCEPT",
+             "-A INPUT ! -s 192.168.0.0/16 -p tcp -m tcp --dport 80 -j ACCEPT",
+             "-A INPUT ! -s 192.168.0.0/16 -p tcp -m tcp --dport 81 -j ACCEPT"]
+    merged, report = merge_rules(lowered(lines))
+    assert [ir.action for ir in merged] == ["ACCEPT", "DROP", "ACCEPT", "ACCEPT"]
+    assert report.rules_after == 4
+    assert PORT_SETS.get(merged[3].predicates[1].sid) == ((80, 81),)
+    assert merged[3].predicates[2].negated
+
+    z3 = pytest.importorskip("z3")
+    from smt_generator import generate_z3_from_tables
+    tables = build_tables(iter_iptables_save(("*filter\n:INPUT DROP [0:0]\n" + "\n".join(lines) + "\nCOMMIT\n").splitlines()))
+    solver = z3.Solver()
+    solver.add(generate_z3_from_tables(tables) != generate_z3_from_tables(tables, merge=True))
+    assert solver.check() == z3.unsat
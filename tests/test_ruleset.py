@@ -0,0 +1,105 @@
+import io
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import iter_iptables_save, build_tables
+from ruleset import RuleSet, StringTable, PROTO_ANY
+from code_generator import generate_c_code
+from match_modules import TcpMatch
+
+SAMPLE_SAVE = """*filter
+:INPUT DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+:ufw-user-input - [0:0]
+-A INPUT -i lo -j ACCEPT
+-A INPUT -j ufw-user-input
+-A ufw-user-input -s 10.0.0.0/8 -p tcp -m tcp --dport 22 -j ACCEPT
+-A ufw-user-input -p udp --sport 53 -i eth0 -j ACCEPT
+-A OUTPUT -o eth0 -p gre -j ACCEPT
+COMMIT
+"""
+
+
+@pytest.fixture
+def ruleset():
+    """Build a RuleSet from the sample dump."""
+    return RuleSet.from_events(iter_iptables_save(io.StringIO(SAMPLE_SAVE)))
+
+
+def flatten(tables):
+    """Render tables as comparable (table, chain, policy, rules) tuples."""
+    return [
+        (table_name, chain_name, chain.policy, [str(rule) for rule in chain.rules])
+        for table_name, table in tables.items()
+        for chain_name, chain in table.chains.items()
+    ]
+
+
+def test_string_table_interns_once():
+    """Test that repeated strings share one id."""
+    strings = StringTable()
+    assert strings.intern("") == 0
+    assert strings.intern(None) == 0
+    eth0 = strings.intern("eth0")
+    assert strings.intern("eth0") == eth0
+    assert strings[eth0] == "eth0"
+    assert len(strings) == 2
+
+
+def test_columns(ruleset):
+    """Test that rule fields are stored in typed columns."""
+    assert len(ruleset) == 5
+    assert list(ruleset.protos) == [PROTO_ANY, PROTO_ANY, 6, 17, 47]
+    assert ruleset.prefixes.get(ruleset.src_prefixes[2]) == (4, 0x0A000000, 8)
+    assert ruleset.dst_prefixes[2] == 0
+    assert ruleset.port_sets.get(ruleset.dport_sets[2]) == ((22, 22),)
+    assert ruleset.port_sets.get(ruleset.sport_sets[3]) == ((53, 53),)
+    assert ruleset.dport_sets[3] == 0
+    # Interface and target names are interned, not copied per rule
+    assert ruleset.in_ifaces[0] != ruleset.in_ifaces[3]
+    assert ruleset.out_ifaces[4] == ruleset.in_ifaces[3]
+    assert ruleset.actions[0] == ruleset.actions[2]
+
+
+def test_views_match_object_model(ruleset):
+    """Test that RuleViews render exactly like parsed IPTablesRules."""
+    tables = build_tables(iter_iptables_save(io.StringIO(SAMPLE_SAVE)))
+    assert flatten(ruleset.as_tables()) == flatten(tables)
+
+    rule = ruleset.as_tables()["filter"].chains["ufw-user-input"].rules[0]
+    assert rule.table == "filter"
+    assert rule.chain == "ufw-user-input"
+    assert rule.proto == "tcp"
+    assert rule.dst_port == "22"
+    assert rule.src_port == "0"
+    assert rule.matches == {"tcp": TcpMatch(0, 0, False)}
+
+
+def test_repeated_table_replaces_previous(ruleset):
+    """Test that a second '*filter' section replaces the first one."""
+    dump = SAMPLE_SAVE + "*filter\n:INPUT ACCEPT [0:0]\n-A INPUT -j DROP\nCOMMIT\n"
+    replaced = RuleSet.from_events(iter_iptables_save(io.StringIO(dump)))
+    tables = replaced.as_tables()
+    assert list(tables["filter"].chains) == ["INPUT"]
+    assert [rule.action for rule in tables["filter"].chains["INPUT"].rules] == ["DROP"]
+    assert len(replaced) == 1
+    # Indexing follows the live rules, not the rows the first section left behind
+    assert replaced[0].action == replaced[-1].action == "DROP"
+    with pytest.raises(IndexError):
+        replaced[1]
+    assert replaced.row_view(0).action == "ACCEPT"
+    assert [(table, chain, list(rows)) for table, chain, rows in replaced.iter_chains()] == [
+        ("filter", "INPUT", [5])]
+
+
+def test_code_generator_accepts_views(ruleset, tmp_path):
+    """Test that generate_c_code produces the same output from views."""
+    tables = build_tables(iter_iptables_save(io.StringIO(SAMPLE_SAVE)))
+    generate_c_code(tables, str(tmp_path / "objects.smt2"))
+    generate_c_code(ruleset.as_tables(), str(tmp_path / "views.smt2"))
+    assert (tmp_path / "views.smt2").read_text() == (tmp_path / "objects.smt2").read_text()
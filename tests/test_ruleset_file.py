@@ -0,0 +1,88 @@
+import io
+import pickle
+import struct
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import iter_iptables_save
+from ruleset import RuleSet
+from ruleset_file import write_ruleset, open_ruleset, read_sections, MappedRuleSet, FORMAT_VERSION
+from code_generator import generate_c_code
+
+SAMPLE_SAVE = """*nat
+:POSTROUTING ACCEPT [0:0]
+-A POSTROUTING -o eth0 -j MASQUERADE
+COMMIT
+*filter
+:INPUT DROP [0:0]
+:ufw-user-input - [0:0]
+-A INPUT -i lo -j ACCEPT
+-A INPUT -j ufw-user-input
+-A ufw-user-input -s 10.0.0.0/8 -p tcp -m multiport --dports 22,80:90 -j ACCEPT
+-A ufw-user-input -d 2001:db8::/32 -p udp --sport 53 -j ACCEPT
+-A ufw-user-input -p 47 -m comment --comment "gre tunnel" -j DROP
+COMMIT
+"""
+
+
+@pytest.fixture
+def ruleset():
+    return RuleSet.from_events(iter_iptables_save(io.StringIO(SAMPLE_SAVE)))
+
+
+@pytest.fixture
+def mapped(ruleset, tmp_path):
+    path = tmp_path / "rules.rset"
+    write_ruleset(ruleset, str(path))
+    return open_ruleset(str(path))
+
+
+def test_round_trip(ruleset, mapped):
+    """Test that a mapped RuleSet reads back the same rules and chains."""
+    assert isinstance(mapped, MappedRuleSet)
+    assert len(mapped) == len(ruleset)
+    assert [str(rule) for rule in mapped] == [str(rule) for rule in ruleset]
+    tables = mapped.as_tables()
+    assert list(tables) == ["nat", "filter"]
+    assert tables["filter"].chains["INPUT"].policy == "DROP"
+    assert mapped[3].matches == ruleset[3].matches
+
+
+def test_columns_are_mapped(mapped):
+    """Test that rule columns are zero-copy views of the file."""
+    assert isinstance(mapped.actions, memoryview)
+    assert isinstance(mapped.chain_rows[0], memoryview)
+
+
+def test_emitters_see_shared_ids(ruleset, mapped, tmp_path):
+    """Test that code_generator output is identical for mapped and in-memory rules."""
+    generate_c_code(ruleset.as_tables(), str(tmp_path / "a.smt2"))
+    generate_c_code(mapped.as_tables(), str(tmp_path / "b.smt2"))
+    assert (tmp_path / "b.smt2").read_text() == (tmp_path / "a.smt2").read_text()
+
+
+def test_read_only_and_picklable(ruleset, mapped):
+    """Test that a mapped RuleSet cannot grow but pickles as a plain RuleSet."""
+    with pytest.raises(TypeError):
+        mapped.add_table("raw")
+    restored = pickle.loads(pickle.dumps(mapped))
+    assert type(restored) is RuleSet
+    assert [str(rule) for rule in restored] == [str(rule) for rule in ruleset]
+
+
+def test_rejects_other_files(ruleset, tmp_path):
+    """Test the errors for a foreign file and for another format version."""
+    with pytest.raises(ValueError):
+        read_sections(b"*filter\nCOMMIT\n" * 4)
+
+    path = tmp_path / "rules.rset"
+    write_ruleset(ruleset, str(path))
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<H", data, 8, FORMAT_VERSION + 1)
+    with pytest.raises(ValueError):
+        read_sections(bytes(data))
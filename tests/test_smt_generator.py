@@ -0,0 +1,83 @@
+import sys
+import pytest
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+sys.path.append(str(PROJECT_ROOT))
+
+z3 = pytest.importorskip("z3")
+
+from iptables_parser import build_tables, iter_iptables_save
+from smt_generator import Z3TermBuilder, generate_smtlib_from_tables, generate_z3_from_tables, z3_to_smtlib
+from rule_ir import ProtoTest, PortTest
+from checkConsistency.main import check_consistency
+
+SAVE = """*filter
+:INPUT DROP [0:0]
+:SSH - [0:0]
+-A INPUT -s 10.0.0.0/8 -p tcp -m multiport --dports 80,443 -j DROP
+-A INPUT -p tcp -m tcp --dport 22 -j SSH
+-A INPUT -p tcp -m multiport --dports 80,443 -j ACCEPT
+-A SSH -p tcp -m tcp --dport 22 -j ACCEPT
+COMMIT
+"""
+
+
+def tables_of(text):
+    return build_tables(iter_iptables_save(text.splitlines()))
+
+
+def accepts(formula, **packet):
+    """Evaluate the formula for one concrete packet."""
+    fields = {name: z3.BitVec(name, width) for name, width in
+              (("src_ip", 32), ("dst_ip", 32), ("src_port", 16), ("dst_port", 16), ("proto", 8), ("state", 8))}
+    values = {"src_ip": 0, "dst_ip": 0, "src_port": 0, "dst_port": 0, "proto": 0, "state": 0}
+    values.update(packet)
+    substitution = [(fields[name], z3.BitVecVal(value, fields[name].size())) for name, value in values.items()]
+    return z3.is_true(z3.simplify(z3.substitute(formula, *substitution)))
+
+
+def test_first_match_semantics():
+    """Test that the first matching verdict wins and the policy applies otherwise."""
+    formula = generate_z3_from_tables(tables_of(SAVE))
+    assert not accepts(formula, src_ip=0x0A000001, proto=6, dst_port=443)  # DROP before the ACCEPT
+    assert accepts(formula, src_ip=0xC0A80001, proto=6, dst_port=443)
+    assert accepts(formula, proto=6, dst_port=22)                           # Via SSH
+    assert not accepts(formula, proto=17, dst_port=443)                    # Policy DROP
+
+
+def test_terms_are_shared():
+    """Test that identical predicates are built once, across rules and firewalls."""
+    builder = Z3TermBuilder()
+    generate_z3_from_tables(tables_of(SAVE), builder)
+    size = len(builder)
+    hits = builder.hits
+    generate_z3_from_tables(tables_of(SAVE), builder)
+    assert len(builder) == size
+    assert builder.hits > hits
+    # '-p tcp' and '--dport 22' each appear in several rules but are one term
+    assert [key for key in builder._terms if isinstance(key, ProtoTest)] == [ProtoTest(frozenset([6]))]
+    assert sum(1 for key in builder._terms if isinstance(key, PortTest)) == 1
+
+
+def test_ast_and_text_dump_are_equivalent(tmp_path):
+    """Test the in-process check against the SMT-LIB dump and a changed firewall."""
+    formula = generate_z3_from_tables(tables_of(SAVE))
+    dump = tmp_path / "rules.smt2"
+    dump.write_text(z3_to_smtlib(formula))
+    assert check_consistency(formula, str(dump))[0]
+
+    changed = generate_z3_from_tables(tables_of(SAVE.replace("--dports 80,443 -j ACCEPT", "--dports 80,8443 -j ACCEPT")))
+    assert not check_consistency(formula, changed)[0]
+
+
+def test_text_dump_has_assertions():
+    """Test that generate_smtlib_from_tables writes the model's assertions, not comments."""
+    tables = tables_of(SAVE)
+    text = generate_smtlib_from_tables(tables)
+    assert "(assert " in text and "(declare-fun dst_port () (_ BitVec 16))" in text
+    solver = z3.Solver()
+    solver.add(z3.And(list(z3.parse_smt2_string(text))) != generate_z3_from_tables(tables))
+    assert solver.check() == z3.unsat
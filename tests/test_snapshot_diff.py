@@ -0,0 +1,100 @@
+import io
+import json
+import sys
+from pathlib import Path
+
+# Add iptablesToSMT to Python path (its modules use flat imports)
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+sys.path.append(str(PROJECT_ROOT / "iptablesToSMT"))
+
+from iptables_parser import iter_iptables_save
+from ruleset import RuleSet
+from snapshot_diff import diff_snapshots, rule_key, format_diff, main
+
+OLD_SAVE = """*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT ACCEPT [0:0]
+-A INPUT -i lo -j ACCEPT
+-A INPUT -p tcp -m tcp --dport 22 -j ACCEPT
+-A INPUT -p tcp -m tcp --dport 80 -j ACCEPT
+-A INPUT -p udp --dport 53 -j ACCEPT
+-A FORWARD -j DROP
+COMMIT
+"""
+
+NEW_SAVE = """*filter
+:INPUT DROP [0:0]
+:FORWARD ACCEPT [0:0]
+:OUTPUT ACCEPT [0:0]
+-A INPUT -p udp --dport 53 -j ACCEPT
+-A INPUT -i lo -j ACCEPT
+-A INPUT -p TCP -m tcp --dport 22 -j ACCEPT
+-A INPUT -p tcp -m tcp --dport 443 -j ACCEPT
+-A FORWARD -j DROP
+-A OUTPUT -d 10.0.0.1 -j ACCEPT
+COMMIT
+"""
+
+
+def parse(text):
+    return RuleSet.from_events(iter_iptables_save(io.StringIO(text)))
+
+
+def test_added_removed_moved():
+    """Test that rule changes are classified per chain."""
+    result = diff_snapshots(parse(OLD_SAVE), parse(NEW_SAVE))
+    input_diff = result.chains[("filter", "INPUT")]
+    assert [index for index, _ in input_diff.added] == [3]
+    assert [index for index, _ in input_diff.removed] == [2]
+    assert [(old, new) for old, new, _ in input_diff.moved] == [(3, 0)]
+    assert not input_diff.policy_changed
+
+
+def test_policy_change_and_changed_chains():
+    """Test policy changes and the list of chains that need re-processing."""
+    result = diff_snapshots(parse(OLD_SAVE), parse(NEW_SAVE))
+    forward_diff = result.chains[("filter", "FORWARD")]
+    assert (forward_diff.old_policy, forward_diff.new_policy) == ("DROP", "ACCEPT")
+    assert result.changed_chains() == [("filter", "INPUT"), ("filter", "FORWARD"), ("filter", "OUTPUT")]
+    assert result.changed_tables() == ["filter"]
+
+
+def test_identical_snapshots():
+    """Test that equal snapshots produce an empty diff."""
+    result = diff_snapshots(parse(OLD_SAVE), parse(OLD_SAVE))
+    assert not result
+    assert format_diff(result) == "No changes"
+
+
+def test_rule_key_ignores_spelling():
+    """Test that equivalent spellings of a rule hash the same."""
+    first = parse("*filter\n:INPUT ACCEPT\n-A INPUT -s 10.0.0.1 -p all --dport 1000:1001 -j DROP\nCOMMIT\n")
+    second = parse("*filter\n:INPUT ACCEPT\n-A INPUT -s 10.0.0.1/32 --dport 1000,1001 -j DROP\nCOMMIT\n")
+    assert rule_key(first[0]) == rule_key(second[0])
+
+
+def test_target_arguments_are_compared():
+    """Test that a rule whose target arguments alone changed is reported."""
+    old = parse("*nat\n:PREROUTING ACCEPT\n-A PREROUTING -p tcp --dport 80 "
+                "-j DNAT --to-destination 10.0.0.1:8080\nCOMMIT\n"
+                "*filter\n:INPUT ACCEPT\n-A INPUT -p tcp -j REJECT --reject-with tcp-reset\n"
+                "-A INPUT -j LOG --log-prefix \"drop \"\nCOMMIT\n")
+    new = parse("*nat\n:PREROUTING ACCEPT\n-A PREROUTING -p tcp --dport 80 "
+                "-j DNAT --to-destination 10.9.9.9\nCOMMIT\n"
+                "*filter\n:INPUT ACCEPT\n-A INPUT -p tcp -j REJECT --reject-with icmp-port-unreachable\n"
+                "-A INPUT -j LOG --log-prefix \"deny \"\nCOMMIT\n")
+    result = diff_snapshots(old, new)
+    assert result.changed_chains() == [("nat", "PREROUTING"), ("filter", "INPUT")]
+    assert [index for index, _ in result.chains[("filter", "INPUT")].added] == [0, 1]
+
+
+def test_cli_json(tmp_path, capsys):
+    """Test the command line report and exit status."""
+    old_file, new_file = tmp_path / "old", tmp_path / "new"
+    old_file.write_text(OLD_SAVE)
+    new_file.write_text(NEW_SAVE)
+    assert main([str(old_file), str(new_file), "--json"]) == 1
+    report = json.loads(capsys.readouterr().out)
+    assert report["changed_chains"] == ["filter/INPUT", "filter/FORWARD", "filter/OUTPUT"]
+    assert main([str(old_file), str(old_file)]) == 0
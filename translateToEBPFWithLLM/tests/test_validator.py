@@ -0,0 +1,29 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validator import IptablesValidator
+
+
+def test_validator_reads_both_formats(tmp_path):
+    """Test that save files and command scripts go through the same reader."""
+    saved = tmp_path / "rules.v4"
+    saved.write_text("*filter\n:INPUT DROP [0:0]\n-A INPUT -p tcp --dport 22 -j ACCEPT\nCOMMIT\n")
+    assert IptablesValidator().validate_file(str(saved)) == (True, [], [])
+
+    script = tmp_path / "rules.sh"
+    script.write_text("IPT=/sbin/iptables\n[ -x $IPT ] || exit 1\n$IPT -P INPUT DROP\n"
+                      "$IPT -A INPUT -p gre -j ACCEPT\n$IPT -A missing -j DROP\n")
+    valid, errors, warnings = IptablesValidator().validate_file(str(script))
+    assert not valid
+    assert errors == ["line 5: -A missing: no such chain"]
+    assert warnings == ["Uncommon protocol 'gre' in filter INPUT"]
+
+
+def test_validate_rule():
+    """Test single command and save lines."""
+    validator = IptablesValidator()
+    assert validator.validate_rule("iptables -A INPUT -p tcp --dport 22 -j ACCEPT")
+    assert validator.validate_rule("-A INPUT -s 10.0.0.0/8 -j DROP")
+    assert not validator.validate_rule("echo hello")
+    assert validator.validation_errors == ["Not an iptables command: echo hello"]
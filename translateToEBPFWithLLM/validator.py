@@ -1,14 +1,22 @@
-import re
+import sys
 from pathlib import Path
 from typing import List, Tuple, Optional
 
+# Rule files are read by the iptablesToSMT front-end (flat imports)
+sys.path.append(str(Path(__file__).parent.parent.absolute() / "iptablesToSMT"))
+
+from ingest import COMMAND_FORMAT, TABLE_CHAINS, CommandReplay, detect_format
+from iptables_parser import build_tables, iter_iptables_save
+
 class IptablesValidator:
-    # Common iptables commands and options
-    VALID_COMMANDS = {'-A', '-I', '-D', '-R', '-P'}
-    VALID_TABLES = {'filter', 'nat', 'mangle', 'raw', 'security'}
-    VALID_CHAINS = {'INPUT', 'OUTPUT', 'FORWARD', 'PREROUTING', 'POSTROUTING'}
+    """Checks rule files with the same reader as the SMT pipeline (ingest.py).
+
+    Both iptables-save files and iptables command scripts are accepted; rules
+    the reader cannot load are errors, unusual targets and protocols warnings.
+    """
     VALID_TARGETS = {'ACCEPT', 'DROP', 'REJECT', 'LOG', 'RETURN', 'SNAT', 'DNAT', 'MASQUERADE'}
-    
+    VALID_PROTOCOLS = {'tcp', 'udp', 'icmp', 'all'}
+
     def __init__(self, log_file: Optional[Path] = None):
         """Initialize validator with optional log file."""
         self.log_file = log_file
@@ -16,76 +24,70 @@ class IptablesValidator:
         self.validation_warnings: List[str] = []
 
     def validate_rule(self, rule: str) -> bool:
-        """Validate a single iptables rule."""
+        """Validate a single iptables command or iptables-save rule line."""
         # Skip empty lines and comments
         if not rule.strip() or rule.strip().startswith('#'):
             return True
-            
-        # Basic structure validation
-        if not rule.startswith('iptables'):
-            self._add_error(f"Rule must start with 'iptables': {rule}")
-            return False
-            
-        # Parse command
-        command_match = re.search(r'-[AIRDP]\s+(\w+)', rule)
-        if not command_match:
-            self._add_error(f"Invalid or missing command in rule: {rule}")
-            return False
-            
-        chain = command_match.group(1)
-        if chain not in self.VALID_CHAINS:
-            self._add_error(f"Invalid chain '{chain}' in rule: {rule}")
+
+        replay = CommandReplay()
+        line = rule.strip()
+        if line.startswith('-'):
+            line = 'iptables ' + line  # An iptables-save rule line
+        if not replay.feed(line):
+            self._add_error(f"Not an iptables command: {rule}")
             return False
-            
-        # Validate targets if present
-        target_match = re.search(r'-j\s+(\w+)', rule)
-        if target_match and target_match.group(1) not in self.VALID_TARGETS:
-            self._add_warning(f"Uncommon target '{target_match.group(1)}' in rule: {rule}")
-            
-        # Validate protocol if specified
-        proto_match = re.search(r'-p\s+(\w+)', rule)
-        if proto_match and proto_match.group(1) not in {'tcp', 'udp', 'icmp', 'all'}:
-            self._add_warning(f"Uncommon protocol '{proto_match.group(1)}' in rule: {rule}")
-            
-        return True
+        for error in replay.errors:
+            self._add_error(f"{error}: {rule}")
+        self._check_tables(replay.tables())
+        return not replay.errors
 
     def validate_file(self, input_file: str) -> Tuple[bool, List[str], List[str]]:
         """Validate an iptables rules file."""
         self.validation_errors = []
         self.validation_warnings = []
-        
+
         try:
             with open(input_file, 'r') as f:
-                rules = f.readlines()
-                
-            if not rules:
-                self._add_error("Empty rules file")
-                return False, self.validation_errors, self.validation_warnings
-                
-            # Validate each rule
-            valid = True
-            for line_num, rule in enumerate(rules, 1):
-                if not self.validate_rule(rule.strip()):
-                    valid = False
-                    
-            # Check for common structural issues
-            if not any('-P' in rule for rule in rules):
-                self._add_warning("No default policy (-P) rules found")
-                
-            if not any(chain in ' '.join(rules) for chain in self.VALID_CHAINS):
-                self._add_error("No valid chains found in rules")
-                valid = False
-                
+                file_format, lines = detect_format(f)
+                if file_format == COMMAND_FORMAT:
+                    replay = CommandReplay()
+                    for line_number, line in enumerate(lines, 1):
+                        replay.feed(line, line_number)
+                    for error in replay.errors:
+                        self._add_error(error)
+                    tables = replay.tables()
+                else:
+                    tables = build_tables(iter_iptables_save(lines))
+
+            if not any(chain.rules for table in tables.values() for chain in table.chains.values()):
+                self._add_error("No rules found")
+            else:
+                self._check_tables(tables)
+            filter_table = tables.get('filter')
+            if filter_table is None or all(chain.policy == 'ACCEPT' for name, chain in filter_table.chains.items()
+                                           if name in TABLE_CHAINS['filter']):
+                self._add_warning("No default policy: every built-in filter chain accepts")
+
             # Log validation results
             if self.log_file:
                 self._log_validation_results()
-                
-            return valid, self.validation_errors, self.validation_warnings
-            
+
+            return not self.validation_errors, self.validation_errors, self.validation_warnings
+
         except Exception as e:
             self._add_error(f"Error validating file: {str(e)}")
             return False, self.validation_errors, self.validation_warnings
 
+    def _check_tables(self, tables):
+        """Warn about uncommon targets and protocols of the loaded rules."""
+        for table in tables.values():
+            for chain in table.chains.values():
+                for rule in chain.rules:
+                    if rule.action and rule.action not in self.VALID_TARGETS and rule.action not in table.chains:
+                        self._add_warning(f"Uncommon target '{rule.action}' in {table.name} {chain.name}")
+                    if rule.proto and rule.proto.lower() not in self.VALID_PROTOCOLS:
+                        self._add_warning(f"Uncommon protocol '{rule.proto}' in {table.name} {chain.name}")
+
     def _add_error(self, message: str):
         """Add an error message and log it if configured."""
         self.validation_errors.append(message)